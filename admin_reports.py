@@ -0,0 +1,253 @@
+"""
+Admin appointment reporting and schedule-change impact.
+
+Per-day counts and booked minutes come from one GROUP BY over the
+(business_slug, start_time) index; only the selected day's rows are
+materialized. Recurring series are stored as one row each and expanded only
+over the requested window. Results are cached per worker for a short time and dropped
+when the business books or cancels (on every worker, through shared_state).
+"""
+import datetime as dt
+import threading
+import time
+
+from sqlalchemy import func
+
+from db import db
+from models import Appointment, AppointmentSeries
+import shared_state
+from booking_core import (
+    day_key,
+    get_working_hours_for_date,
+    hhmm_to_minutes,
+    compile_schedule,
+    schedule_conflict,
+    resource_cfgs,
+    series_starts,
+)
+
+MAX_RANGE_DAYS = 62
+MAX_CONFLICTS_LISTED = 200
+CACHE_TTL_SEC = 30.0
+BUS_CHANNEL = "reports"
+
+_cache = {}  # (slug, kind, *args) -> (value, stored_at)
+_cache_lock = threading.Lock()
+
+
+def _cached(key, build):
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and now - hit[1] < CACHE_TTL_SEC:
+            return hit[0]
+    value = build()
+    with _cache_lock:
+        _cache[key] = (value, now)
+    return value
+
+
+def invalidate(slug: str):
+    shared_state.publish(BUS_CHANNEL, {"slug": slug})
+
+
+@shared_state.subscribe(BUS_CHANNEL)
+def _drop_local(msg: dict):
+    with _cache_lock:
+        for key in [k for k in _cache if k[0] == msg["slug"]]:
+            del _cache[key]
+
+
+def working_minutes(cfg: dict, date: dt.date) -> int:
+    """Capacity of the day: working minutes summed over resources, each with its own hours."""
+    return sum(_resource_working_minutes(view, date) for _, view in resource_cfgs(cfg))
+
+
+def _resource_working_minutes(view: dict, date: dt.date) -> int:
+    if day_key(date) not in view.get("working_days", []):
+        return 0
+    if date.isoformat() in view.get("closed_dates", []):
+        return 0
+    wh = get_working_hours_for_date(view, date)
+    total = hhmm_to_minutes(wh["end"]) - hhmm_to_minutes(wh["start"])
+    for b in wh.get("breaks", []):
+        total -= hhmm_to_minutes(b["end"]) - hhmm_to_minutes(b["start"])
+    return max(0, total)
+
+
+def series_occurrences(slug: str, start: dt.datetime, end: dt.datetime = None):
+    """Yields (series, occurrence_start) for every series occurrence in [start, end)."""
+    q = AppointmentSeries.query.filter(
+        AppointmentSeries.business_slug == slug,
+        AppointmentSeries.last_start >= start,
+    )
+    if end is not None:
+        q = q.filter(AppointmentSeries.first_start < end)
+    for sr in q.all():
+        for occ in series_starts(sr.first_start, sr.interval_weeks, sr.occurrences, start, end):
+            yield sr, occ
+
+
+def daily_summary(cfg: dict, start: dt.date, end: dt.date, cfg_version: str = "") -> list:
+    """
+    One row per day in [start, end]: count, booked minutes, working minutes
+    and utilization %. Raises ValueError if the range exceeds MAX_RANGE_DAYS.
+    """
+    if end < start:
+        raise ValueError("end before start")
+    if (end - start).days + 1 > MAX_RANGE_DAYS:
+        raise ValueError(f"range is limited to {MAX_RANGE_DAYS} days")
+
+    slug = cfg["slug"]
+
+    def build():
+        day_col = func.date(Appointment.start_time)
+        rows = (
+            db.session.query(
+                day_col,
+                func.count(Appointment.id),
+                func.coalesce(func.sum(Appointment.duration_minutes), 0),
+            )
+            .filter(
+                Appointment.business_slug == slug,
+                Appointment.start_time >= dt.datetime.combine(start, dt.time.min),
+                Appointment.start_time < dt.datetime.combine(end + dt.timedelta(days=1), dt.time.min),
+            )
+            .group_by(day_col)
+            .all()
+        )
+        by_day = {str(d): (int(n), int(minutes)) for d, n, minutes in rows}
+        for sr, occ in series_occurrences(
+            slug,
+            dt.datetime.combine(start, dt.time.min),
+            dt.datetime.combine(end + dt.timedelta(days=1), dt.time.min),
+        ):
+            n, minutes = by_day.get(occ.date().isoformat(), (0, 0))
+            by_day[occ.date().isoformat()] = (n + 1, minutes + sr.duration_minutes)
+
+        out = []
+        d = start
+        while d <= end:
+            count, booked = by_day.get(d.isoformat(), (0, 0))
+            capacity = working_minutes(cfg, d)
+            out.append({
+                "date": d.isoformat(),
+                "count": count,
+                "booked_minutes": booked,
+                "working_minutes": capacity,
+                "utilization": round(100.0 * booked / capacity, 1) if capacity else 0.0,
+            })
+            d += dt.timedelta(days=1)
+        return out
+
+    return _cached((slug, "summary", start, end, cfg_version), build)
+
+
+def day_appointments(slug: str, date: dt.date) -> list:
+    def build():
+        rows = (
+            db.session.query(
+                Appointment.id,
+                Appointment.name,
+                Appointment.phone,
+                Appointment.start_time,
+                Appointment.duration_minutes,
+                Appointment.service_name,
+                Appointment.resource_id,
+            )
+            .filter(
+                Appointment.business_slug == slug,
+                Appointment.start_time >= dt.datetime.combine(date, dt.time.min),
+                Appointment.start_time < dt.datetime.combine(date + dt.timedelta(days=1), dt.time.min),
+            )
+            .order_by(Appointment.start_time)
+            .all()
+        )
+        out = [
+            {
+                "id": r.id,
+                "name": r.name,
+                "phone": r.phone,
+                "start": r.start_time.strftime("%H:%M"),
+                "duration_minutes": r.duration_minutes,
+                "service_name": r.service_name,
+                "resource_id": r.resource_id,
+            }
+            for r in rows
+        ]
+        for sr, occ in series_occurrences(
+            slug,
+            dt.datetime.combine(date, dt.time.min),
+            dt.datetime.combine(date + dt.timedelta(days=1), dt.time.min),
+        ):
+            out.append({
+                "series_id": sr.id,
+                "name": sr.name,
+                "phone": sr.phone,
+                "start": occ.strftime("%H:%M"),
+                "duration_minutes": sr.duration_minutes,
+                "service_name": sr.service_name,
+                "resource_id": sr.resource_id,
+            })
+        out.sort(key=lambda a: a["start"])
+        return out
+
+    return _cached((slug, "day", date), build)
+
+
+def schedule_change_conflicts(slug: str, proposed_cfg: dict, now_local: dt.datetime) -> dict:
+    """
+    Future appointments that would fall outside proposed_cfg: one range query
+    on (business_slug, start_time) + an O(1) check per row against the
+    compiled schedule. Legacy rows without a duration are checked as 1 minute.
+    Series occurrences are checked the same way, one entry per occurrence.
+    Rows assigned to a resource are checked against that resource's hours.
+    """
+    compiled = compile_schedule(proposed_cfg)
+    by_resource = {rid: compile_schedule(view) for rid, view in resource_cfgs(proposed_cfg)}
+    rows = (
+        db.session.query(
+            Appointment.id,
+            Appointment.name,
+            Appointment.phone,
+            Appointment.start_time,
+            Appointment.duration_minutes,
+            Appointment.service_name,
+            Appointment.resource_id,
+        )
+        .filter(
+            Appointment.business_slug == slug,
+            Appointment.start_time >= now_local.replace(tzinfo=None),
+        )
+        .order_by(Appointment.start_time)
+        .all()
+    )
+
+    items = [
+        ({"id": r.id}, r, r.start_time, r.duration_minutes)
+        for r in rows
+    ]
+    items += [
+        ({"series_id": sr.id}, sr, occ, sr.duration_minutes)
+        for sr, occ in series_occurrences(slug, now_local.replace(tzinfo=None))
+    ]
+
+    conflicts = []
+    conflict_count = 0
+    for ref, r, start, duration in items:
+        start_min = start.hour * 60 + start.minute
+        schedule = by_resource.get(r.resource_id, compiled)
+        reason = schedule_conflict(schedule, start.date(), start_min, start_min + (duration or 1))
+        if not reason:
+            continue
+        conflict_count += 1
+        if len(conflicts) < MAX_CONFLICTS_LISTED:
+            conflicts.append(dict(
+                ref,
+                name=r.name,
+                phone=r.phone,
+                start=start.strftime("%Y-%m-%d %H:%M"),
+                service_name=r.service_name,
+                reason=reason,
+            ))
+    return {"checked": len(items), "conflict_count": conflict_count, "conflicts": conflicts}
@@ -1,8 +1,10 @@
-from flask import Flask, request, jsonify, render_template, session, redirect, abort
+from flask import Flask, request, jsonify, render_template, session, redirect, abort, Response, stream_with_context, send_file
+from flask.cli import AppGroup
+import click
+import copy
 import datetime as dt
 from zoneinfo import ZoneInfo
 import json
-from twilio.rest import Client
 import os
 import pickle
 from dotenv import load_dotenv
@@ -11,22 +13,71 @@ import random
 import re
 from functools import wraps
 from googleapiclient.errors import HttpError
+from werkzeug.exceptions import HTTPException
 import secrets
 import hashlib
+import time
+import threading
+from collections import OrderedDict
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
-from db import db
-from models import Appointment, User, PhoneVerification, TrustedDevice
+from db import db, add_missing_columns
+from models import Appointment, AppointmentSeries, User, PhoneVerification, TrustedDevice, RevokedDeviceToken, WaitlistEntry
+from sqlalchemy import update, case, func
 from googleapiclient.discovery import build
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
 
 from booking_core import (
-    ceil_to_slot,
     validate_slot,
     day_key,
     get_working_hours_for_date,
+    minutes_to_hhmm,
+    slots_from_bitmap,
+    series_starts,
+    first_overlap,
+    resource_cfgs,
+    day_span,
+    pick_least_loaded,
+    block_minutes,
+    service_block,
+    slot_step,
+    grid_ceil,
+    rank_best_fit,
+    bitmap_has,
+    subtract_intervals,
+    MINUTES_PER_DAY,
 )
+from availability import (
+    config_hash,
+    get_day_snapshot,
+    last_known_bitmap,
+    mark_busy,
+    mark_day_stale,
+    mark_business_stale,
+    purge_snapshots,
+    next_available,
+    snapshot_etag,
+)
+from slot_events import hub as slot_event_hub
+import tenant_store
+from messaging import send_sms, send_sms_batch, get_queue, check_provider
+import admin_reports
+import waitlist
+import reminders
+import exports
+import bulk_import
+import assets
+import calendar_gate
+import calendar_outbox
+import shared_state
+import http_codec
+import mimetypes
 app = Flask(__name__)
+# orjson when installed, stdlib otherwise
+JSON_ENCODER = http_codec.install(app)
 
 # ====== IMPORTANT: SECRET KEY (token signing) ======
 # ב-Production תשים את זה במשתני סביבה.
@@ -39,14 +90,34 @@ app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
 app.config["SESSION_COOKIE_SECURE"] = os.environ.get("SESSION_COOKIE_SECURE", "0") == "1"
 app.config["PERMANENT_SESSION_LIFETIME"] = dt.timedelta(days=200)
 
+# ====== SMS ======
+# fail now rather than on the first OTP: outside development the provider must be configured
+SMS_PROVIDER = check_provider()
+
 # ====== DB ======
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///app.db"
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///app.db")
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
 db.init_app(app)
 
 with app.app_context():
     db.create_all()
+    add_missing_columns()
+
+@app.before_request
+def _start_shared_state_listener():
+    # a forked worker starts its own bus listener (no-op for the in-process backend)
+    shared_state.ensure_listening()
+
+@app.before_request
+def _start_calendar_deleter():
+    # first request of a (forked) worker: deletions left from before a restart get retried
+    calendar_deleter.start()
+
+@app.after_request
+def _compress_response(resp):
+    # gzip / br for JSON and HTML above COMPRESS_MIN_BYTES (multi-day slots, lists, landing pages)
+    return http_codec.compress_response(resp, request.headers.get("Accept-Encoding"))
 
 # ================= CONFIG =================
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
@@ -54,28 +125,28 @@ CREDENTIALS_FILE = "credentials.json"
 TOKEN_FILE = "token.pkl"
 BUSINESS_CONFIG_FILE = "business_config.json"
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 ADMIN_OVERRIDES_FILE = os.path.join(DATA_DIR, "admin_overrides.json")
 ADMIN_WHITELIST_FILE = os.path.join(DATA_DIR, "admin_whitelist.json")
+ASSETS_DIR = os.path.join(BASE_DIR, "static", "dist")
 
 # ====== rate limit (5 requests per 10 minutes) ======
-_auth_requests = {} # key: identifier -> list of timestamps
-
-def check_rate_limit(identifier: str) -> bool:
-    now = dt.datetime.utcnow()
-    ten_mins_ago = now - dt.timedelta(minutes=10)
-    
-    if identifier not in _auth_requests:
-        _auth_requests[identifier] = []
-    
-    # Clean old requests
-    _auth_requests[identifier] = [t for t in _auth_requests[identifier] if t > ten_mins_ago]
-    
-    if len(_auth_requests[identifier]) >= 5:
-        return False
-    
-    _auth_requests[identifier].append(now)
-    return True
+# counted in shared_state, so the limit holds across workers / nodes
+RATE_LIMIT_MAX = 5
+RATE_LIMIT_IP_MAX = 30  # per address: an office / carrier NAT shares one
+RATE_LIMIT_WINDOW_SEC = 600
+RATE_LIMIT_MESSAGE = "יותר מדי בקשות - נסו שוב בעוד כמה דקות"
+
+def check_rate_limit(identifier: str, limit: int = RATE_LIMIT_MAX) -> bool:
+    count = shared_state.get_backend().incr_window(f"rl:{identifier}", RATE_LIMIT_WINDOW_SEC)
+    return count <= limit
+
+def otp_rate_limited(action: str, phone: str) -> bool:
+    """True when the phone or the client address is over the limit for an OTP action (send / verify)."""
+    phone_ok = check_rate_limit(f"{action}:phone:{phone}", RATE_LIMIT_MAX)
+    ip_ok = check_rate_limit(f"{action}:ip:{request.remote_addr or '-'}", RATE_LIMIT_IP_MAX)
+    return not (phone_ok and ip_ok)
 
 def get_serializer() -> URLSafeTimedSerializer:
     return URLSafeTimedSerializer(app.config["SECRET_KEY"])
@@ -123,6 +194,110 @@ def deep_merge(base, override):
             out[k] = v
     return out
 
+# ================= HTTP caching =================
+
+# services / working days only change when an admin saves -> browsers and a CDN may reuse them
+SERVICES_CACHE_CONTROL = "public, max-age=60, stale-while-revalidate=600"
+# availability is behind login and moves with every booking -> short private reuse only
+DAY_SLOTS_CACHE_CONTROL = "private, max-age=5, stale-while-revalidate=30"
+TODAY_SLOTS_CACHE_CONTROL = "private, no-cache"
+
+# day-slots ?enc=min: minute of day ([540, 570]) instead of "HH:MM" - roughly half the bytes
+SLOT_ENCODINGS = {"hhmm": minutes_to_hhmm, "min": int}
+
+def etag_for(*parts) -> str:
+    return hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()
+
+def conditional_json(payload, etag: str, cache_control: str):
+    """jsonify with an ETag; answers 304 (no body) when If-None-Match matches."""
+    # weak match: compressed responses carry the same ETag marked weak
+    if request.if_none_match.contains_weak(etag):
+        resp = app.response_class(status=304)
+    else:
+        resp = jsonify(payload)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = cache_control
+    return resp
+
+# ================= Device tokens ("remember this device") =================
+
+# DEVICE_TOKENS=signed -> stateless itsdangerous tokens (no TrustedDevice row / lookup)
+# anything else        -> random token, SHA-256 stored in TrustedDevice (legacy)
+DEVICE_TOKEN_MODE = os.environ.get("DEVICE_TOKENS", "db")
+DEVICE_TOKEN_VERSION = 1  # bump to invalidate every signed token at once
+DEVICE_TOKEN_DAYS = 200
+REVOCATION_REFRESH_SEC = 30
+
+_revoked_device_jtis = {"ids": set(), "loaded_at": 0.0}
+
+def revoked_device_jtis() -> set:
+    """Small in-memory set, reloaded from the DB at most every REVOCATION_REFRESH_SEC."""
+    cache = _revoked_device_jtis
+    if time.monotonic() - cache["loaded_at"] > REVOCATION_REFRESH_SEC:
+        rows = db.session.query(RevokedDeviceToken.jti).filter(
+            RevokedDeviceToken.expires_at > dt.datetime.utcnow()
+        ).all()
+        cache["ids"] = {jti for (jti,) in rows}
+        cache["loaded_at"] = time.monotonic()
+    return cache["ids"]
+
+def issue_device_token(user_id: int) -> str:
+    expires_at = dt.datetime.utcnow() + dt.timedelta(days=DEVICE_TOKEN_DAYS)
+
+    if DEVICE_TOKEN_MODE == "signed":
+        return get_serializer().dumps(
+            {"v": DEVICE_TOKEN_VERSION, "uid": user_id, "jti": secrets.token_urlsafe(12)},
+            salt="device-token",
+        )
+
+    device_token = secrets.token_urlsafe(32)
+    db.session.add(TrustedDevice(
+        user_id=user_id,
+        device_token_hash=hashlib.sha256(device_token.encode()).hexdigest(),
+        expires_at=expires_at
+    ))
+    return device_token
+
+def _load_signed_device_token(device_token: str):
+    try:
+        data = get_serializer().loads(
+            device_token, salt="device-token", max_age=DEVICE_TOKEN_DAYS * 24 * 60 * 60
+        )
+    except (BadSignature, SignatureExpired):
+        return None
+    if not isinstance(data, dict) or data.get("v") != DEVICE_TOKEN_VERSION:
+        return None
+    return data
+
+def device_token_user_id(device_token: str):
+    """user id for a remembered device; signed tokens need no DB query."""
+    if "." in device_token:
+        data = _load_signed_device_token(device_token)
+        if not data or data.get("jti") in revoked_device_jtis():
+            return None
+        return data.get("uid")
+
+    token_hash = hashlib.sha256(device_token.encode()).hexdigest()
+    trusted = TrustedDevice.query.filter_by(device_token_hash=token_hash).first()
+    if trusted and trusted.expires_at > dt.datetime.utcnow():
+        return trusted.user_id
+    return None
+
+def revoke_device_token(device_token: str):
+    if "." in device_token:
+        data = _load_signed_device_token(device_token)
+        if not data:
+            return
+        db.session.merge(RevokedDeviceToken(
+            jti=data["jti"],
+            expires_at=dt.datetime.utcnow() + dt.timedelta(days=DEVICE_TOKEN_DAYS),
+        ))
+        _revoked_device_jtis["ids"].add(data["jti"])
+    else:
+        token_hash = hashlib.sha256(device_token.encode()).hexdigest()
+        TrustedDevice.query.filter_by(device_token_hash=token_hash).delete()
+    db.session.commit()
+
 # ================= AUTH (customer) =================
 
 def session_user():
@@ -135,12 +310,11 @@ def session_user():
     # Check device cookie
     device_token = request.cookies.get("qs_device")
     if device_token:
-        token_hash = hashlib.sha256(device_token.encode()).hexdigest()
-        trusted = TrustedDevice.query.filter_by(device_token_hash=token_hash).first()
-        if trusted and trusted.expires_at > dt.datetime.utcnow():
+        uid = device_token_user_id(device_token)
+        if uid:
             # Refresh session
-            session["user_id"] = trusted.user_id
-            return User.query.get(trusted.user_id)
+            session["user_id"] = uid
+            return User.query.get(uid)
     return None
 
 def require_login():
@@ -161,6 +335,50 @@ def require_phone_token(token: str, phone: str, max_age_sec: int = 600) -> bool:
         return False
     return data.get("phone") == phone
 
+# ================= OTP verification =================
+
+def consume_otp(phone: str, code: str):
+    """
+    Checks and consumes an OTP with one conditional UPDATE ... RETURNING:
+    only a live row (not expired, attempts left) matches; a wrong code costs
+    one attempt, the right one zeroes attempts so it can't be reused.
+    Returns (status, attempts_left), status in ok/wrong/expired/locked/not_found.
+
+    On "ok" the UPDATE is left uncommitted (row stays locked) so the caller
+    can create the user/device and delete the code in the same transaction.
+    """
+    now = dt.datetime.utcnow()
+    code_hash = hashlib.sha256(code.encode()).hexdigest()
+    matched = PhoneVerification.code_hash == code_hash
+
+    stmt = (
+        update(PhoneVerification)
+        .where(
+            PhoneVerification.phone == phone,
+            PhoneVerification.expires_at > now,
+            PhoneVerification.attempts > 0,
+        )
+        .values(attempts=case((matched, 0), else_=PhoneVerification.attempts - 1))
+        .returning(PhoneVerification.attempts, matched.label("matched"))
+        .execution_options(synchronize_session=False)
+    )
+    row = db.session.execute(stmt).first()
+
+    if row is not None:
+        if row.matched:
+            return "ok", 0
+        db.session.commit()
+        return "wrong", row.attempts
+
+    # failure path only: tell the user why, and drop the dead row
+    v = PhoneVerification.query.filter_by(phone=phone).order_by(PhoneVerification.created_at.desc()).first()
+    if not v:
+        return "not_found", 0
+    status = "expired" if now > v.expires_at else "locked"
+    db.session.delete(v)
+    db.session.commit()
+    return status, 0
+
 # ================= Admin Auth =================
 
 def load_admin_whitelist() -> dict:
@@ -206,15 +424,12 @@ def admin_generate_otp() -> str:
 
 # ================= Business Config + Overrides =================
 
-def load_business_config_map() -> dict:
+def normalize_business_config(raw) -> dict:
     """
-    Loads business_config.json and normalizes to:
+    Normalizes a business_config.json document to:
     { "businesses": { "<slug>": { ...cfg... } } }
     Backward-compatible: if file is single-business dict, it becomes {"default": cfg}.
     """
-    with open(BUSINESS_CONFIG_FILE, encoding="utf-8") as f:
-        raw = json.load(f)
-
     # Backward compatibility (old format: single business dict)
     if isinstance(raw, dict) and "businesses" not in raw:
         return {"businesses": {"default": raw}}
@@ -224,11 +439,41 @@ def load_business_config_map() -> dict:
 
     return raw
 
-def load_admin_overrides_all() -> dict:
-    return _read_json(ADMIN_OVERRIDES_FILE, {})
+_business_config_file_cache = {"mtime": None, "map": None}
 
-def save_admin_overrides_all(all_overrides: dict):
-    _atomic_write_json(ADMIN_OVERRIDES_FILE, all_overrides)
+def load_business_config_map() -> dict:
+    """business_config.json, parsed once per file change (fallback for slugs not in the registry)."""
+    try:
+        mtime = os.path.getmtime(BUSINESS_CONFIG_FILE)
+    except OSError:
+        return {"businesses": {}}
+
+    cache = _business_config_file_cache
+    if cache["mtime"] != mtime:
+        with open(BUSINESS_CONFIG_FILE, encoding="utf-8") as f:
+            cache["map"] = normalize_business_config(json.load(f))
+        cache["mtime"] = mtime
+    return cache["map"]
+
+def get_base_business_cfg(slug: str):
+    """
+    Registry (DB, per-slug) first; business_config.json for slugs not imported yet.
+    Always a private copy: callers merge into and normalize it in place.
+    """
+    cfg = tenant_store.get_tenant_config(slug)
+    if cfg is not None:
+        return cfg
+    return copy.deepcopy(load_business_config_map()["businesses"].get(slug))
+
+with app.app_context():
+    # legacy single-file overrides -> tenant_overrides rows (only slugs not imported yet)
+    tenant_store.import_legacy_overrides(_read_json(ADMIN_OVERRIDES_FILE, {}))
+
+@tenant_store.on_change
+def _on_tenant_override_change(slug, version):
+    # runs in every worker that notices the new version
+    slot_event_hub.publish_business(slug, {"type": "changed"})
+    drop_landing_page(slug)
 
 def resolve_business_cfg(slug: str) -> dict:
     """Return business cfg for slug, merged with admin overrides."""
@@ -236,17 +481,17 @@ def resolve_business_cfg(slug: str) -> dict:
     if not slug:
         abort(404)
 
-    cfg_map = load_business_config_map()["businesses"]
-    base_cfg = cfg_map.get(slug)
+    base_cfg = get_base_business_cfg(slug)
     if not base_cfg:
         abort(404)
 
+    override, _ = tenant_store.get_override(slug)
+    return merge_business_cfg(slug, base_cfg, override)
+
+def merge_business_cfg(slug: str, base_cfg: dict, override: dict) -> dict:
     base_cfg = dict(base_cfg)  # defensive copy
     base_cfg.setdefault("slug", slug)
 
-    overrides_all = load_admin_overrides_all()
-    override = overrides_all.get(slug) or {}
-
     merged = deep_merge(base_cfg, override)
 
     wh = merged.get("working_hours")
@@ -260,11 +505,19 @@ def resolve_business_cfg(slug: str) -> dict:
 
 # ================= Calendar =================
 
+# the OAuth token is shared through shared_state (JSON), so one refresh
+# serves every worker / node; token.pkl stays as the local seed / fallback
+GOOGLE_TOKEN_KEY = "google:token"
+
 def get_calendar_service():
     creds = None
-    if os.path.exists(TOKEN_FILE):
+    raw = shared_state.get_backend().get(GOOGLE_TOKEN_KEY)
+    if raw:
+        creds = Credentials.from_authorized_user_info(json.loads(raw), SCOPES)
+    elif os.path.exists(TOKEN_FILE):
         with open(TOKEN_FILE, "rb") as f:
             creds = pickle.load(f)
+        shared_state.get_backend().set(GOOGLE_TOKEN_KEY, creds.to_json().encode())
 
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
@@ -277,30 +530,219 @@ def get_calendar_service():
 
         with open(TOKEN_FILE, "wb") as f:
             pickle.dump(creds, f)
+        shared_state.get_backend().set(GOOGLE_TOKEN_KEY, creds.to_json().encode())
 
-    return build("calendar", "v3", credentials=creds)
+    # bounded per-call timeout: a hung Google request must not hold a worker
+    http = AuthorizedHttp(creds, http=httplib2.Http(timeout=calendar_gate.CALL_TIMEOUT_SEC))
+    return build("calendar", "v3", http=http, cache_discovery=False)
 
-def is_free(service, calendar_id, start_utc, end_utc):
+def calendar_execute(cfg: dict, req):
+    """
+    Runs one Google Calendar request inside the business's fair-share slot,
+    behind the circuit breaker (calendar_gate). Outages raise CalendarUnavailable.
+    """
+    return calendar_gate.call(cfg["slug"], cfg.get("plan"), req.execute)
+
+@app.errorhandler(calendar_gate.CalendarOverloaded)
+def calendar_overloaded(e):
+    # 429: this business is over its share; 503: calendar capacity exhausted / calendar down
+    resp = jsonify({"ok": False, "message": e.message})
+    resp.status_code = e.status
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
+
+def add_event(service, calendar_id, start_local, end_local, name, phone, cfg, recurrence=None, event_id=None):
+    tz = cfg["timezone"]
     body = {
-        "timeMin": start_utc.isoformat().replace("+00:00", "Z"),
-        "timeMax": end_utc.isoformat().replace("+00:00", "Z"),
-        "items": [{"id": calendar_id}],
+        "summary": f"תור - {name}",
+        "description": f"טלפון: {phone}",
+        "start": {"dateTime": start_local.isoformat(), "timeZone": tz},
+        "end": {"dateTime": end_local.isoformat(), "timeZone": tz},
     }
-    fb = service.freebusy().query(body=body).execute()
-    return not fb["calendars"][calendar_id]["busy"]
-
-def add_event(service, calendar_id, start_local, end_local, name, phone, tz):
-    event = service.events().insert(
+    if recurrence:
+        body["recurrence"] = recurrence
+    if event_id:
+        # client-chosen id makes a retried insert idempotent (409 instead of a duplicate)
+        body["id"] = event_id
+    event = calendar_execute(cfg, service.events().insert(
         calendarId=calendar_id,
-        body={
-            "summary": f"תור - {name}",
-            "description": f"טלפון: {phone}",
-            "start": {"dateTime": start_local.isoformat(), "timeZone": tz},
-            "end": {"dateTime": end_local.isoformat(), "timeZone": tz},
-        },
-    ).execute()
+        body=body,
+    ))
     return event
 
+def _minute_of_day(t: dt.datetime, date: dt.date, round_up: bool = False) -> int:
+    """Wall-clock minute of `t` on `date`, clamped to [0, 1440]."""
+    if t.date() < date:
+        return 0
+    if t.date() > date:
+        return 24 * 60
+    m = t.hour * 60 + t.minute
+    if round_up and (t.second or t.microsecond):
+        m += 1
+    return m
+
+# Google caps one freebusy query at 50 calendars
+FREEBUSY_MAX_ITEMS = 50
+
+def fetch_busy_range(cfg: dict, start_local: dt.datetime, end_local: dt.datetime) -> dict:
+    """
+    Busy intervals in [start_local, end_local) per calendar_id, as local
+    (start, end) datetimes. All resource calendars go in one freebusy call
+    (several `items`), split only past FREEBUSY_MAX_ITEMS.
+    """
+    tz = ZoneInfo(cfg["timezone"])
+    calendar_ids = list(dict.fromkeys(view["calendar_id"] for _, view in resource_cfgs(cfg)))
+
+    service = get_calendar_service()
+    busy = {}
+    for i in range(0, len(calendar_ids), FREEBUSY_MAX_ITEMS):
+        chunk = calendar_ids[i:i + FREEBUSY_MAX_ITEMS]
+        body = {
+            "timeMin": start_local.astimezone(dt.timezone.utc).isoformat().replace("+00:00", "Z"),
+            "timeMax": end_local.astimezone(dt.timezone.utc).isoformat().replace("+00:00", "Z"),
+            "items": [{"id": cid} for cid in chunk],
+        }
+        fb = calendar_execute(cfg, service.freebusy().query(body=body))
+
+        for cid in chunk:
+            intervals = []
+            for b in fb["calendars"].get(cid, {}).get("busy", []):
+                b_s = dt.datetime.fromisoformat(b["start"].replace("Z", "+00:00")).astimezone(tz)
+                b_e = dt.datetime.fromisoformat(b["end"].replace("Z", "+00:00")).astimezone(tz)
+                intervals.append((b_s, b_e))
+            busy[cid] = intervals
+    return busy
+
+def fetch_resource_busy(cfg: dict, start_local: dt.datetime, end_local: dt.datetime) -> dict:
+    """
+    Busy intervals in [start_local, end_local) per resource_id, as local
+    (start, end) datetimes. A calendar of its own is that resource's busy
+    time. A calendar several resources share can't tell whose time is
+    whose: our bookings on it count for their Appointment.resource_id only,
+    and the rest of its busy time (foreign events) blocks every resource
+    sharing it.
+    """
+    by_calendar = fetch_busy_range(cfg, start_local, end_local)
+    views = resource_cfgs(cfg)
+    sharing = {}
+    for rid, view in views:
+        sharing.setdefault(view["calendar_id"], []).append(rid)
+
+    out = {}
+    booked = None
+    for rid, view in views:
+        cal_busy = by_calendar.get(view["calendar_id"], [])
+        owners = sharing[view["calendar_id"]]
+        if len(owners) == 1:
+            out[rid] = cal_busy
+            continue
+        if booked is None:
+            booked = booked_intervals(cfg, start_local, end_local)
+        ours = [iv for r in owners for iv in booked.get(r, [])]
+        out[rid] = subtract_intervals(cal_busy, ours) + booked.get(rid, [])
+    return out
+
+def booked_intervals(cfg: dict, start_local: dt.datetime, end_local: dt.datetime) -> dict:
+    """
+    Our bookings that are on the calendar (not pending), per resource, as
+    local (start, end) datetimes overlapping [start_local, end_local).
+    """
+    slug = cfg["slug"]
+    tz = ZoneInfo(cfg["timezone"])
+    default_rid = resource_cfgs(cfg)[0][0]
+    # a booking is at most a day long: one day of margin catches those running into the window
+    lo = start_local.astimezone(tz).replace(tzinfo=None) - dt.timedelta(days=1)
+    hi = end_local.astimezone(tz).replace(tzinfo=None)
+
+    out = {}
+    rows = db.session.query(
+        Appointment.start_time, Appointment.duration_minutes, Appointment.resource_id
+    ).filter(
+        Appointment.business_slug == slug,
+        Appointment.start_time >= lo,
+        Appointment.start_time < hi,
+        (Appointment.status.is_(None)) | (Appointment.status != "pending"),
+    )
+    items = [(start, duration or 1, rid) for start, duration, rid in rows]
+    items += [(occ, sr.duration_minutes, sr.resource_id) for sr, occ in admin_reports.series_occurrences(slug, lo, hi)]
+    for start, duration, rid in items:
+        s = start.replace(tzinfo=tz)
+        e = s + dt.timedelta(minutes=block_minutes(cfg, duration))
+        if s < end_local and e > start_local:
+            out.setdefault(rid or default_rid, []).append((s, e))
+    return out
+
+def fetch_busy_minutes(cfg: dict, date: dt.date) -> dict:
+    """
+    Busy intervals of the whole local day per resource as (start_min, end_min):
+    calendar busy time plus unexpired waitlist holds.
+    """
+    return fetch_busy_days(cfg, [date])[date]
+
+def fetch_busy_days(cfg: dict, dates) -> dict:
+    """
+    fetch_busy_minutes for several days from one freebusy window (first to
+    last date): {date: {resource_id: [(start_min, end_min), ...]}}.
+    """
+    tz = ZoneInfo(cfg["timezone"])
+    dates = sorted(dates)
+    window_start = dt.datetime.combine(dates[0], dt.time(0, 0), tzinfo=tz)
+    window_end = dt.datetime.combine(dates[-1] + dt.timedelta(days=1), dt.time(0, 0), tzinfo=tz)
+
+    by_resource = fetch_resource_busy(cfg, window_start, window_end)
+    views = resource_cfgs(cfg)
+    out = {date: {rid: [] for rid, _ in views} for date in dates}
+    for rid, _ in views:
+        for b_s, b_e in by_resource.get(rid, []):
+            # an interval may run over midnight: clip it into every day it touches
+            day = b_s.date()
+            while day <= b_e.date():
+                if day in out:
+                    out[day][rid].append((_minute_of_day(b_s, day), _minute_of_day(b_e, day, round_up=True)))
+                day += dt.timedelta(days=1)
+
+    for date in dates:
+        release_expired_holds(cfg["slug"], date)
+        for rid, s, e in waitlist.held_intervals(cfg["slug"], date):
+            out[date].setdefault(rid or views[0][0], []).append((s, e))
+    return out
+
+def local_busy_minutes(cfg: dict, date: dt.date) -> dict:
+    """
+    Degraded mode: busy time known without the calendar (our own bookings,
+    series and waitlist holds), per resource as (start_min, end_min).
+    """
+    slug = cfg["slug"]
+    default_rid = resource_cfgs(cfg)[0][0]
+    day_start = dt.datetime.combine(date, dt.time.min)
+    day_end = day_start + dt.timedelta(days=1)
+
+    busy = {}
+    rows = db.session.query(
+        Appointment.start_time, Appointment.duration_minutes, Appointment.resource_id
+    ).filter(
+        Appointment.business_slug == slug,
+        Appointment.start_time >= day_start,
+        Appointment.start_time < day_end,
+    )
+    for start, duration, rid in rows:
+        s = start.hour * 60 + start.minute
+        busy.setdefault(rid or default_rid, []).append((s, s + block_minutes(cfg, duration or 1)))
+    for sr, occ in admin_reports.series_occurrences(slug, day_start, day_end):
+        s = occ.hour * 60 + occ.minute
+        busy.setdefault(sr.resource_id or default_rid, []).append((s, s + block_minutes(cfg, sr.duration_minutes)))
+    for rid, s, e in waitlist.held_intervals(slug, date):
+        busy.setdefault(rid or default_rid, []).append((s, e))
+    return busy
+
+def release_expired_holds(slug: str = None, date: dt.date = None) -> int:
+    """Unclaimed waitlist holds go to the next in line, or back to public availability."""
+    expired = waitlist.expire_holds(slug, date)
+    for entry, nxt in expired:
+        if nxt is None:
+            mark_day_stale(entry.business_slug, entry.date, entry.offered_start_min)
+    return len(expired)
+
 # ================= Admin Routes =================
 
 @app.route("/admin/login")
@@ -327,6 +769,9 @@ def admin_login_start():
     if not phone:
         return render_template("admin_login.html", step="phone", error="טלפון לא תקין", next_url=next_url)
 
+    if otp_rate_limited("admin_send", phone):
+        return render_template("admin_login.html", step="phone", error=RATE_LIMIT_MESSAGE, next_url=next_url), 429
+
     ok, slugs = is_admin_phone_allowed(phone)
     if not ok:
         return render_template("admin_login.html", step="phone", error="טלפון לא מורשה", next_url=next_url)
@@ -354,8 +799,8 @@ def admin_login_start():
     if os.environ.get("ENV") == "DEV":
         print(f"\n[DEV MODE] ADMIN OTP for {phone}: {otp}\n")
     else:
-        # Placeholder for delivery
-        print(f"Sending ADMIN OTP {otp} to {phone}")
+        # queued; the request doesn't wait for the SMS provider
+        send_sms(phone, f"קוד הכניסה לניהול: {otp}", kind="admin_otp")
 
     session["admin_pending_phone"] = phone
     session["admin_pending_slugs"] = slugs
@@ -372,31 +817,27 @@ def admin_login_verify():
     if not phone or not code:
         return redirect(f"/admin/login?next={next_url}")
 
-    v = PhoneVerification.query.filter_by(phone=phone).order_by(PhoneVerification.created_at.desc()).first()
-    
-    if not v:
+    if otp_rate_limited("admin_verify", phone):
+        return render_template(
+            "admin_login.html", step="otp", pending_phone=phone, error=RATE_LIMIT_MESSAGE, next_url=next_url
+        ), 429
+
+    status, attempts_left = consume_otp(phone, code)
+
+    if status == "not_found":
         return render_template("admin_login.html", step="phone", error="לא נמצאה בקשת אימות", next_url=next_url)
 
-    if dt.datetime.utcnow() > v.expires_at:
-        db.session.delete(v)
-        db.session.commit()
+    if status == "expired":
         return render_template("admin_login.html", step="phone", error="הקוד פג תוקף", next_url=next_url)
 
-    if v.attempts <= 0:
-        db.session.delete(v)
-        db.session.commit()
+    if status == "locked":
         return render_template("admin_login.html", step="phone", error="יותר מדי ניסיונות כושלים", next_url=next_url)
 
-    # Decrease attempts
-    v.attempts -= 1
-    db.session.commit()
-
-    code_hash = hashlib.sha256(code.encode()).hexdigest()
-    if v.code_hash != code_hash:
-        return render_template("admin_login.html", step="otp", pending_phone=phone, error=f"קוד שגוי. נשארו עוד {v.attempts} ניסיונות", next_url=next_url)
+    if status == "wrong":
+        return render_template("admin_login.html", step="otp", pending_phone=phone, error=f"קוד שגוי. נשארו עוד {attempts_left} ניסיונות", next_url=next_url)
 
     # Success!
-    db.session.delete(v)
+    PhoneVerification.query.filter_by(phone=phone).delete()
     db.session.commit()
 
     # Admin session
@@ -444,7 +885,7 @@ def _validate_hours(start: str, end: str) -> bool:
     return _time_to_minutes(start) < _time_to_minutes(end)
 
 def _normalize_working_hours_for_override(existing_wh, form_data):
-    wh = existing_wh or {"default": {}, "by_day": {}}
+    wh = copy.deepcopy(existing_wh) if existing_wh else {"default": {}, "by_day": {}}
     wh.setdefault("default", {})
     wh.setdefault("by_day", {})
 
@@ -537,10 +978,12 @@ def admin_dashboard(business_slug):
     closed_dates_text = "\n".join(closed_dates)
 
     services = cfg.get("services", []) or []
+    _, config_version = tenant_store.get_override(business_slug)
 
     return render_template(
         "admin_dashboard.html",
         business_slug=business_slug,
+        config_version=config_version,
         cfg=cfg,
         display=cfg.get("display", {}),
         services=services,
@@ -551,89 +994,84 @@ def admin_dashboard(business_slug):
         flash_err=session.pop("admin_flash_err", None),
     )
 
-@app.route("/admin/<business_slug>/update", methods=["POST"])
-def admin_update(business_slug):
-    # protect
-    s = admin_session()
-    if not s:
-        return redirect(f"/admin/login?next=/admin/{business_slug}/")
-    if business_slug not in s["slugs"]:
-        abort(403)
-
-    cfg = resolve_business_cfg(business_slug)
-
+def _parse_admin_override(cfg: dict, form):
+    """Admin form -> override payload. Returns (override, error_message)."""
     # ---- parse form ----
-    display_name = (request.form.get("display_name") or "").strip()
+    display_name = (form.get("display_name") or "").strip()
 
-    working_days = request.form.getlist("working_days")
+    working_days = form.getlist("working_days")
     # allow only known keys
     valid_day_keys = {"sun","mon","tue","wed","thu","fri","sat"}
     working_days = [d for d in working_days if d in valid_day_keys]
 
-    wh_default_start = (request.form.get("wh_default_start") or "").strip()
-    wh_default_end = (request.form.get("wh_default_end") or "").strip()
-    wh_fri_start = (request.form.get("wh_fri_start") or "").strip()
-    wh_fri_end = (request.form.get("wh_fri_end") or "").strip()
+    wh_default_start = (form.get("wh_default_start") or "").strip()
+    wh_default_end = (form.get("wh_default_end") or "").strip()
+    wh_fri_start = (form.get("wh_fri_start") or "").strip()
+    wh_fri_end = (form.get("wh_fri_end") or "").strip()
 
-    closed_dates_raw = (request.form.get("closed_dates") or "")
+    closed_dates_raw = (form.get("closed_dates") or "")
     closed_dates = []
     for line in closed_dates_raw.replace(",", "\n").splitlines():
         x = line.strip()
         if not x:
             continue
         if not _validate_date_iso(x):
-            session["admin_flash_err"] = f"תאריך חסום לא תקין: {x}"
-            return redirect(f"/admin/{business_slug}/")
+            return None, f"תאריך חסום לא תקין: {x}"
         if x not in closed_dates:
             closed_dates.append(x)
 
     # services arrays
-    svc_ids = request.form.getlist("svc_id")
-    svc_names = request.form.getlist("svc_name")
-    svc_durations = request.form.getlist("svc_duration")
+    svc_ids = form.getlist("svc_id")
+    svc_names = form.getlist("svc_name")
+    svc_durations = form.getlist("svc_duration")
+    svc_buffers = form.getlist("svc_buffer")
+    # older forms have no buffer column
+    svc_buffers += [""] * (len(svc_ids) - len(svc_buffers))
 
     services = []
-    for sid, sn, sd in zip(svc_ids, svc_names, svc_durations):
+    for sid, sn, sd, sb in zip(svc_ids, svc_names, svc_durations, svc_buffers):
         sid = (sid or "").strip()
         sn = (sn or "").strip()
         sd = (sd or "").strip()
+        sb = (sb or "").strip()
 
         if not sid and not sn and not sd:
             continue
 
         if not sid:
-            session["admin_flash_err"] = "שירות חייב id"
-            return redirect(f"/admin/{business_slug}/")
+            return None, "שירות חייב id"
         if not re.fullmatch(r"[a-zA-Z0-9_-]{2,40}", sid):
-            session["admin_flash_err"] = f"id לא תקין לשירות: {sid}"
-            return redirect(f"/admin/{business_slug}/")
+            return None, f"id לא תקין לשירות: {sid}"
         if not sn:
-            session["admin_flash_err"] = f"שירות {sid} חייב name"
-            return redirect(f"/admin/{business_slug}/")
+            return None, f"שירות {sid} חייב name"
         try:
             dur = int(sd)
         except ValueError:
-            session["admin_flash_err"] = f"duration לא מספר עבור {sid}"
-            return redirect(f"/admin/{business_slug}/")
+            return None, f"duration לא מספר עבור {sid}"
         if dur <= 0 or dur > 600:
-            session["admin_flash_err"] = f"duration לא תקין עבור {sid}"
-            return redirect(f"/admin/{business_slug}/")
+            return None, f"duration לא תקין עבור {sid}"
+        try:
+            buf = int(sb) if sb else 0
+        except ValueError:
+            return None, f"זמן התארגנות לא מספר עבור {sid}"
+        if buf < 0 or buf > 120:
+            return None, f"זמן התארגנות לא תקין עבור {sid}"
 
-        services.append({"id": sid, "name": sn, "duration_minutes": dur})
+        svc = {"id": sid, "name": sn, "duration_minutes": dur}
+        if buf:
+            svc["buffer_minutes"] = buf
+        services.append(svc)
 
     if not working_days:
-        session["admin_flash_err"] = "חייב לבחור לפחות יום עבודה אחד"
-        return redirect(f"/admin/{business_slug}/")
+        return None, "חייב לבחור לפחות יום עבודה אחד"
 
     if not _validate_hours(wh_default_start, wh_default_end):
-        session["admin_flash_err"] = "שעות default לא תקינות (HH:MM, start<end)"
-        return redirect(f"/admin/{business_slug}/")
+        return None, "שעות default לא תקינות (HH:MM, start<end)"
 
     # friday override optional: either both empty, or both valid
     if (wh_fri_start or wh_fri_end):
         if not _validate_hours(wh_fri_start, wh_fri_end):
-            session["admin_flash_err"] = "שעות שישי לא תקינות (או השאר ריק)"
-            return redirect(f"/admin/{business_slug}/")
+            return None, "שעות שישי לא תקינות (או השאר ריק)"
 
     # ---- build override payload (ONLY what admin edits) ----
     override = {}
@@ -650,17 +1088,258 @@ def admin_update(business_slug):
     # normalized working_hours schema in overrides
     override["working_hours"] = _normalize_working_hours_for_override(
         cfg.get("working_hours"),
-        request.form
+        form
     )
 
-    # ---- save overrides ----
-    all_overrides = load_admin_overrides_all()
-    all_overrides[business_slug] = override
-    save_admin_overrides_all(all_overrides)
+    return override, None
+
+
+@app.route("/admin/<business_slug>/update", methods=["POST"])
+def admin_update(business_slug):
+    # the dashboard saves with fetch: a redirect would be followed and read as success
+    wants_json = request.accept_mimetypes.best == "application/json"
+
+    # protect
+    s = admin_session()
+    if not s:
+        if wants_json:
+            return jsonify({"ok": False, "message": "לא מחובר"}), 401
+        return redirect(f"/admin/login?next=/admin/{business_slug}/")
+    if business_slug not in s["slugs"]:
+        if wants_json:
+            return jsonify({"ok": False, "message": "אין הרשאה"}), 403
+        abort(403)
+
+    cfg = resolve_business_cfg(business_slug)
+
+    try:
+        expected_version = int(request.form.get("config_version") or 0)
+    except ValueError:
+        if wants_json:
+            return jsonify({"ok": False, "message": "גרסת הגדרות לא תקינה - יש לרענן את הדף"}), 400
+        expected_version = 0
+
+    override, error = _parse_admin_override(cfg, request.form)
+    if error:
+        if wants_json:
+            return jsonify({"ok": False, "message": error}), 400
+        session["admin_flash_err"] = error
+        return redirect(f"/admin/{business_slug}/")
+
+    # ---- save overrides (optimistic: only if nobody saved since this form was loaded) ----
+    try:
+        new_version = tenant_store.save_override(
+            business_slug, override, expected_version, updated_by=s["phone"]
+        )
+    except tenant_store.VersionConflict:
+        msg = "ההגדרות עודכנו בינתיים ע\"י מנהל אחר - יש לרענן את הדף ולנסות שוב"
+        if wants_json:
+            return jsonify({"ok": False, "message": msg}), 409
+        session["admin_flash_err"] = msg
+        return redirect(f"/admin/{business_slug}/")
+
+    mark_business_stale(business_slug)
+    drop_landing_page(business_slug)
+
+    if wants_json:
+        return jsonify({"ok": True, "config_version": new_version})
 
     session["admin_flash_ok"] = "המערכת עודכנה בהצלחה - השינויים נכנסו לתוקף"
     return redirect(f"/admin/{business_slug}/")
 
+@app.route("/admin/<business_slug>/preview", methods=["POST"])
+def admin_preview(business_slug):
+    """Same form as /update, nothing saved: which future appointments would fall outside the new schedule."""
+    s = admin_session()
+    if not s:
+        return jsonify({"ok": False, "message": "לא מחובר"}), 401
+    if business_slug not in s["slugs"]:
+        return jsonify({"ok": False, "message": "אין הרשאה"}), 403
+
+    cfg = resolve_business_cfg(business_slug)
+    # parsing normalizes the hours in place: work on a copy, a preview changes nothing
+    override, error = _parse_admin_override(copy.deepcopy(cfg), request.form)
+    if error:
+        return jsonify({"ok": False, "message": error}), 400
+
+    proposed = merge_business_cfg(business_slug, get_base_business_cfg(business_slug), override)
+    now_local = dt.datetime.now(ZoneInfo(cfg["timezone"]))
+    impact = admin_reports.schedule_change_conflicts(business_slug, proposed, now_local)
+    return jsonify({"ok": True, **impact})
+
+@app.route("/admin/<business_slug>/appointments")
+def admin_appointments(business_slug):
+    # protect
+    s = admin_session()
+    if not s:
+        return redirect(f"/admin/login?next=/admin/{business_slug}/appointments")
+    if business_slug not in s["slugs"]:
+        abort(403)
+
+    cfg = resolve_business_cfg(business_slug)
+    return render_template(
+        "admin_appointments.html",
+        business_slug=business_slug,
+        display=cfg.get("display", {}),
+        max_range_days=admin_reports.MAX_RANGE_DAYS,
+        resource_names={r["id"]: r.get("name") or r["id"] for r in cfg.get("resources") or []},
+    )
+
+@app.route("/admin/<business_slug>/api/appointments")
+def admin_api_appointments(business_slug):
+    """
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD -> per-day count / utilization
+    ?date=YYYY-MM-DD               -> that day's appointment list (default: from)
+    """
+    s = admin_session()
+    if not s:
+        return jsonify({"ok": False, "message": "לא מחובר"}), 401
+    if business_slug not in s["slugs"]:
+        return jsonify({"ok": False, "message": "אין הרשאה"}), 403
+
+    cfg = resolve_business_cfg(business_slug)
+    today = dt.datetime.now(ZoneInfo(cfg["timezone"])).date()
+
+    args = {}
+    for key in ("from", "to", "date"):
+        raw = (request.args.get(key) or "").strip()
+        if raw and not _validate_date_iso(raw):
+            return jsonify({"ok": False, "message": f"תאריך לא תקין: {raw}"}), 400
+        args[key] = dt.date.fromisoformat(raw) if raw else None
+
+    start = args["from"] or today
+    end = args["to"] or start + dt.timedelta(days=6)
+    day = args["date"] or start
+
+    try:
+        days = admin_reports.daily_summary(cfg, start, end, cfg_version=config_hash(cfg))
+    except ValueError:
+        return jsonify({
+            "ok": False,
+            "message": f"ניתן להציג עד {admin_reports.MAX_RANGE_DAYS} ימים"
+        }), 400
+
+    return jsonify({
+        "ok": True,
+        "days": days,
+        "date": day.isoformat(),
+        "appointments": admin_reports.day_appointments(business_slug, day),
+    })
+
+@app.route("/admin/<business_slug>/api/calendar-metrics")
+def admin_calendar_metrics(business_slug):
+    """This worker's calendar call counters for the business (calendar_gate)."""
+    s = admin_session()
+    if not s:
+        return jsonify({"ok": False, "message": "לא מחובר"}), 401
+    if business_slug not in s["slugs"]:
+        return jsonify({"ok": False, "message": "אין הרשאה"}), 403
+
+    return jsonify({
+        "ok": True,
+        "pid": os.getpid(),
+        "breaker": {"state": calendar_gate.breaker.state, **calendar_gate.breaker.stats},
+        **calendar_gate.gate.stats(business_slug),
+    })
+
+@app.route("/admin/<business_slug>/export.<fmt>")
+def admin_export(business_slug, fmt):
+    """
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD (default: current month) -> streamed file.
+    Rows are written as they are read, so any range works in flat memory.
+    """
+    s = admin_session()
+    if not s:
+        return redirect(f"/admin/login?next=/admin/{business_slug}/appointments")
+    if business_slug not in s["slugs"]:
+        abort(403)
+    if fmt not in exports.FORMATS:
+        abort(404)
+
+    cfg = resolve_business_cfg(business_slug)
+    today = dt.datetime.now(ZoneInfo(cfg["timezone"])).date()
+
+    args = {}
+    for key in ("from", "to"):
+        raw = (request.args.get(key) or "").strip()
+        if raw and not _validate_date_iso(raw):
+            return jsonify({"ok": False, "message": f"תאריך לא תקין: {raw}"}), 400
+        args[key] = dt.date.fromisoformat(raw) if raw else None
+
+    start = args["from"] or today.replace(day=1)
+    end = args["to"] or (start.replace(day=28) + dt.timedelta(days=4)).replace(day=1) - dt.timedelta(days=1)
+    if end < start:
+        return jsonify({"ok": False, "message": "תאריך הסיום לפני תאריך ההתחלה"}), 400
+
+    body = exports.encode(exports.iter_rows(business_slug, start, end), fmt)
+    filename = f"{business_slug}-{start.isoformat()}-{end.isoformat()}.{fmt}"
+    return Response(
+        stream_with_context(body),
+        mimetype="text/csv" if fmt == "csv" else "application/x-ndjson",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-store",
+        },
+    )
+
+# ================= STATIC ASSETS =================
+
+@app.context_processor
+def inject_asset_url():
+    def asset_url(name: str) -> str:
+        hashed = assets.load_manifest(ASSETS_DIR).get(name)
+        return f"/assets/{hashed}" if hashed else f"/static/{name}"
+    return {"asset_url": asset_url}
+
+@app.route("/assets/<path:filename>")
+def hashed_asset(filename):
+    """Fingerprinted build output (flask assets build): immutable, pre-compressed."""
+    if filename not in set(assets.load_manifest(ASSETS_DIR).values()):
+        abort(404)
+    encoding, path = assets.pick_encoding(
+        request.headers.get("Accept-Encoding"), os.path.join(ASSETS_DIR, filename)
+    )
+    resp = send_file(path, mimetype=mimetypes.guess_type(filename)[0], conditional=True)
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = assets.IMMUTABLE_CACHE
+    return resp
+
+# ================= LANDING PAGE CACHE =================
+
+# index.html depends only on the slug, its display config and the asset
+# build, so each slug is rendered once and served from memory after that.
+LANDING_CACHE_MAX = 1024
+
+_landing_cache = OrderedDict()  # slug -> (key, body, etag)
+_landing_lock = threading.Lock()
+
+with app.app_context():
+    app.jinja_env.get_template("index.html")  # compile once at startup
+
+def landing_page(slug: str, display: dict):
+    """(html, etag) for /b/<slug>/, rendered only when the display config or asset build changed."""
+    key = (config_hash(display), assets.manifest_version(ASSETS_DIR))
+    with _landing_lock:
+        hit = _landing_cache.get(slug)
+        if hit and hit[0] == key:
+            _landing_cache.move_to_end(slug)
+            return hit[1], hit[2]
+
+    body = render_template("index.html", business_slug=slug, api_base=f"/b/{slug}", display=display)
+    etag = hashlib.sha256(body.encode()).hexdigest()[:32]
+    with _landing_lock:
+        _landing_cache[slug] = (key, body, etag)
+        _landing_cache.move_to_end(slug)
+        while len(_landing_cache) > LANDING_CACHE_MAX:
+            _landing_cache.popitem(last=False)
+    return body, etag
+
+def drop_landing_page(slug: str):
+    with _landing_lock:
+        _landing_cache.pop(slug, None)
+
 # ================= ROUTES (Customer) =================
 
 @app.route("/")
@@ -670,14 +1349,15 @@ def home():
 @app.route("/b/<slug>/")
 def business_home(slug):
     cfg = resolve_business_cfg(slug)
-    display = cfg.get("display", {})
+    body, etag = landing_page(slug, cfg.get("display", {}))
 
-    return render_template(
-        "index.html",
-        business_slug=slug,
-        api_base=f"/b/{slug}",
-        display=display
-    )
+    if request.if_none_match.contains_weak(etag):
+        resp = app.response_class(status=304)
+    else:
+        resp = app.response_class(body, mimetype="text/html")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
 
 @app.route("/api/me")
 @app.route("/b/<slug>/api/me")
@@ -713,23 +1393,6 @@ def api_profile(slug="default"):
     return jsonify({"ok": True, "user": {"phone": u.phone, "name": u.name}})
 
 
-def in_break(start_dt, end_dt, breaks):
-    for b in breaks:
-        b_start = dt.datetime.combine(
-            start_dt.date(),
-            dt.datetime.strptime(b["start"], "%H:%M").time(),
-            tzinfo=start_dt.tzinfo
-        )
-        b_end = dt.datetime.combine(
-            start_dt.date(),
-            dt.datetime.strptime(b["end"], "%H:%M").time(),
-            tzinfo=start_dt.tzinfo
-        )
-        if start_dt < b_end and b_start < end_dt:
-            return True
-    return False
-
-
 @app.route("/api/day-slots")
 @app.route("/b/<slug>/api/day-slots")
 def api_day_slots(slug="default"):
@@ -763,23 +1426,28 @@ def api_day_slots(slug="default"):
     if not date_str:
         return jsonify({"error": "missing date"}), 400
 
-    date = dt.date.fromisoformat(date_str)
-
-    from booking_core import day_key, get_working_hours_for_date, ceil_to_slot
-
-    if day_key(date) not in cfg["working_days"]:
-        return jsonify({"slots": []})
-
-    if date.isoformat() in cfg.get("closed_dates", []):
-        return jsonify({"slots": []})
+    enc = request.args.get("enc") or "hhmm"
+    encode_slot = SLOT_ENCODINGS.get(enc)
+    if encode_slot is None:
+        return jsonify({"error": "invalid enc"}), 400
 
-    # ✅ NEW: שעות עבודה לפי הסכימה החדשה (כולל שישי)
-    wh = get_working_hours_for_date(cfg, date)
-    start_h = dt.datetime.strptime(wh["start"], "%H:%M").time()
-    end_h = dt.datetime.strptime(wh["end"], "%H:%M").time()
-    breaks = wh.get("breaks", [])
+    date = dt.date.fromisoformat(date_str)
+    cfg_version = config_hash(cfg)
+
+    # a booking holds the service + its buffer; offered starts sit on one grid
+    block = block_minutes(cfg, duration, request.args.get("service_id"))
+    step = slot_step(cfg, block)
+
+    # earliest open / latest close over all resources working that day
+    span = day_span(cfg, date)
+    if span is None:
+        return conditional_json(
+            {"slots": []},
+            etag_for(slug, date, duration, cfg_version, "closed"),
+            DAY_SLOTS_CACHE_CONTROL,
+        )
 
-    service = get_calendar_service()
+    end_h = dt.time(min(span[1], 24 * 60 - 1) // 60, min(span[1], 24 * 60 - 1) % 60)
 
     now_local = dt.datetime.now(tz)
     is_today = date == now_local.date()
@@ -788,60 +1456,147 @@ def api_day_slots(slug="default"):
     if is_today:
         end_dt = dt.datetime.combine(date, end_h, tzinfo=tz)
         if now_local >= end_dt:
-            return jsonify({"slots": []})
-
-    # === FETCH BUSY INTERVALS ===
-    start_dt = dt.datetime.combine(date, start_h, tzinfo=tz)
-    end_dt = dt.datetime.combine(date, end_h, tzinfo=tz)
+            return conditional_json(
+                {"slots": []},
+                etag_for(slug, date, duration, cfg_version, "after-hours"),
+                TODAY_SLOTS_CACHE_CONTROL,
+            )
 
-    # 🔒 Start point: use working start or buffered "now"
-    current_start = start_dt
+    # 🔒 Start point: opening time, or buffered "now" rounded up onto the grid
+    first_start = span[0]
     if is_today:
         # 10 minute buffer from "now"
         buffer_now = now_local + dt.timedelta(minutes=10)
-        if buffer_now > current_start:
-            current_start = buffer_now
+        first_start = grid_ceil(max(first_start, _minute_of_day(buffer_now, date, round_up=True)), span[0], step)
 
-    body = {
-        "timeMin": start_dt.astimezone(dt.timezone.utc).isoformat().replace("+00:00", "Z"),
-        "timeMax": end_dt.astimezone(dt.timezone.utc).isoformat().replace("+00:00", "Z"),
-        "items": [{"id": cfg["calendar_id"]}],
-    }
-    fb = service.freebusy().query(body=body).execute()
-    busy_list = fb["calendars"][cfg["calendar_id"]].get("busy", [])
+    if first_start >= 24 * 60:
+        return conditional_json(
+            {"slots": []},
+            etag_for(slug, date, duration, cfg_version, "after-hours"),
+            TODAY_SLOTS_CACHE_CONTROL,
+        )
 
-    busy_intervals = []
-    for b in busy_list:
-        b_s = dt.datetime.fromisoformat(b["start"].replace("Z", "+00:00")).astimezone(tz)
-        b_e = dt.datetime.fromisoformat(b["end"].replace("Z", "+00:00")).astimezone(tz)
-        busy_intervals.append((b_s, b_e))
+    # === MATERIALIZED AVAILABILITY (busy + breaks + hours already folded in) ===
+    try:
+        snap = get_day_snapshot(cfg, date, block, fetch_busy_minutes)
+    except calendar_gate.CalendarUnavailable:
+        # calendar down: last known availability, flagged stale and never cached
+        bitmap, _ = last_known_bitmap(cfg, date, block, lambda: local_busy_minutes(cfg, date))
+        resp = jsonify({
+            "slots": [encode_slot(m) for m in slots_from_bitmap(bitmap, first_start, step)],
+            "stale": True,
+        })
+        resp.headers["Cache-Control"] = "no-store"
+        return resp
+    starts = slots_from_bitmap(snap.slot_bitmap, first_start, step)
+    payload = {"slots": [encode_slot(m) for m in starts]}
+
+    if cfg.get("slot_ranking") == "best_fit" and starts:
+        # suggest the starts that leave the fewest unusable gaps
+        min_block = min((service_block(s) for s in cfg.get("services", [])), default=block)
+        ranked = rank_best_fit(snap.slot_bitmap, starts, min_block)
+        payload["suggested"] = [encode_slot(m) for m in ranked[:int(cfg.get("suggest_count") or 3)]]
+
+    etag = snapshot_etag(snap, first_start)
+    return conditional_json(
+        payload,
+        etag if enc == "hhmm" else etag_for(etag, enc),
+        TODAY_SLOTS_CACHE_CONTROL if is_today else DAY_SLOTS_CACHE_CONTROL,
+    )
 
-    # === PACK SLOTS BY DURATION ===
-    slots = []
 
-    cursor = current_start
-    if is_today:
-        cursor = ceil_to_slot(cursor, duration)
-    else:
-        cursor = dt.datetime.combine(date, start_h, tzinfo=tz)
+def first_offer_minute(cfg: dict, date: dt.date, step: int, now_local: dt.datetime):
+    """Earliest start on the day's grid that may still be offered (10 minute buffer today), or None."""
+    span = day_span(cfg, date)
+    if span is None or date < now_local.date():
+        return None
+    first_start = span[0]
+    if date == now_local.date():
+        buffer_now = now_local + dt.timedelta(minutes=10)
+        first_start = grid_ceil(max(first_start, _minute_of_day(buffer_now, date, round_up=True)), span[0], step)
+    return first_start if first_start < min(span[1], 24 * 60) else None
 
-    def overlaps(a_s, a_e, b_s, b_e):
-        return a_s < b_e and b_s < a_e
+@app.route("/api/next-available")
+@app.route("/b/<slug>/api/next-available")
+def api_next_available(slug="default"):
+    """
+    Nearest open times from `date` on (one per day, up to suggest_count),
+    closest to the preferred `time` - instead of the client trying day after day.
+    """
+    u, err = require_login()
+    if err:
+        return err
 
-    while cursor + dt.timedelta(minutes=duration) <= end_dt:
-        cand_s = cursor
-        cand_e = cursor + dt.timedelta(minutes=duration)
+    cfg = resolve_business_cfg(slug)
+    tz = ZoneInfo(cfg["timezone"])
+    now_local = dt.datetime.now(tz)
+    today = now_local.date()
 
-        if any(overlaps(cand_s, cand_e, b_s, b_e) for (b_s, b_e) in busy_intervals):
-            cursor += dt.timedelta(minutes=duration)
-            continue
+    try:
+        duration = int(request.args.get("duration") or 0)
+    except ValueError:
+        duration = 0
+    if duration <= 0:
+        return jsonify({"error": "invalid duration"}), 400
 
-        if not in_break(cand_s, cand_e, breaks):
-            slots.append(cursor.strftime("%H:%M"))
+    date_str = request.args.get("date") or today.isoformat()
+    time_str = request.args.get("time") or ""
+    if not _validate_date_iso(date_str) or (time_str and not _validate_time_hhmm(time_str)):
+        return jsonify({"error": "invalid date / time"}), 400
+
+    first = max(dt.date.fromisoformat(date_str), today)
+    last = today + dt.timedelta(days=int(cfg.get("lookahead_days") or 14))
+    days = [first + dt.timedelta(days=i) for i in range((last - first).days + 1)]
+
+    block = block_minutes(cfg, duration, request.args.get("service_id"))
+    step = slot_step(cfg, block)
+    found, stale = next_available(
+        cfg,
+        days,
+        block,
+        step,
+        lambda d: first_offer_minute(cfg, d, step, now_local),
+        fetch_busy_days,
+        preferred=_time_to_minutes(time_str) if time_str else None,
+        count=int(cfg.get("suggest_count") or 3),
+        local_busy=local_busy_minutes,
+    )
 
-        cursor += dt.timedelta(minutes=duration)
+    payload = {"slots": [{"date": d.isoformat(), "time": minutes_to_hhmm(m)} for d, m in found]}
+    if stale:
+        payload["stale"] = True
+    resp = jsonify(payload)
+    resp.headers["Cache-Control"] = "no-store" if stale else TODAY_SLOTS_CACHE_CONTROL
+    return resp
 
-    return jsonify({"slots": slots})
+
+@app.route("/api/day-slots/stream")
+@app.route("/b/<slug>/api/day-slots/stream")
+def api_day_slots_stream(slug="default"):
+    """SSE: booked / freed / changed deltas for one day, instead of polling day-slots."""
+    u, err = require_login()
+    if err:
+        return err
+
+    cfg = resolve_business_cfg(slug)
+    date_str = request.args.get("date") or ""
+    if not _validate_date_iso(date_str):
+        return jsonify({"error": "invalid date"}), 400
+
+    if slot_event_hub.full():
+        # each stream holds a greenlet / thread: past the cap the page keeps what it fetched
+        resp = jsonify({"error": "too many streams"})
+        resp.status_code = 503
+        resp.headers["Retry-After"] = "30"
+        return resp
+
+    resp = Response(
+        slot_event_hub.stream(cfg["slug"], date_str),
+        mimetype="text/event-stream",
+    )
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # nginx: don't buffer the stream
+    return resp
 
 
 # ====== AUTH: send code ======
@@ -856,6 +1611,9 @@ def auth_start(slug="default"):
     if not phone:
         return jsonify({"ok": False, "message": "מספר טלפון לא תקין"}), 400
 
+    if otp_rate_limited("send", phone):
+        return jsonify({"ok": False, "message": RATE_LIMIT_MESSAGE}), 429
+
     # Rate limit: max 1 code every 2 minutes per phone
     now = dt.datetime.utcnow()
     two_mins_ago = now - dt.timedelta(minutes=2)
@@ -889,8 +1647,8 @@ def auth_start(slug="default"):
     if is_dev:
         print(f"\n[DEV MODE] OTP for {phone}: {otp}\n")
     else:
-        # Placeholder for WhatsApp/SMS delivery
-        print(f"Sending OTP {otp} to {phone}")
+        # queued; the request doesn't wait for the SMS provider
+        send_sms(phone, f"קוד האימות שלך: {otp}", kind="otp")
 
     return jsonify({"ok": True})
 
@@ -905,37 +1663,28 @@ def auth_verify(slug="default"):
     if not phone or not code:
         return jsonify({"ok": False, "message": "חסרים פרטים"}), 400
 
-    v = PhoneVerification.query.filter_by(phone=phone).order_by(PhoneVerification.created_at.desc()).first()
+    if otp_rate_limited("verify", phone):
+        return jsonify({"ok": False, "message": RATE_LIMIT_MESSAGE}), 429
 
-    if not v:
+    status, attempts_left = consume_otp(phone, code)
+
+    if status == "not_found":
         return jsonify({"ok": False, "message": "לא נמצאה בקשת אימות"}), 404
 
-    if dt.datetime.utcnow() > v.expires_at:
-        db.session.delete(v)
-        db.session.commit()
+    if status == "expired":
         return jsonify({"ok": False, "message": "הקוד פג תוקף"}), 400
 
-    if v.attempts <= 0:
-        db.session.delete(v)
-        db.session.commit()
+    if status == "locked":
         return jsonify({"ok": False, "message": "יותר מדי ניסיונות כושלים"}), 429
 
-    # הורדת ניסיון
-    v.attempts -= 1
-    db.session.commit()
-
-    # השוואת hash
-    code_hash = hashlib.sha256(code.encode()).hexdigest()
-    if v.code_hash != code_hash:
+    if status == "wrong":
         return jsonify({
             "ok": False,
             "message": "קוד שגוי",
-            "attempts_left": v.attempts
+            "attempts_left": attempts_left
         }), 401
 
-    # הצלחה
-    db.session.delete(v)
-
+    # הצלחה: משתמש + מכשיר + מחיקת הקוד בטרנזקציה אחת
     user = User.query.filter_by(phone=phone).first()
     is_new = False
 
@@ -943,22 +1692,13 @@ def auth_verify(slug="default"):
         is_new = True
         user = User(phone=phone, name=name if name else None)
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()  # user.id for the device row
     elif name and not user.name:
         user.name = name
-        db.session.commit()
 
     # ===== זכירת מכשיר ל-200 יום =====
-    device_token = secrets.token_urlsafe(32)
-    device_hash = hashlib.sha256(device_token.encode()).hexdigest()
-    device_expiry = dt.datetime.utcnow() + dt.timedelta(days=200)
-
-    td = TrustedDevice(
-        user_id=user.id,
-        device_token_hash=device_hash,
-        expires_at=device_expiry
-    )
-    db.session.add(td)
+    device_token = issue_device_token(user.id)
+    PhoneVerification.query.filter_by(phone=phone).delete()
     db.session.commit()
 
     # ===== Session =====
@@ -981,7 +1721,7 @@ def auth_verify(slug="default"):
     resp.set_cookie(
         "qs_device",
         device_token,
-        max_age=200 * 24 * 60 * 60,  # 200 ימים
+        max_age=DEVICE_TOKEN_DAYS * 24 * 60 * 60,  # 200 ימים
         httponly=True,
         secure=app.config["SESSION_COOKIE_SECURE"],  # True בפרודקשן HTTPS
         samesite="Lax"
@@ -994,10 +1734,79 @@ def auth_verify(slug="default"):
 @app.route("/b/<slug>/api/logout", methods=["POST"])
 def api_logout(slug="default"):
     """
-    Clears the entire session.
+    Clears the entire session and forgets this device.
     """
     session.clear()
-    return jsonify({"success": True})
+    device_token = request.cookies.get("qs_device")
+    if device_token:
+        revoke_device_token(device_token)
+
+    resp = jsonify({"success": True})
+    resp.delete_cookie("qs_device")
+    return resp
+
+# ===== LIMIT FUTURE APPOINTMENTS PER USER =====
+MAX_ACTIVE_APPOINTMENTS = 4
+
+# stored start times are naive local times of their business; UTC offsets
+# stay within a day, so rows newer than utcnow - TZ_MARGIN are checked
+# against their own business's clock
+TZ_MARGIN = dt.timedelta(days=1)
+
+def business_now(slug: str) -> dt.datetime:
+    """The business's wall-clock now, naive like the stored start times."""
+    cfg = _business_cfg_or_none(slug or "default") or resolve_business_cfg("default")
+    return dt.datetime.now(ZoneInfo(cfg["timezone"])).replace(tzinfo=None)
+
+def active_booking_count(phone: str) -> int:
+    """Future single appointments + running series (a series counts once)."""
+    since = dt.datetime.utcnow() - TZ_MARGIN
+    rows = db.session.query(Appointment.business_slug, Appointment.start_time).filter(
+        Appointment.phone == phone,
+        Appointment.start_time >= since
+    ).all()
+    rows += db.session.query(AppointmentSeries.business_slug, AppointmentSeries.last_start).filter(
+        AppointmentSeries.phone == phone,
+        AppointmentSeries.last_start >= since
+    ).all()
+
+    nows = {}
+    count = 0
+    for slug, start in rows:
+        if slug not in nows:
+            nows[slug] = business_now(slug)
+        if start >= nows[slug]:
+            count += 1
+    return count
+
+def snap_to_grid(cfg: dict, start_local: dt.datetime, block: int) -> dt.datetime:
+    """Rounds a requested start up onto the day's slot grid (anchored at opening time)."""
+    span = day_span(cfg, start_local.date())
+    if span is None:
+        return start_local.replace(second=0, microsecond=0)
+    minute = grid_ceil(_minute_of_day(start_local, start_local.date(), round_up=True), span[0], slot_step(cfg, block))
+    midnight = dt.datetime.combine(start_local.date(), dt.time.min, tzinfo=start_local.tzinfo)
+    return midnight + dt.timedelta(minutes=minute)
+
+def resource_loads(slug: str, date: dt.date) -> dict:
+    """Booked minutes per resource on date (single appointments + series occurrences)."""
+    day_start = dt.datetime.combine(date, dt.time.min)
+    day_end = day_start + dt.timedelta(days=1)
+
+    rows = (
+        db.session.query(Appointment.resource_id, func.coalesce(func.sum(Appointment.duration_minutes), 0))
+        .filter(
+            Appointment.business_slug == slug,
+            Appointment.start_time >= day_start,
+            Appointment.start_time < day_end,
+        )
+        .group_by(Appointment.resource_id)
+        .all()
+    )
+    loads = {rid: int(minutes) for rid, minutes in rows}
+    for sr, _ in admin_reports.series_occurrences(slug, day_start, day_end):
+        loads[sr.resource_id] = loads.get(sr.resource_id, 0) + sr.duration_minutes
+    return loads
 
 # ====== BOOK (requires login session + completed profile) ======
 @app.route("/api/book", methods=["POST"])
@@ -1049,62 +1858,253 @@ def api_book(slug="default"):
     except ValueError:
         return jsonify({"ok": False, "message": "תאריך או שעה לא תקינים"}), 400
 
-    start_local = ceil_to_slot(start_local, 5) # Snap to 5 min instead of service duration
-    end_local = start_local + dt.timedelta(minutes=duration_minutes)
-
-    valid, msg = validate_slot(cfg, start_local, end_local)
-    if not valid:
+    # same grid /api/day-slots offers; the block includes the service buffer
+    block = block_minutes(cfg, duration_minutes, data.get("service_id"))
+    start_local = snap_to_grid(cfg, start_local, block)
+    end_local = start_local + dt.timedelta(minutes=block)
+
+    views = resource_cfgs(cfg)
+    candidates = []
+    msg = None
+    for i, (_, view) in enumerate(views):
+        valid, why = validate_slot(view, start_local, end_local)
+        if valid:
+            candidates.append(i)
+        elif msg is None:
+            msg = why
+    if not candidates:
         return jsonify({"ok": False, "message": msg})
 
-    service = get_calendar_service()
-    if not is_free(
-        service,
-        cfg["calendar_id"],
-        start_local.astimezone(dt.timezone.utc),
-        end_local.astimezone(dt.timezone.utc),
-    ):
+    start_min = start_local.hour * 60 + start_local.minute
+
+    # one freebusy call for every resource calendar
+    try:
+        busy = fetch_resource_busy(cfg, start_local, end_local)
+    except calendar_gate.CalendarUnavailable:
+        busy = None
+    if busy is not None:
+        candidates = [i for i in candidates if not busy.get(views[i][0])]
+    else:
+        # calendar down: judge by the last known availability + our own bookings,
+        # take the booking as pending and confirm it once the calendar is back
+        local = local_busy_minutes(cfg, start_local.date())
+        _, segments = last_known_bitmap(cfg, start_local.date(), block, lambda: local)
+        candidates = [
+            i for i in candidates
+            if bitmap_has(segments[i], start_min)
+            and not any(s < start_min + block and start_min < e for s, e in local.get(views[i][0], []))
+        ]
+
+    # time held for a waitlisted customer isn't bookable
+    held = waitlist.held_resources(slug, start_local.date(), start_min, start_min + block)
+    candidates = [i for i in candidates if views[i][0] not in held]
+    if not candidates:
         return jsonify({"ok": False, "message": "השעה תפוסה"})
 
     # ===== LIMIT FUTURE APPOINTMENTS PER USER =====
-    MAX_ACTIVE_APPOINTMENTS = 4
-
-    now = dt.datetime.utcnow()
-
-    active_count = Appointment.query.filter(
-        Appointment.phone == u.phone,
-        Appointment.start_time >= now
-    ).count()
-
-    if active_count >= MAX_ACTIVE_APPOINTMENTS:
+    if active_booking_count(u.phone) >= MAX_ACTIVE_APPOINTMENTS:
         return jsonify({
             "ok": False,
             "message": "ניתן לקבוע עד 4 תורים עתידיים לכל משתמש"
         }), 400
 
 
+    # least-loaded free resource takes the booking
+    resource_ids = [views[i][0] for i in candidates]
+    resource_id = pick_least_loaded(resource_ids, resource_loads(slug, start_local.date()))
+    resource_index = candidates[resource_ids.index(resource_id)]
+    calendar_id = views[resource_index][1]["calendar_id"]
+
     # יצירת אירוע בלוחות
-    event = add_event(
-        service,
-        cfg["calendar_id"],
-        start_local,
-        end_local,
-        f"{name} - {service_name}",
-        phone,
-        cfg["timezone"]
-    )
+    pending = busy is None
+    if not pending:
+        try:
+            event = add_event(
+                get_calendar_service(),
+                calendar_id,
+                start_local,
+                end_local,
+                f"{name} - {service_name}",
+                phone,
+                cfg,
+            )
+        except calendar_gate.CalendarUnavailable as e:
+            if e.__cause__ is not None:
+                # the insert reached Google and failed: it may exist, don't double-book
+                raise
+            pending = True  # breaker opened meanwhile: nothing was sent
 
     appointment = Appointment(
         name=name,
         phone=phone,
         start_time=start_local,
-        calendar_event_id=event["id"]
+        calendar_event_id=f"pending:{secrets.token_hex(12)}" if pending else event["id"],
+        business_slug=slug,
+        duration_minutes=duration_minutes,
+        service_name=service_name,
+        resource_id=resource_id,
+        calendar_id=calendar_id,
+        status="pending" if pending else None,
     )
 
     db.session.add(appointment)
     db.session.commit()
+    admin_reports.invalidate(slug)
+
+    # from the block, not end_local's clock time (a block ending at midnight reads 00:00)
+    mark_busy(
+        slug,
+        start_local.date(),
+        start_min,
+        min(start_min + block, MINUTES_PER_DAY),
+        resource_index=resource_index,
+        resource_count=len(resource_cfgs(cfg)),
+    )
 
+    if pending:
+        return jsonify({
+            "ok": True,
+            "pending": True,
+            "message": "התור נשמר וממתין לאישור סופי - נשלח הודעה ברגע שיאושר",
+        })
     return jsonify({"ok": True})
 
+# ====== RECURRING BOOK: one series row + one recurring calendar event ======
+MAX_SERIES_OCCURRENCES = 12
+SERIES_INTERVALS_WEEKS = (1, 2)
+
+@app.route("/api/book/recurring", methods=["POST"])
+@app.route("/b/<slug>/api/book/recurring", methods=["POST"])
+def api_book_recurring(slug="default"):
+    cfg = resolve_business_cfg(slug)
+    tz = ZoneInfo(cfg["timezone"])
+    data = request.json or {}
+
+    u, err = require_login()
+    if err:
+        return err
+
+    if not u.name:
+        return jsonify({
+            "ok": False,
+            "code": "PROFILE_INCOMPLETE",
+            "message": "יש להשלים שם לפני קביעת תור"
+        }), 409
+
+    try:
+        duration_minutes = int(data.get("duration_minutes") or 0)
+        interval_weeks = int(data.get("interval_weeks") or 1)
+        occurrences = int(data.get("occurrences") or 0)
+        start_local = dt.datetime.strptime(
+            f"{data.get('date')} {data.get('time')}", "%Y-%m-%d %H:%M"
+        ).replace(tzinfo=tz)
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "message": "פרטי תור לא תקינים"}), 400
+
+    if duration_minutes <= 0:
+        return jsonify({"error": "missing service duration"}), 400
+    if interval_weeks not in SERIES_INTERVALS_WEEKS:
+        return jsonify({"ok": False, "message": "תדירות לא נתמכת"}), 400
+    if occurrences < 2 or occurrences > MAX_SERIES_OCCURRENCES:
+        return jsonify({"ok": False, "message": f"ניתן לקבוע בין 2 ל-{MAX_SERIES_OCCURRENCES} תורים בסדרה"}), 400
+
+    service_name = data.get("service_name", "תספורת")
+    block = block_minutes(cfg, duration_minutes, data.get("service_id"))
+    start_local = snap_to_grid(cfg, start_local, block)
+    if start_local <= dt.datetime.now(tz):
+        return jsonify({"ok": False, "message": "לא ניתן לקבוע סדרה שמתחילה בעבר"}), 400
+    length = dt.timedelta(minutes=block)
+    starts = list(series_starts(start_local, interval_weeks, occurrences))
+
+    # resources whose hours cover every occurrence
+    views = resource_cfgs(cfg)
+    fits = []
+    msg = None
+    for i, (_, view) in enumerate(views):
+        why = _first_invalid_occurrence(view, starts, length)
+        if why is None:
+            fits.append(i)
+        elif msg is None:
+            msg = why
+    if not fits:
+        return jsonify({"ok": False, "message": msg})
+
+    # all occurrences against busy time in one freebusy call + one sweep per resource
+    busy = fetch_resource_busy(cfg, starts[0], starts[-1] + length)
+    held = {}  # resource_id -> an occurrence overlapping a waitlist hold
+    for s in starts:
+        s_min = s.hour * 60 + s.minute
+        for rid in waitlist.held_resources(slug, s.date(), s_min, s_min + block):
+            held.setdefault(rid, s)
+    clashes = {
+        i: first_overlap(starts, block, busy.get(views[i][0], [])) or held.get(views[i][0])
+        for i in fits
+    }
+    free = [i for i in fits if clashes[i] is None]
+    if not free:
+        clash = min(clashes.values())
+        return jsonify({"ok": False, "message": f"השעה תפוסה בתאריך {clash.date().isoformat()}"})
+
+    if active_booking_count(u.phone) >= MAX_ACTIVE_APPOINTMENTS:
+        return jsonify({
+            "ok": False,
+            "message": "ניתן לקבוע עד 4 תורים עתידיים לכל משתמש"
+        }), 400
+
+    resource_ids = [views[i][0] for i in free]
+    resource_id = pick_least_loaded(resource_ids, resource_loads(slug, start_local.date()))
+    resource_index = free[resource_ids.index(resource_id)]
+    calendar_id = views[resource_index][1]["calendar_id"]
+
+    event = add_event(
+        get_calendar_service(),
+        calendar_id,
+        start_local,
+        start_local + length,
+        f"{u.name} - {service_name}",
+        u.phone,
+        cfg,
+        recurrence=[f"RRULE:FREQ=WEEKLY;INTERVAL={interval_weeks};COUNT={occurrences}"],
+    )
+
+    series = AppointmentSeries(
+        business_slug=slug,
+        name=u.name,
+        phone=u.phone,
+        service_name=service_name,
+        first_start=start_local,
+        last_start=starts[-1],
+        duration_minutes=duration_minutes,
+        interval_weeks=interval_weeks,
+        occurrences=occurrences,
+        resource_id=resource_id,
+        calendar_id=calendar_id,
+        calendar_event_id=event["id"],
+    )
+    db.session.add(series)
+    db.session.commit()
+    admin_reports.invalidate(slug)
+
+    for s in starts:
+        s_min = s.hour * 60 + s.minute
+        mark_busy(
+            slug,
+            s.date(),
+            s_min,
+            min(s_min + block, MINUTES_PER_DAY),
+            resource_index=resource_index,
+            resource_count=len(resource_cfgs(cfg)),
+        )
+
+    return jsonify({"ok": True, "series_id": series.id, "dates": [s.date().isoformat() for s in starts]})
+
+def _first_invalid_occurrence(cfg: dict, starts, length: dt.timedelta):
+    for s in starts:
+        valid, msg = validate_slot(cfg, s, s + length)
+        if not valid:
+            return f"{s.date().isoformat()}: {msg}"
+    return None
+
 # ====== CANCEL LIST (requires login session) ======
 @app.route("/api/cancel/list")
 @app.route("/b/<slug>/api/cancel/list")
@@ -1125,12 +2125,74 @@ def api_cancel_list(slug="default"):
     for a in appointments:
         result.append({
             "id": a.id,
-            "start": a.start_time.isoformat()
+            "start": a.start_time.isoformat(),
+            "service_name": a.service_name,
+            "pending": a.status == "pending",
+        })
+
+    # series: only the next occurrence, expanded lazily from the series row
+    series_list = AppointmentSeries.query.filter(
+        AppointmentSeries.phone == phone,
+        AppointmentSeries.last_start >= dt.datetime.utcnow() - TZ_MARGIN
+    ).all()
+    for sr in series_list:
+        now = business_now(sr.business_slug)
+        upcoming = next(series_starts(sr.first_start, sr.interval_weeks, sr.occurrences, window_start=now), None)
+        if upcoming is None:
+            continue
+        result.append({
+            "series_id": sr.id,
+            "start": upcoming.isoformat(),
+            "service_name": sr.service_name,
+            "interval_weeks": sr.interval_weeks,
         })
+    result.sort(key=lambda r: r["start"])
 
     return jsonify({"appointments": result})
 
 # ====== CANCEL (requires login session + phone match appointment) ======
+# the calendar event is deleted in the background (calendar_outbox), from the
+# business and calendar the booking was made with - not the slug in the URL
+
+def _delete_calendar_event(row):
+    cfg = _business_cfg_or_none(row.business_slug) or {"slug": row.business_slug}
+    calendar_execute(cfg, get_calendar_service().events().delete(
+        calendarId=row.calendar_id,
+        eventId=row.calendar_event_id
+    ))
+
+def _free_time(slug, start, resource_id, block):
+    # first in line gets a hold on the freed time before it goes public
+    start_min = start.hour * 60 + start.minute
+    if resource_id and block:
+        waitlist.offer_freed(slug, start.date(), start_min, resource_id, block)
+    mark_day_stale(slug, start.date(), start_min)
+
+def _calendar_event_deleted(row):
+    # the day was re-read while the event was still there: read it again
+    if row.start_time is None:
+        mark_business_stale(row.business_slug)
+        return
+    if row.interval_weeks:
+        starts = series_starts(row.start_time, row.interval_weeks, row.occurrences, window_start=business_now(row.business_slug))
+    else:
+        starts = [row.start_time]
+    for s in starts:
+        _free_time(row.business_slug, s, row.resource_id, row.block_minutes)
+
+def flush_calendar_deletions() -> dict:
+    return calendar_outbox.process(_delete_calendar_event, _calendar_event_deleted)
+
+def _run_calendar_outbox():
+    with app.app_context():
+        flush_calendar_deletions()
+
+calendar_deleter = calendar_outbox.Worker(_run_calendar_outbox)
+
+def _cancel_cfg(stored_slug, url_slug):
+    # rows from before multi-tenant have no business_slug: the URL's business
+    return _business_cfg_or_none(stored_slug or url_slug) or resolve_business_cfg(url_slug)
+
 @app.route("/api/cancel", methods=["POST"])
 @app.route("/b/<slug>/api/cancel", methods=["POST"])
 def api_cancel(slug="default"):
@@ -1143,35 +2205,260 @@ def api_cancel(slug="default"):
 
     phone = u.phone
 
+    if data.get("series_id"):
+        return _cancel_series(slug, data["series_id"], phone)
+
     if not appointment_id or not phone:
         return jsonify({"ok": False, "message": "חסר מזהה תור או טלפון"})
 
-    appointment = Appointment.query.get(appointment_id)
-    if not appointment:
-        return jsonify({"ok": False, "message": "תור לא נמצא"})
+    # ownership check and delete in one statement (important: prevent cancelling other people's appointments)
+    appointment = db.session.execute(
+        db.delete(Appointment)
+        .where(Appointment.id == appointment_id, Appointment.phone == phone)
+        .returning(
+            Appointment.business_slug,
+            Appointment.calendar_id,
+            Appointment.calendar_event_id,
+            Appointment.status,
+            Appointment.start_time,
+            Appointment.duration_minutes,
+            Appointment.resource_id,
+        )
+    ).first()
+    if appointment is None:
+        db.session.rollback()
+        if db.session.get(Appointment, appointment_id) is None:
+            return jsonify({"ok": False, "message": "תור לא נמצא"})
+        return jsonify({"ok": False, "message": "אין הרשאה לבטל את התור הזה"})
+
+    cfg = _cancel_cfg(appointment.business_slug, slug)
+    slug = cfg["slug"]
+    freed_resource = appointment.resource_id or resource_cfgs(cfg)[0][0]
+    freed_block = block_minutes(cfg, appointment.duration_minutes or 1)
+
+    # a pending booking never reached the calendar: its time is free right away;
+    # otherwise it is re-opened (and offered) once the event is deleted
+    pending = appointment.status == "pending"
+    if not pending:
+        calendar_outbox.enqueue(
+            slug, appointment.calendar_id or cfg["calendar_id"], appointment.calendar_event_id,
+            appointment.start_time, freed_resource, freed_block,
+        )
+    db.session.commit()
+    admin_reports.invalidate(slug)
+
+    if pending:
+        _free_time(slug, appointment.start_time, freed_resource, freed_block)
+    else:
+        calendar_deleter.wake()
+
+    return jsonify({"ok": True})
 
-    # important: prevent cancelling other people's appointments
-    if appointment.phone != phone:
+def _cancel_series(slug, series_id, phone):
+    sr = db.session.get(AppointmentSeries, series_id)
+    if not sr:
+        return jsonify({"ok": False, "message": "תור לא נמצא"})
+    if sr.phone != phone:
         return jsonify({"ok": False, "message": "אין הרשאה לבטל את התור הזה"})
 
-    service = get_calendar_service()
+    cfg = _cancel_cfg(sr.business_slug, slug)
+    slug = cfg["slug"]
+
+    # deleting the recurring event removes every instance; the future
+    # occurrences are re-opened (and offered) once it is gone
+    calendar_outbox.enqueue(
+        slug, sr.calendar_id or cfg["calendar_id"], sr.calendar_event_id, sr.first_start,
+        sr.resource_id or resource_cfgs(cfg)[0][0], block_minutes(cfg, sr.duration_minutes),
+        sr.interval_weeks, sr.occurrences,
+    )
+    db.session.delete(sr)
+    db.session.commit()
+    calendar_deleter.wake()
+    admin_reports.invalidate(slug)
+
+    return jsonify({"ok": True})
+
+# ====== WAITLIST (requires login session) ======
+def _waitlist_json(e: WaitlistEntry) -> dict:
+    out = {
+        "id": e.id,
+        "date": e.date.isoformat(),
+        "from": minutes_to_hhmm(e.window_start_min),
+        "to": minutes_to_hhmm(e.latest_start_min + e.block_minutes),
+        "service_name": e.service_name,
+        "status": e.status,
+    }
+    if e.status == "offered":
+        out["offered_time"] = minutes_to_hhmm(e.offered_start_min)
+        out["hold_expires_at"] = e.hold_expires_at.isoformat() + "Z"
+    return out
+
+@app.route("/api/waitlist", methods=["GET", "POST"])
+@app.route("/b/<slug>/api/waitlist", methods=["GET", "POST"])
+def api_waitlist(slug="default"):
+    u, err = require_login()
+    if err:
+        return err
+
+    if request.method == "GET":
+        entries = [e for e in waitlist.user_entries(u.phone) if e.business_slug == slug]
+        return jsonify({"entries": [_waitlist_json(e) for e in entries]})
+
+    if not u.name:
+        return jsonify({
+            "ok": False,
+            "code": "PROFILE_INCOMPLETE",
+            "message": "יש להשלים שם לפני הרשמה לרשימת המתנה"
+        }), 409
+
     cfg = resolve_business_cfg(slug)
+    tz = ZoneInfo(cfg["timezone"])
+    data = request.json or {}
 
     try:
-        service.events().delete(
-            calendarId=cfg["calendar_id"],
-            eventId=appointment.calendar_event_id
-        ).execute()
-    except HttpError as e:
-        # 410 = event already deleted → treat as success
-        if e.resp.status != 410:
-            raise
+        date = dt.date.fromisoformat(data.get("date") or "")
+        duration_minutes = int(data.get("duration_minutes") or 0)
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "message": "פרטים לא תקינים"}), 400
+    if duration_minutes <= 0:
+        return jsonify({"error": "missing service duration"}), 400
 
-    db.session.delete(appointment)
-    db.session.commit()
+    today = dt.datetime.now(tz).date()
+    if date < today or date > today + dt.timedelta(days=int(cfg.get("lookahead_days") or 14)):
+        return jsonify({"ok": False, "message": "תאריך מחוץ לטווח"}), 400
+
+    span = day_span(cfg, date)
+    if span is None:
+        return jsonify({"ok": False, "message": "העסק סגור ביום זה."})
+
+    # whole working day unless the customer narrowed it
+    window_start, window_end = span
+    if data.get("from") or data.get("to"):
+        if not (_validate_time_hhmm(data.get("from") or "") and _validate_time_hhmm(data.get("to") or "")):
+            return jsonify({"ok": False, "message": "שעות לא תקינות"}), 400
+        window_start = max(span[0], _time_to_minutes(data["from"]))
+        window_end = min(span[1], _time_to_minutes(data["to"]))
+
+    service_id = data.get("service_id")
+    entry, msg = waitlist.join(
+        slug,
+        u,
+        date,
+        window_start,
+        window_end,
+        duration_minutes,
+        block_minutes(cfg, duration_minutes, service_id),
+        service_id=service_id,
+        service_name=data.get("service_name"),
+    )
+    if entry is None:
+        return jsonify({"ok": False, "message": msg})
+    return jsonify({"ok": True, "entry": _waitlist_json(entry)})
+
+@app.route("/api/waitlist/leave", methods=["POST"])
+@app.route("/b/<slug>/api/waitlist/leave", methods=["POST"])
+def api_waitlist_leave(slug="default"):
+    u, err = require_login()
+    if err:
+        return err
 
+    entry = waitlist.leave((request.json or {}).get("id"), u.phone)
+    if entry is not None:
+        # it was holding time: next in line, or back to everyone
+        nxt = waitlist.offer_freed(
+            entry.business_slug, entry.date, entry.offered_start_min, entry.resource_id, entry.block_minutes
+        )
+        if nxt is None:
+            mark_day_stale(entry.business_slug, entry.date, entry.offered_start_min)
     return jsonify({"ok": True})
 
+@app.route("/api/waitlist/claim", methods=["POST"])
+@app.route("/b/<slug>/api/waitlist/claim", methods=["POST"])
+def api_waitlist_claim(slug="default"):
+    u, err = require_login()
+    if err:
+        return err
+
+    if active_booking_count(u.phone) >= MAX_ACTIVE_APPOINTMENTS:
+        return jsonify({
+            "ok": False,
+            "message": "ניתן לקבוע עד 4 תורים עתידיים לכל משתמש"
+        }), 400
+
+    entry = waitlist.claimable_offer((request.json or {}).get("id"), u.phone)
+    if entry is None:
+        return jsonify({"ok": False, "message": "ההצעה פגה או לא נמצאה"})
+
+    # the hold belongs to the business the entry was made with, not the URL's
+    cfg = resolve_business_cfg(entry.business_slug)
+    slug = cfg["slug"]
+    tz = ZoneInfo(cfg["timezone"])
+    views = resource_cfgs(cfg)
+    resource_ids = [rid for rid, _ in views]
+    resource_index = resource_ids.index(entry.resource_id) if entry.resource_id in resource_ids else 0
+    resource_id, view = views[resource_index]
+
+    midnight = dt.datetime.combine(entry.date, dt.time.min, tzinfo=tz)
+    start_local = midnight + dt.timedelta(minutes=entry.offered_start_min)
+    end_local = start_local + dt.timedelta(minutes=entry.block_minutes)
+
+    # the entry stays "offered" until the Appointment is committed: a calendar
+    # error below leaves the hold in place (claim again, or it expires to the next in line)
+    busy = fetch_resource_busy(cfg, start_local, end_local)
+    if busy.get(resource_id):
+        # the hold only lives in our DB; something landed in the calendar meanwhile
+        db.session.execute(
+            db.update(WaitlistEntry)
+            .where(WaitlistEntry.id == entry.id, WaitlistEntry.status == "offered")
+            .values(status="expired")
+        )
+        db.session.commit()
+        return jsonify({"ok": False, "message": "השעה כבר לא פנויה"})
+
+    service_name = entry.service_name or "תספורת"
+    event = add_event(
+        get_calendar_service(),
+        view["calendar_id"],
+        start_local,
+        end_local,
+        f"{u.name} - {service_name}",
+        u.phone,
+        cfg,
+    )
+
+    if not waitlist.book_offer(entry.id):
+        # expired or claimed twice while the event was being created: take it back out
+        db.session.rollback()
+        calendar_outbox.enqueue(slug, view["calendar_id"], event["id"], start_local.replace(tzinfo=None))
+        db.session.commit()
+        calendar_deleter.wake()
+        return jsonify({"ok": False, "message": "ההצעה פגה או לא נמצאה"})
+
+    db.session.add(Appointment(
+        name=u.name,
+        phone=u.phone,
+        start_time=start_local,
+        calendar_event_id=event["id"],
+        business_slug=slug,
+        duration_minutes=entry.duration_minutes,
+        service_name=service_name,
+        resource_id=resource_id,
+        calendar_id=view["calendar_id"],
+    ))
+    db.session.commit()
+    admin_reports.invalidate(slug)
+
+    mark_busy(
+        slug,
+        entry.date,
+        entry.offered_start_min,
+        entry.offered_start_min + entry.block_minutes,
+        resource_index=resource_index,
+        resource_count=len(views),
+    )
+
+    return jsonify({"ok": True, "date": entry.date.isoformat(), "time": minutes_to_hhmm(entry.offered_start_min)})
+
 @app.route("/debug/db-count")
 def db_count():
     return jsonify({"count": Appointment.query.count()})
@@ -1179,11 +2466,311 @@ def db_count():
 @app.route("/b/<slug>/api/services")
 def api_services(slug):
     cfg = resolve_business_cfg(slug)
-    return jsonify({
-        "services": cfg.get("services", []),
-        "working_days": cfg.get("working_days", [])
-    })
+    return conditional_json(
+        {
+            "services": cfg.get("services", []),
+            "working_days": cfg.get("working_days", [])
+        },
+        etag_for(slug, config_hash(cfg)),
+        SERVICES_CACHE_CONTROL,
+    )
+
+
+# ================= CLI: tenant registry =================
+
+tenants_cli = AppGroup("tenants", help="Tenant registry: bulk import/export of business configs.")
+
+@tenants_cli.command("import")
+@click.argument("path", default=BUSINESS_CONFIG_FILE)
+@click.option("--replace", is_flag=True, help="Overwrite slugs that are already registered.")
+def tenants_import(path, replace):
+    """Load a business_config.json-shaped file into the registry."""
+    with open(path, encoding="utf-8") as f:
+        businesses = normalize_business_config(json.load(f))["businesses"]
+    stats = tenant_store.import_tenants(businesses, replace=replace)
+    click.echo(f"added={stats['added']} updated={stats['updated']} skipped={stats['skipped']}")
+
+@tenants_cli.command("export")
+@click.argument("path")
+def tenants_export(path):
+    """Write the registry back out in business_config.json format."""
+    _atomic_write_json(os.path.abspath(path), tenant_store.export_tenants())
+    click.echo(f"exported to {path}")
+
+@tenants_cli.command("list")
+def tenants_list():
+    after = ""
+    while True:
+        page = tenant_store.list_tenant_slugs(after=after)
+        if not page:
+            break
+        for slug in page:
+            click.echo(slug)
+        after = page[-1]
+
+app.cli.add_command(tenants_cli)
+
+# ================= CLI: waitlist =================
+
+waitlist_cli = AppGroup("waitlist", help="Waitlist maintenance.")
+
+@waitlist_cli.command("sweep")
+def waitlist_sweep():
+    """Expire unclaimed holds and offer the time to the next in line (run from cron)."""
+    click.echo(f"expired={release_expired_holds()}")
+
+app.cli.add_command(waitlist_cli)
+
+# ================= CLI: snapshots =================
+
+snapshots_cli = AppGroup("snapshots", help="Materialized day availability.")
+
+@snapshots_cli.command("purge")
+@click.option("--keep-days", default=1, show_default=True, help="Keep this many past days (time zones differ).")
+def snapshots_purge(keep_days):
+    """Delete day snapshots of past dates (run from cron)."""
+    click.echo(f"deleted={purge_snapshots(dt.date.today() - dt.timedelta(days=keep_days))}")
+
+app.cli.add_command(snapshots_cli)
+
+# ================= CLI: reminders =================
+
+reminders_cli = AppGroup("reminders", help="SMS reminders for upcoming appointments.")
+
+def _business_cfg_or_none(slug: str):
+    try:
+        return resolve_business_cfg(slug)
+    except HTTPException:
+        # appointment of a business that no longer exists
+        return None
+
+@reminders_cli.command("run")
+@click.option("--hours", default=reminders.DEFAULT_HOURS, show_default=True, help="Remind appointments starting within this many hours.")
+@click.option("--every", default=0, help="Repeat every N seconds (0 = run once).")
+def reminders_run(hours, every):
+    """Send each due reminder once (safe to run from several schedulers)."""
+    while True:
+        started = time.monotonic()
+        stats = reminders.run(_business_cfg_or_none, lambda items: send_sms_batch(items, kind="reminder"), hours=hours)
+        drained = get_queue().drain()
+        click.echo(
+            f"checked={stats['checked']} due={stats['due']} sent={stats['sent']} "
+            f"in {time.monotonic() - started:.2f}s" + ("" if drained else " (delivery still pending)")
+        )
+        if not every:
+            break
+        time.sleep(every)
+
+app.cli.add_command(reminders_cli)
+
+# ================= CLI: pending bookings (calendar outages) =================
+
+def _event_exists(cfg: dict, calendar_id: str, event_id: str) -> bool:
+    try:
+        event = calendar_execute(cfg, get_calendar_service().events().get(calendarId=calendar_id, eventId=event_id))
+    except HttpError as e:
+        if e.resp.status in (404, 410):
+            return False
+        raise
+    return event.get("status") != "cancelled"
+
+def confirm_pending_bookings() -> dict:
+    """
+    Puts bookings taken while the calendar was down onto it, oldest first.
+    If the time got taken meanwhile the booking is dropped and the customer
+    told. Stops at the first outage error (next run retries).
+    """
+    stats = {"confirmed": 0, "rejected": 0, "waiting": 0}
+    pending = Appointment.query.filter(Appointment.status == "pending").order_by(Appointment.created_at).all()
+    for i, a in enumerate(pending):
+        cfg = _business_cfg_or_none(a.business_slug or "default")
+        if cfg is None:
+            continue
+        tz = ZoneInfo(cfg["timezone"])
+        start_local = a.start_time.replace(tzinfo=tz)
+        end_local = start_local + dt.timedelta(minutes=block_minutes(cfg, a.duration_minutes or 1))
+        calendar_id = a.calendar_id or cfg["calendar_id"]
+        when = f"{start_local.strftime('%d/%m')} בשעה {start_local.strftime('%H:%M')}"
+        # same event id on every attempt (base32hex), so an insert whose reply was lost isn't repeated
+        event_id = "qs" + a.calendar_event_id.split(":", 1)[1]
+
+        try:
+            if fetch_resource_busy(cfg, start_local, end_local).get(a.resource_id or resource_cfgs(cfg)[0][0]) \
+                    and not _event_exists(cfg, calendar_id, event_id):
+                start_min = start_local.hour * 60 + start_local.minute
+                db.session.delete(a)
+                db.session.commit()
+                admin_reports.invalidate(cfg["slug"])
+                mark_day_stale(cfg["slug"], start_local.date(), start_min)
+                send_sms(a.phone, f"מצטערים, לא הצלחנו לאשר את התור ל-{when} - השעה נתפסה. אפשר לקבוע תור חדש באתר.", kind="pending")
+                stats["rejected"] += 1
+                continue
+            try:
+                add_event(
+                    get_calendar_service(),
+                    calendar_id,
+                    start_local,
+                    end_local,
+                    f"{a.name} - {a.service_name}",
+                    a.phone,
+                    cfg,
+                    event_id=event_id,
+                )
+            except HttpError as e:
+                if e.resp.status != 409:  # 409 = inserted by an earlier attempt
+                    raise
+        except calendar_gate.CalendarUnavailable:
+            stats["waiting"] = len(pending) - i
+            break
+
+        a.calendar_event_id = event_id
+        a.status = None
+        db.session.commit()
+        send_sms(a.phone, f"התור שלך ל-{when} אושר", kind="pending")
+        stats["confirmed"] += 1
+    return stats
+
+calendar_cli = AppGroup("calendar", help="Calendar outage recovery.")
+
+@calendar_cli.command("confirm-pending")
+@click.option("--every", default=0, help="Repeat every N seconds (0 = run once).")
+def calendar_confirm_pending(every):
+    """Confirm bookings queued while Google Calendar was unavailable, and flush pending event deletions."""
+    while True:
+        stats = confirm_pending_bookings()
+        deletions = flush_calendar_deletions()
+        get_queue().drain()
+        click.echo(f"confirmed={stats['confirmed']} rejected={stats['rejected']} waiting={stats['waiting']}")
+        click.echo(f"deleted={deletions['deleted']} failed={deletions['failed']} dropped={deletions['dropped']} waiting={deletions['waiting']}")
+        if not every:
+            break
+        time.sleep(every)
+
+app.cli.add_command(calendar_cli)
+
+# ================= CLI: exports =================
+
+export_cli = AppGroup("export", help="Streaming data exports.")
+
+@export_cli.command("appointments")
+@click.argument("path", default="-")
+@click.option("--slug", default=None, help="Only this business (default: all).")
+@click.option("--from", "from_date", default=None, help="YYYY-MM-DD (inclusive).")
+@click.option("--to", "to_date", default=None, help="YYYY-MM-DD (inclusive).")
+@click.option("--format", "fmt", type=click.Choice(exports.FORMATS), default="csv", show_default=True)
+def export_appointments(path, slug, from_date, to_date, fmt):
+    """Write appointments to PATH ("-" = stdout), one chunk at a time."""
+    dates = []
+    for raw in (from_date, to_date):
+        if raw and not _validate_date_iso(raw):
+            raise click.BadParameter(f"invalid date: {raw}")
+        dates.append(dt.date.fromisoformat(raw) if raw else None)
+
+    chunks = exports.encode(exports.iter_rows(slug, *dates), fmt)
+    if path == "-":
+        for chunk in chunks:
+            click.echo(chunk, nl=False)
+        return
+
+    path = os.path.abspath(path)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp, path)
+    click.echo(f"exported to {path}", err=True)
+
+app.cli.add_command(export_cli)
+
+# ================= CLI: bulk import =================
+
+import_cli = AppGroup("import", help="Bulk import of customers / historical appointments.")
+
+def _run_import(kind, path, slug, batch_size):
+    def progress(stats):
+        click.echo(
+            f"read={stats['read']} inserted={stats['inserted']} "
+            f"duplicates={stats['duplicates']} invalid={stats['invalid']}",
+            err=True,
+        )
+
+    stats = bulk_import.run(
+        kind, bulk_import.read_records(path), normalize_phone,
+        default_slug=slug, batch_size=batch_size, progress=progress,
+    )
+    click.echo(
+        f"done: inserted={stats['inserted']} duplicates={stats['duplicates']} invalid={stats['invalid']} "
+        f"in {stats['seconds']}s ({stats['rows_per_sec']} rows/s)"
+    )
+
+@import_cli.command("customers")
+@click.argument("path")
+@click.option("--batch-size", default=bulk_import.BATCH_SIZE, show_default=True)
+def import_customers(path, batch_size):
+    """Load customers (phone, name, email) from .csv / .jsonl / .json."""
+    _run_import("customers", path, None, batch_size)
+
+@import_cli.command("appointments")
+@click.argument("path")
+@click.option("--slug", default=None, help="Business for rows without business_slug.")
+@click.option("--batch-size", default=bulk_import.BATCH_SIZE, show_default=True)
+def import_appointments(path, slug, batch_size):
+    """Load appointments (name, phone, start_time, duration_minutes, service_name, ...)."""
+    if slug:
+        try:
+            resolve_business_cfg(slug)
+        except HTTPException:
+            raise click.BadParameter(f"unknown business: {slug}")
+    _run_import("appointments", path, slug, batch_size)
+    if slug:
+        admin_reports.invalidate(slug)
+
+app.cli.add_command(import_cli)
+
+# ================= CLI: static assets =================
+
+assets_cli = AppGroup("assets", help="Static asset pipeline.")
+
+@assets_cli.command("build")
+def assets_build():
+    """Minify, fingerprint and pre-compress static/*.js|css into static/dist."""
+    manifest = assets.build(os.path.join(BASE_DIR, "static"), ASSETS_DIR)
+    for name, hashed in sorted(manifest.items()):
+        click.echo(f"{name} -> {hashed}")
+    if assets.brotli is None:
+        click.echo("brotli not installed: only .gz variants written", err=True)
+
+app.cli.add_command(assets_cli)
+
+# ================= CLI: API encoding benchmark =================
+
+api_cli = AppGroup("api", help="API response encoding.")
+
+@api_cli.command("bench")
+@click.option("--days", default=7, show_default=True, help="Days in the multi-day payload.")
+@click.option("--step", default=5, show_default=True, help="Slot grid in minutes (smaller = more slots).")
+@click.option("--repeat", default=500, show_default=True)
+def api_bench(days, step, repeat):
+    """Serialization cost and bytes on the wire: stdlib vs orjson, "HH:MM" vs minute slots."""
+    starts = list(range(8 * 60, 20 * 60, step))
+    first = dt.date.today()
+    payloads = {}
+    for enc, encode_slot in SLOT_ENCODINGS.items():
+        day = {"slots": [encode_slot(m) for m in starts]}
+        payloads[f"day-slots {enc}"] = day
+        payloads[f"{days}-day {enc}"] = {
+            "days": [dict(day, date=(first + dt.timedelta(days=i)).isoformat()) for i in range(days)]
+        }
+
+    click.echo(f"encoder in use: {JSON_ENCODER}")
+    click.echo(f"{'payload':<16} {'encoder':<8} {'us/dump':>9} {'bytes':>8} {'gzip':>7} {'br':>7}")
+    for r in http_codec.benchmark(payloads, repeat):
+        br = r["br"] if r["br"] is not None else "-"
+        click.echo(
+            f"{r['payload']:<16} {r['encoder']:<8} {r['us_per_dump']:>9} {r['bytes']:>8} {r['gzip']:>7} {br:>7}"
+        )
 
+app.cli.add_command(api_cli)
 
 
 if __name__ == "__main__":
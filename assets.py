@@ -0,0 +1,210 @@
+"""
+Static asset build: minify, fingerprint, pre-compress.
+
+`flask assets build` writes for every .js / .css under static/:
+    static/dist/<name>.<hash>.<ext>      minified, content-hashed
+    static/dist/<name>.<hash>.<ext>.gz   gzip -9
+    static/dist/<name>.<hash>.<ext>.br   brotli (only if the brotli module is installed)
+    static/dist/manifest.json            {"app.js": "app.<hash>.js", ...}
+
+Templates call asset_url("app.js"): the hashed /assets/... URL when a
+build exists, else plain /static/app.js. Hashed files never change, so
+they are served with a one-year immutable Cache-Control and the
+pre-compressed variant that matches Accept-Encoding.
+
+The minifiers are deliberately conservative (comments and indentation
+only; strings, template literals and regex literals are copied as-is) -
+compression does most of the work.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+
+from http_codec import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+MANIFEST = "manifest.json"
+EXTENSIONS = (".js", ".css")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+_REGEX_AFTER = set("(,=:[!&|?{};+-*%<>~^")
+
+
+def minify_js(src: str) -> str:
+    out = []
+    i, n = 0, len(src)
+    tpl_depth = []  # brace depth inside each open `${`
+    last = ""       # last significant char outside strings/comments
+
+    def copy_quoted(i, quote):
+        j = i + 1
+        while j < n and src[j] != quote:
+            j += 2 if src[j] == "\\" else 1
+        return j + 1
+
+    def copy_template(i):
+        # from just after ` (or after a closing } of ${...}) to the closing ` or next ${
+        j = i
+        while j < n:
+            if src[j] == "\\":
+                j += 2
+            elif src[j] == "`":
+                return j + 1, False
+            elif src.startswith("${", j):
+                return j + 2, True
+            else:
+                j += 1
+        return j, False
+
+    while i < n:
+        c = src[i]
+        if src.startswith("//", i):
+            while i < n and src[i] != "\n":
+                i += 1
+            continue
+        if src.startswith("/*", i):
+            end = src.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            continue
+        if c in "\"'":
+            j = copy_quoted(i, c)
+            out.append(src[i:j])
+            i, last = j, c
+            continue
+        if c == "`" or (c == "}" and tpl_depth and tpl_depth[-1] == 0):
+            if c == "}":
+                tpl_depth.pop()
+            j, opened = copy_template(i + 1)
+            out.append(src[i:j])
+            if opened:
+                tpl_depth.append(0)
+            i, last = j, ("{" if opened else "`")
+            continue
+        if c == "/" and _is_regex_start(last):
+            j = i + 1
+            in_class = False
+            while j < n and (src[j] != "/" or in_class):
+                if src[j] == "\\":
+                    j += 1
+                elif src[j] == "[":
+                    in_class = True
+                elif src[j] == "]":
+                    in_class = False
+                j += 1
+            j += 1
+            while j < n and src[j].isalpha():
+                j += 1
+            out.append(src[i:j])
+            i, last = j, "/"
+            continue
+        if tpl_depth:
+            if c == "{":
+                tpl_depth[-1] += 1
+            elif c == "}":
+                tpl_depth[-1] -= 1
+        out.append(c)
+        if not c.isspace():
+            last = c
+        i += 1
+
+    lines = (line.strip() for line in "".join(out).split("\n"))
+    return "\n".join(line for line in lines if line) + "\n"
+
+
+def _is_regex_start(last: str) -> bool:
+    return last == "" or last in _REGEX_AFTER
+
+
+def minify_css(src: str) -> str:
+    src = re.sub(r"/\*.*?\*/", "", src, flags=re.S)
+    src = re.sub(r"\s+", " ", src)
+    src = re.sub(r"\s*([{};,>])\s*", r"\1", src)
+    return src.replace(";}", "}").strip() + "\n"
+
+
+def _fingerprint(name: str, data: bytes) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+
+def build(static_dir: str, out_dir: str) -> dict:
+    """Builds all assets; returns the manifest. Old hashed files are removed."""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        if os.path.abspath(root).startswith(os.path.abspath(out_dir)):
+            continue
+        for fname in sorted(files):
+            if not fname.endswith(EXTENSIONS):
+                continue
+            path = os.path.join(root, fname)
+            rel = os.path.relpath(path, static_dir).replace(os.sep, "/")
+            with open(path, encoding="utf-8") as f:
+                src = f.read()
+            text = minify_js(src) if fname.endswith(".js") else minify_css(src)
+            data = text.encode("utf-8")
+
+            hashed = _fingerprint(rel, data)
+            target = os.path.join(out_dir, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(data)
+            with open(target + ".gz", "wb") as f:
+                f.write(gzip.compress(data, 9, mtime=0))
+            if brotli is not None:
+                with open(target + ".br", "wb") as f:
+                    f.write(brotli.compress(data, quality=11))
+            manifest[rel] = hashed
+
+    keep = set(manifest.values())
+    for root, dirs, files in os.walk(out_dir):
+        for fname in files:
+            rel = os.path.relpath(os.path.join(root, fname), out_dir).replace(os.sep, "/")
+            base = rel[:-3] if rel.endswith((".gz", ".br")) else rel
+            if base != MANIFEST and base not in keep:
+                os.remove(os.path.join(root, fname))
+
+    tmp = os.path.join(out_dir, MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+    return manifest
+
+
+_manifest = {"mtime": None, "map": {}}
+
+
+def load_manifest(out_dir: str) -> dict:
+    """Manifest of the last build ({} if none); re-read when the file changes."""
+    path = os.path.join(out_dir, MANIFEST)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        _manifest.update(mtime=None, map={})
+        return {}
+    if mtime != _manifest["mtime"]:
+        with open(path, encoding="utf-8") as f:
+            _manifest.update(mtime=mtime, map=json.load(f))
+    return _manifest["map"]
+
+
+def manifest_version(out_dir: str):
+    """Changes whenever a new build is picked up (for caches of pages that embed asset URLs)."""
+    load_manifest(out_dir)
+    return _manifest["mtime"]
+
+
+def pick_encoding(accept_encoding: str, path: str):
+    """(content-encoding, file path) of the best pre-compressed variant, or (None, path)."""
+    accepted = accepted_encodings(accept_encoding)
+    for enc, suffix in ENCODINGS:
+        if enc in accepted and os.path.isfile(path + suffix):
+            return enc, path + suffix
+    return None, path
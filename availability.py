@@ -0,0 +1,268 @@
+"""
+Materialized day availability.
+
+Every (business, date, duration) keeps a packed bitmap of feasible start
+minutes in DaySlotSnapshot, so /api/day-slots is one lookup on the unique
+index. Bookings clear bits in place; cancellations and admin edits mark
+rows stale, and stale/expired rows are refreshed from one freebusy call
+for the whole day (which is also how foreign calendar events get picked up).
+With several resources (staff / chairs) the row also keeps one bitmap per
+resource; slot_bitmap is their union, and the same single freebusy call
+covers every resource calendar.
+next_available scans forward over the same snapshots when a day is full.
+Every change is also pushed to open SSE streams through slot_events.hub.
+"""
+import datetime as dt
+import hashlib
+import json
+
+from sqlalchemy.exc import IntegrityError
+
+from db import db
+from models import DaySlotSnapshot
+from booking_core import (
+    build_resource_bitmaps,
+    service_block,
+    clear_busy_in_bitmap,
+    minutes_to_hhmm,
+    slots_from_bitmap,
+    split_segments,
+    union_bitmaps,
+)
+from calendar_gate import CalendarUnavailable
+from slot_events import hub
+
+# How long a snapshot is trusted before the calendar is asked again
+# (catches events added directly in Google Calendar).
+SNAPSHOT_MAX_AGE_SEC = 60
+
+
+def config_hash(cfg: dict) -> str:
+    raw = json.dumps(cfg, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _snapshot_query(slug: str, date: dt.date):
+    return DaySlotSnapshot.query.filter_by(business_slug=slug, date=date)
+
+
+def _is_fresh(row, cfg_h: str, now: dt.datetime) -> bool:
+    if row.computed_at is None or row.config_hash != cfg_h:
+        return False
+    return row.computed_at > now - dt.timedelta(seconds=SNAPSHOT_MAX_AGE_SEC)
+
+
+def get_day_snapshot(cfg: dict, date: dt.date, duration: int, fetch_busy) -> DaySlotSnapshot:
+    """
+    Returns the snapshot row for (cfg["slug"], date, duration), where
+    duration is the whole block (service + buffer), refreshing
+    the whole day first if it is missing, stale or built from an older config.
+    fetch_busy(cfg, date) -> {resource_id: [(start_min, end_min), ...]}
+    """
+    slug = cfg["slug"]
+    row = _snapshot_query(slug, date).filter_by(duration_minutes=duration).first()
+    if row and _is_fresh(row, config_hash(cfg), dt.datetime.utcnow()):
+        return row
+
+    refresh_day(cfg, date, fetch_busy(cfg, date), extra_durations=[duration])
+    return _snapshot_query(slug, date).filter_by(duration_minutes=duration).first()
+
+
+def refresh_day(cfg: dict, date: dt.date, busy_by_resource: dict, extra_durations=()) -> list:
+    """
+    Recomputes all snapshots of `date` (every service duration + extras)
+    from a single busy map. Version is bumped only when the bitmap changed.
+    Returns the durations whose availability changed.
+    """
+    slug = cfg["slug"]
+    cfg_h = config_hash(cfg)
+    now = dt.datetime.utcnow()
+
+    rows = {r.duration_minutes: r for r in _snapshot_query(slug, date).all()}
+    durations = {service_block(s) for s in cfg.get("services", [])}
+    durations.update(extra_durations)
+    durations.update(rows)
+
+    changed = []
+    existing_changed = False
+    for d in sorted(durations):
+        bitmap, segments = build_resource_bitmaps(cfg, date, d, busy_by_resource)
+        packed = b"".join(segments) if len(segments) > 1 else None
+        row = rows.get(d)
+        if row is None:
+            db.session.add(DaySlotSnapshot(
+                business_slug=slug,
+                date=date,
+                duration_minutes=d,
+                slot_bitmap=bitmap,
+                resource_bitmaps=packed,
+                config_hash=cfg_h,
+                version=1,
+                computed_at=now,
+            ))
+            changed.append(d)
+            continue
+        if row.slot_bitmap != bitmap:
+            row.slot_bitmap = bitmap
+            row.version += 1
+            changed.append(d)
+            existing_changed = True
+        row.resource_bitmaps = packed
+        row.config_hash = cfg_h
+        row.computed_at = now
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # another worker materialized the same day first; its rows win
+        db.session.rollback()
+        return changed
+
+    if existing_changed:
+        # calendar sync saw something we didn't book (or a config change)
+        hub.publish(slug, date.isoformat(), {"type": "changed", "date": date.isoformat()})
+    return changed
+
+
+def mark_busy(slug: str, date: dt.date, start_min: int, end_min: int, resource_index: int = None,
+              resource_count: int = None) -> list:
+    """
+    Incremental update after a booking: clear the covered start minutes in
+    place. With per-resource segments only the assigned resource is cleared
+    and the union rebuilt, since other resources may still take that time.
+    A row whose segments don't match the current resources (resource_count)
+    is marked stale instead.
+    """
+    changed = []
+    per_resource = False
+    for row in _snapshot_query(slug, date).all():
+        if row.resource_bitmaps and resource_index is not None:
+            per_resource = True
+            segments = split_segments(row.resource_bitmaps)
+            if resource_index >= len(segments) or (resource_count is not None and len(segments) != resource_count):
+                # built before a resource was added / removed: indexes don't line up
+                row.computed_at = None
+                continue
+            segments[resource_index] = clear_busy_in_bitmap(
+                segments[resource_index], row.duration_minutes, start_min, end_min
+            )
+            row.resource_bitmaps = b"".join(segments)
+            bitmap = union_bitmaps(segments)
+        else:
+            bitmap = clear_busy_in_bitmap(row.slot_bitmap, row.duration_minutes, start_min, end_min)
+        if bitmap != row.slot_bitmap:
+            row.slot_bitmap = bitmap
+            row.version += 1
+            changed.append(row.duration_minutes)
+    db.session.commit()
+
+    if per_resource:
+        # other resources may still offer that time: let clients refetch
+        hub.publish(slug, date.isoformat(), {"type": "changed", "date": date.isoformat()})
+        return changed
+
+    hub.publish(slug, date.isoformat(), {
+        "type": "booked",
+        "date": date.isoformat(),
+        "start": minutes_to_hhmm(start_min),
+        "end": minutes_to_hhmm(end_min),
+    })
+    return changed
+
+
+def mark_day_stale(slug: str, date: dt.date, freed_start: int = None):
+    """Freed time can't be derived locally (other events may overlap) -> recompute on next read."""
+    _snapshot_query(slug, date).update({"computed_at": None})
+    db.session.commit()
+
+    event = {"type": "freed", "date": date.isoformat()}
+    if freed_start is not None:
+        event["start"] = minutes_to_hhmm(freed_start)
+    hub.publish(slug, date.isoformat(), event)
+
+
+def purge_snapshots(before: dt.date) -> int:
+    """Deletes snapshots of dates before `before` (nobody books the past). Returns the row count."""
+    deleted = DaySlotSnapshot.query.filter(DaySlotSnapshot.date < before).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def mark_business_stale(slug: str):
+    DaySlotSnapshot.query.filter_by(business_slug=slug).update({"computed_at": None})
+    db.session.commit()
+
+
+def last_known_bitmap(cfg: dict, date: dt.date, duration: int, local_busy):
+    """
+    Degraded mode (calendar unreachable): the stored bitmap however old, as
+    long as it was built from the current config; otherwise one built from
+    local_busy() (our own bookings only). Returns (bitmap, segments).
+    """
+    row = _snapshot_query(cfg["slug"], date).filter_by(duration_minutes=duration).first()
+    if row and row.config_hash == config_hash(cfg):
+        segments = split_segments(row.resource_bitmaps) if row.resource_bitmaps else [row.slot_bitmap]
+        return row.slot_bitmap, segments
+    return build_resource_bitmaps(cfg, date, duration, local_busy())
+
+
+def snapshot_etag(row: DaySlotSnapshot, first_start: int) -> str:
+    raw = f"{row.business_slug}|{row.date}|{row.duration_minutes}|{row.version}|{row.config_hash}|{first_start}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def next_available(cfg: dict, days, duration: int, step: int, first_start, fetch_busy_days,
+                   preferred: int = None, count: int = 3, local_busy=None):
+    """
+    Nearest open starts from days (in order), one per day: the start closest
+    to `preferred` (minute of day; the earliest when None). Stops as soon as
+    `count` days with room are found.
+
+    Fresh snapshots are used as they are; the first day that needs the
+    calendar fetches the rest of the range in one call,
+    fetch_busy_days(cfg, dates) -> {date: busy_by_resource}, and
+    materializes those days. first_start(date) -> earliest offerable minute
+    on the grid, or None when nothing can be offered that day.
+    If the calendar is unreachable and local_busy(cfg, date) is given, the
+    last known availability is used instead.
+    Returns ([(date, start_min)], stale).
+    """
+    slug = cfg["slug"]
+    cfg_h = config_hash(cfg)
+    now = dt.datetime.utcnow()
+    days = list(days)
+
+    found = []
+    fetched = None  # {date: busy} once the calendar was asked, False when it is down
+    for i, date in enumerate(days):
+        start = first_start(date)
+        if start is None:
+            continue
+
+        row = _snapshot_query(slug, date).filter_by(duration_minutes=duration).first()
+        if row and _is_fresh(row, cfg_h, now):
+            bitmap = row.slot_bitmap
+        else:
+            if fetched is None:
+                try:
+                    fetched = fetch_busy_days(cfg, days[i:])
+                except CalendarUnavailable:
+                    if local_busy is None:
+                        raise
+                    fetched = False
+            if fetched is False:
+                bitmap, _ = last_known_bitmap(cfg, date, duration, lambda: local_busy(cfg, date))
+            else:
+                refresh_day(cfg, date, fetched[date], extra_durations=[duration])
+                bitmap = _snapshot_query(slug, date).filter_by(duration_minutes=duration).first().slot_bitmap
+
+        starts = slots_from_bitmap(bitmap, start, step)
+        if not starts:
+            continue
+        if preferred is None:
+            found.append((date, starts[0]))
+        else:
+            found.append((date, min(starts, key=lambda m: (abs(m - preferred), m))))
+        if len(found) >= count:
+            break
+    return found, fetched is False
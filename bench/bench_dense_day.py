@@ -0,0 +1,68 @@
+"""
+Slot computation on dense days: bitmap build, grid expansion and best-fit
+ranking (booking_core), per call.
+
+    python bench/bench_dense_day.py [--repeat 200]
+
+A "dense" day is 08:00-22:00 on a 5 minute grid with the given share of
+the day already booked in random 15-45 minute appointments.
+"""
+import argparse
+import datetime as dt
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booking_core import build_slot_bitmap, rank_best_fit, slots_from_bitmap  # noqa: E402
+
+DAY = dt.date(2026, 1, 5)  # a Monday
+OPEN, CLOSE = 8 * 60, 22 * 60
+CFG = {
+    "working_days": ["mon"],
+    "working_hours": {"start": "08:00", "end": "22:00", "breaks": [{"start": "13:00", "end": "13:30"}]},
+}
+
+
+def dense_busy(fill: float, rng: random.Random) -> list:
+    busy, booked, m = [], 0, OPEN
+    target = (CLOSE - OPEN) * fill
+    while booked < target and m < CLOSE:
+        m += rng.choice((0, 0, 5, 10, 15))  # small gaps between bookings
+        length = rng.choice((15, 20, 30, 45))
+        busy.append((m, min(CLOSE, m + length)))
+        booked += length
+        m += length
+    return busy
+
+
+def timed(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--block", type=int, default=20, help="service + buffer minutes")
+    parser.add_argument("--step", type=int, default=5, help="slot granularity")
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    print(f"{'fill':>5} {'starts':>7} {'build ms':>9} {'grid ms':>8} {'rank ms':>8}")
+    for fill in (0.25, 0.5, 0.65, 0.8):
+        busy = dense_busy(fill, rng)
+        bitmap = build_slot_bitmap(CFG, DAY, args.block, busy)
+        starts = slots_from_bitmap(bitmap, OPEN, args.step)
+        build_ms = timed(lambda: build_slot_bitmap(CFG, DAY, args.block, busy), args.repeat)
+        grid_ms = timed(lambda: slots_from_bitmap(bitmap, OPEN, args.step), args.repeat)
+        rank_ms = timed(lambda: rank_best_fit(bitmap, starts, 15), args.repeat)
+        print(f"{fill:>5.0%} {len(starts):>7} {build_ms:>9.3f} {grid_ms:>8.3f} {rank_ms:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+OTP login under concurrent load (consume_otp: one conditional UPDATE ... RETURNING).
+
+    python bench/bench_otp_login.py [--logins 400] [--threads 8] [--guessers 20]
+
+Runs against a throwaway SQLite DB (DATABASE_URL is set before the app is
+imported) through Flask test clients, one per thread:
+1. throughput: --logins phones, each with a pending code, verified
+   concurrently (user + device + code deletion per login)
+2. races: --guessers concurrent wrong guesses on one 5-attempt code; with
+   no lost updates exactly 5 are answered "wrong" (401), the rest "locked"
+   or "not found", and the code is never accepted afterwards
+"""
+import argparse
+import collections
+import datetime as dt
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="quiteslot-bench-"), "app.db")
+os.environ.setdefault("SMS_PROVIDER", "console")
+
+import app as appmod  # noqa: E402
+from db import db  # noqa: E402
+from models import PhoneVerification, User  # noqa: E402
+
+CODE = "123456"
+
+
+def seed_codes(phones, attempts: int = 5):
+    expires = dt.datetime.utcnow() + dt.timedelta(minutes=10)
+    code_hash = hashlib.sha256(CODE.encode()).hexdigest()
+    with appmod.app.app_context():
+        db.session.execute(db.insert(PhoneVerification), [
+            {"phone": p, "code_hash": code_hash, "expires_at": expires, "attempts": attempts,
+             "created_at": dt.datetime.utcnow()}
+            for p in phones
+        ])
+        db.session.commit()
+
+
+def run_threads(n: int, work):
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(n)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - started
+
+
+def throughput(logins: int, threads: int):
+    phones = [f"05{i:08d}" for i in range(logins)]
+    seed_codes(phones)
+    statuses = collections.Counter()
+    lock = threading.Lock()
+
+    def work(i):
+        client = appmod.app.test_client()
+        for phone in phones[i::threads]:
+            r = client.post("/api/auth/verify", json={"phone": phone, "code": CODE, "name": "Bench"})
+            with lock:
+                statuses[r.status_code] += 1
+
+    seconds = run_threads(threads, work)
+    with appmod.app.app_context():
+        users = User.query.count()
+        left = PhoneVerification.query.count()
+    print(f"logins: {logins} over {threads} threads in {seconds:.2f}s = {logins / seconds:.0f}/s")
+    print(f"  statuses {dict(statuses)}, users created {users}, codes left {left}")
+
+
+def races(guessers: int):
+    phone = "0599999999"
+    seed_codes([phone])
+    statuses = collections.Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(guessers)
+
+    def work(i):
+        client = appmod.app.test_client()
+        barrier.wait()
+        r = client.post("/api/auth/verify", json={"phone": phone, "code": "000000"})
+        with lock:
+            statuses[r.status_code] += 1
+
+    run_threads(guessers, work)
+    after = appmod.app.test_client().post("/api/auth/verify", json={"phone": phone, "code": CODE}).status_code
+    ok = statuses[401] == 5 and after != 200
+    print(f"races: {guessers} concurrent wrong guesses -> {dict(statuses)}; right code afterwards -> {after}")
+    print(f"  {'OK: no lost updates' if ok else 'LOST UPDATE: more than 5 guesses were counted as attempts'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--guessers", type=int, default=20)
+    args = parser.parse_args()
+    # this measures consume_otp; the per-phone / per-address limit would stop the guessers first
+    appmod.RATE_LIMIT_MAX = appmod.RATE_LIMIT_IP_MAX = 10 ** 9
+
+    with appmod.app.app_context():
+        db.drop_all()
+        db.create_all()
+    throughput(args.logins, args.threads)
+    sys.exit(0 if races(args.guessers) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import datetime as dt
+import itertools
 
 # ---------- Time helpers ----------
 
@@ -9,16 +10,6 @@ def day_key(d: dt.date) -> str:
 def parse_hhmm(s: str) -> dt.time:
     return dt.datetime.strptime(s, "%H:%M").time()
 
-def ceil_to_slot(dt_obj: dt.datetime, duration: int) -> dt.datetime:
-    minutes = dt_obj.minute
-    remainder = minutes % duration
-
-    if remainder == 0:
-        return dt_obj.replace(second=0, microsecond=0)
-
-    delta = duration - remainder
-    return (dt_obj + dt.timedelta(minutes=delta)).replace(second=0, microsecond=0)
-
 # ---------- Working hours (supports default/by_day + legacy start/end) ----------
 
 def get_working_hours_for_date(cfg: dict, date: dt.date) -> dict:
@@ -117,3 +108,279 @@ def validate_slot(cfg: dict, start_local: dt.datetime, end_local: dt.datetime):
         return False, msg
 
     return True, None
+
+# ---------- Packed slot bitmaps (one bit per minute of the local day) ----------
+
+MINUTES_PER_DAY = 24 * 60
+BITMAP_BYTES = MINUTES_PER_DAY // 8
+
+def hhmm_to_minutes(s: str) -> int:
+    t = parse_hhmm(s)
+    return t.hour * 60 + t.minute
+
+def minutes_to_hhmm(m: int) -> str:
+    return f"{m // 60:02d}:{m % 60:02d}"
+
+def _block(free: bytearray, start: int, end: int):
+    start = max(0, start)
+    end = min(MINUTES_PER_DAY, end)
+    if end > start:
+        free[start:end] = bytes(end - start)
+
+def open_minutes(cfg: dict, date: dt.date) -> bytearray:
+    """1 per minute inside the day's working hours and outside its breaks."""
+    wh = get_working_hours_for_date(cfg, date)
+    free = bytearray(MINUTES_PER_DAY)
+    open_m = hhmm_to_minutes(wh["start"])
+    close_m = hhmm_to_minutes(wh["end"])
+    free[open_m:close_m] = b"\x01" * max(0, close_m - open_m)
+    for b in wh.get("breaks", []):
+        _block(free, hhmm_to_minutes(b["start"]), hhmm_to_minutes(b["end"]))
+    return free
+
+def build_slot_bitmap(cfg: dict, date: dt.date, duration: int, busy_minutes) -> bytes:
+    """
+    Packs the feasible start minutes of a `duration` slot on `date`.
+    Bit m is set when [m, m+duration) is inside working hours and does not
+    touch a break or any (start_min, end_min) busy interval.
+    """
+    out = bytearray(BITMAP_BYTES)
+
+    if day_key(date) not in cfg["working_days"]:
+        return bytes(out)
+    if date.isoformat() in set(cfg.get("closed_dates", [])):
+        return bytes(out)
+
+    free = open_minutes(cfg, date)
+    for b_s, b_e in busy_minutes:
+        _block(free, b_s, b_e)
+
+    # run[m] = length of the free stretch starting at m
+    run = 0
+    for m in range(MINUTES_PER_DAY - 1, -1, -1):
+        run = run + 1 if free[m] else 0
+        if run >= duration:
+            out[m >> 3] |= 1 << (m & 7)
+
+    return bytes(out)
+
+def clear_busy_in_bitmap(bitmap: bytes, duration: int, busy_start: int, busy_end: int) -> bytes:
+    """Drops every start minute whose slot would overlap [busy_start, busy_end)."""
+    out = bytearray(bitmap)
+    for m in range(max(0, busy_start - duration + 1), min(MINUTES_PER_DAY, busy_end)):
+        out[m >> 3] &= ~(1 << (m & 7)) & 0xFF
+    return bytes(out)
+
+def bitmap_has(bitmap: bytes, minute: int) -> bool:
+    if minute < 0 or minute >= MINUTES_PER_DAY:
+        return False
+    return bool(bitmap[minute >> 3] & (1 << (minute & 7)))
+
+def slots_from_bitmap(bitmap: bytes, first_start: int, step: int) -> list:
+    """Start minutes on the grid first_start, first_start+step, ... that are set."""
+    return [m for m in range(first_start, MINUTES_PER_DAY, step) if bitmap_has(bitmap, m)]
+
+# ---------- Slot grid, buffers and ranking ----------
+
+SLOT_RANKINGS = ("chronological", "best_fit")
+
+def service_block(svc: dict) -> int:
+    """Minutes a booking of svc holds: duration + buffer_minutes (cleanup after)."""
+    return int(svc["duration_minutes"]) + int(svc.get("buffer_minutes") or 0)
+
+def block_minutes(cfg: dict, duration: int, service_id: str = None) -> int:
+    """Block for a requested service; by id, else the first service with that duration."""
+    services = cfg.get("services", [])
+    svc = next((s for s in services if service_id and s.get("id") == service_id), None)
+    if svc is None:
+        svc = next((s for s in services if int(s["duration_minutes"]) == duration), None)
+    return duration + int((svc or {}).get("buffer_minutes") or 0)
+
+def slot_step(cfg: dict, block: int) -> int:
+    """Grid step for offered starts: slot_granularity_minutes, else the block itself."""
+    return int(cfg.get("slot_granularity_minutes") or block)
+
+def grid_ceil(minute: int, anchor: int, step: int) -> int:
+    """First grid point anchor + k*step at or after minute."""
+    if minute <= anchor:
+        return anchor
+    return anchor + -(-(minute - anchor) // step) * step
+
+def rank_best_fit(bitmap: bytes, starts, min_block: int) -> list:
+    """
+    Orders start minutes so bookings pack against existing ones.
+    A run [a, b] of set bits is a free stretch [a, b + block), so starting
+    at m leaves m - a free minutes before and b - m after. Preferred: no
+    leftover shorter than min_block (unbookable), then touching a neighbour,
+    then the tightest stretch (best fit), then earliest.
+    """
+    bits = [(bitmap[m >> 3] >> (m & 7)) & 1 for m in range(MINUTES_PER_DAY)]
+    run_start = [0] * MINUTES_PER_DAY
+    run_end = [0] * MINUTES_PER_DAY
+
+    a = 0
+    for m in range(MINUTES_PER_DAY):
+        if bits[m] and (m == 0 or not bits[m - 1]):
+            a = m
+        run_start[m] = a
+    b = MINUTES_PER_DAY - 1
+    for m in range(MINUTES_PER_DAY - 1, -1, -1):
+        if bits[m] and (m == MINUTES_PER_DAY - 1 or not bits[m + 1]):
+            b = m
+        run_end[m] = b
+
+    def key(m):
+        before, after = m - run_start[m], run_end[m] - m
+        waste = sum(g for g in (before, after) if 0 < g < min_block)
+        return (waste, min(before, after) > 0, run_end[m] - run_start[m], m)
+
+    return sorted(starts, key=key)
+
+# ---------- Resources (staff / chairs) ----------
+
+DEFAULT_RESOURCE_ID = "main"
+
+def resource_cfgs(cfg: dict) -> list:
+    """
+    [(resource_id, cfg view), ...] in config order. A resource may set its own
+    calendar_id, working_days and working_hours (business values otherwise);
+    its closed_dates add to the business ones. A business without
+    "resources" is a single implicit resource. Resources without a
+    calendar_id share the business calendar (see fetch_resource_busy in app).
+    """
+    resources = cfg.get("resources") or []
+    if not resources:
+        return [(DEFAULT_RESOURCE_ID, cfg)]
+
+    out = []
+    for r in resources:
+        view = dict(cfg)
+        view["calendar_id"] = r.get("calendar_id") or cfg["calendar_id"]
+        for key in ("working_days", "working_hours"):
+            if r.get(key):
+                view[key] = r[key]
+        if r.get("closed_dates"):
+            view["closed_dates"] = list(cfg.get("closed_dates", [])) + list(r["closed_dates"])
+        out.append((r["id"], view))
+    return out
+
+def day_span(cfg: dict, date: dt.date):
+    """(earliest open, latest close) in minutes over resources working on date; None if nobody works."""
+    span = None
+    for _, view in resource_cfgs(cfg):
+        if day_key(date) not in view["working_days"]:
+            continue
+        if date.isoformat() in set(view.get("closed_dates", [])):
+            continue
+        wh = get_working_hours_for_date(view, date)
+        s, e = hhmm_to_minutes(wh["start"]), hhmm_to_minutes(wh["end"])
+        span = (s, e) if span is None else (min(span[0], s), max(span[1], e))
+    return span
+
+def union_bitmaps(bitmaps) -> bytes:
+    acc = 0
+    for b in bitmaps:
+        acc |= int.from_bytes(b, "little")
+    return acc.to_bytes(BITMAP_BYTES, "little")
+
+def split_segments(packed: bytes) -> list:
+    return [packed[i:i + BITMAP_BYTES] for i in range(0, len(packed), BITMAP_BYTES)]
+
+def build_resource_bitmaps(cfg: dict, date: dt.date, duration: int, busy_by_resource: dict):
+    """
+    (union bitmap, per-resource segments) for `duration` on `date`.
+    A start minute is offered when at least one resource can take it.
+    """
+    segments = [
+        build_slot_bitmap(view, date, duration, busy_by_resource.get(rid, []))
+        for rid, view in resource_cfgs(cfg)
+    ]
+    return union_bitmaps(segments), segments
+
+def subtract_intervals(intervals, cut) -> list:
+    """Parts of (start, end) intervals not covered by any interval in cut; empty parts dropped."""
+    cut = sorted(cut)
+    out = []
+    for s, e in sorted(intervals):
+        for c_s, c_e in cut:
+            if c_e <= s or c_s >= e:
+                continue
+            if c_s > s:
+                out.append((s, c_s))
+            s = max(s, c_e)
+            if s >= e:
+                break
+        if s < e:
+            out.append((s, e))
+    return out
+
+def pick_least_loaded(resource_ids, loads: dict):
+    """Resource with the fewest booked minutes; ties go to config order."""
+    return min(resource_ids, key=lambda rid: loads.get(rid, 0)) if resource_ids else None
+
+# ---------- Compiled weekly schedule (bulk checks of existing appointments) ----------
+
+DAY_KEYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+_REF_MONDAY = dt.date(2024, 1, 1)
+
+def compile_schedule(cfg: dict) -> dict:
+    """
+    Per working weekday: prefix sums of open minutes, plus the closed dates.
+    Hours depend only on the weekday, so 7 arrays cover any date range and
+    each appointment check is O(1).
+    """
+    open_prefix = {}
+    working = set(cfg.get("working_days", []))
+    for i, dk in enumerate(DAY_KEYS):
+        if dk not in working:
+            continue
+        free = open_minutes(cfg, _REF_MONDAY + dt.timedelta(days=i))
+        open_prefix[dk] = list(itertools.accumulate(free, initial=0))
+    return {
+        "open_prefix": open_prefix,
+        "closed_dates": set(cfg.get("closed_dates", [])),
+    }
+
+def schedule_conflict(compiled: dict, date: dt.date, start_min: int, end_min: int):
+    """None if [start_min, end_min) on date still fits the schedule, else the reason."""
+    if date.isoformat() in compiled["closed_dates"]:
+        return "העסק סגור בתאריך זה."
+    prefix = compiled["open_prefix"].get(day_key(date))
+    if prefix is None:
+        return "העסק סגור ביום זה."
+    end_min = min(end_min, MINUTES_PER_DAY)
+    if prefix[end_min] - prefix[start_min] != end_min - start_min:
+        return "מחוץ לשעות הפעילות"
+    return None
+
+# ---------- Recurring series ----------
+
+def series_starts(first_start: dt.datetime, interval_weeks: int, occurrences: int,
+                  window_start: dt.datetime = None, window_end: dt.datetime = None):
+    """Lazily yields occurrence starts, optionally only those in [window_start, window_end)."""
+    step = dt.timedelta(weeks=interval_weeks)
+    k0 = 0
+    if window_start is not None and window_start > first_start:
+        # jump straight to the first occurrence inside the window
+        k0 = -(-(window_start - first_start) // step)
+    for k in range(k0, occurrences):
+        start = first_start + k * step
+        if window_end is not None and start >= window_end:
+            return
+        yield start
+
+def first_overlap(starts, duration: int, busy_intervals):
+    """
+    One merge-style pass over sorted occurrence starts and sorted (start, end)
+    busy intervals. Returns the first occurrence start that overlaps, or None.
+    """
+    length = dt.timedelta(minutes=duration)
+    busy = sorted(busy_intervals)
+    i = 0
+    for s in sorted(starts):
+        e = s + length
+        while i < len(busy) and busy[i][1] <= s:
+            i += 1
+        if i < len(busy) and busy[i][0] < e:
+            return s
+    return None
@@ -0,0 +1,182 @@
+"""
+Bulk import of customers and historical appointments (onboarding).
+
+Records are read as a stream (csv / jsonl), cleaned, and written in
+batches: each batch is one duplicate check (IN query on an indexed
+column), one multi-row INSERT (executemany) and one commit. A re-run of
+the same file inserts nothing new, so an interrupted import can simply
+be started again.
+
+Duplicates:
+- customers: by normalized phone (users.phone is unique)
+- appointments: by calendar_event_id; rows without one get a stable
+  "import:<hash>" id from (business, phone, start), and are also skipped
+  when the business already has a booking for that phone at that time.
+"""
+import csv
+import datetime as dt
+import hashlib
+import json
+import time
+
+from db import db
+from models import Appointment, User
+
+BATCH_SIZE = 5000
+KINDS = ("customers", "appointments")
+
+
+def read_records(path: str):
+    """Yields dicts from a .csv / .jsonl file (streamed) or a .json list."""
+    if path.endswith(".csv"):
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            yield from csv.DictReader(f)
+    elif path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif path.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            yield from json.load(f)
+    else:
+        raise ValueError(f"unsupported file type: {path}")
+
+
+def _batches(records, size: int):
+    batch = []
+    for rec in records:
+        batch.append(rec)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _text(rec: dict, key: str, limit: int):
+    v = rec.get(key)
+    v = str(v).strip() if v is not None else ""
+    return v[:limit] or None
+
+
+def _customer_rows(batch, normalize_phone, stats):
+    rows = {}
+    for rec in batch:
+        phone = normalize_phone(str(rec.get("phone") or ""))
+        if not phone:
+            stats["invalid"] += 1
+            continue
+        if phone in rows:
+            stats["duplicates"] += 1
+            continue
+        rows[phone] = {"phone": phone, "name": _text(rec, "name", 100), "email": _text(rec, "email", 120)}
+
+    existing = {
+        p for (p,) in db.session.query(User.phone).filter(User.phone.in_(list(rows)))
+    } if rows else set()
+    stats["duplicates"] += len(existing)
+    return [r for p, r in rows.items() if p not in existing]
+
+
+def _parse_start(v):
+    if isinstance(v, dt.datetime):
+        return v.replace(tzinfo=None)
+    try:
+        return dt.datetime.fromisoformat(str(v or "").strip()).replace(tzinfo=None, second=0, microsecond=0)
+    except ValueError:
+        return None
+
+
+def _appointment_rows(batch, normalize_phone, stats, default_slug=None):
+    rows = {}
+    for rec in batch:
+        phone = normalize_phone(str(rec.get("phone") or ""))
+        start = _parse_start(rec.get("start_time"))
+        slug = _text(rec, "business_slug", 100) or default_slug
+        name = _text(rec, "name", 100)
+        if not phone or not start or not name:
+            stats["invalid"] += 1
+            continue
+        try:
+            duration = int(rec["duration_minutes"]) if rec.get("duration_minutes") not in (None, "") else None
+        except (TypeError, ValueError):
+            stats["invalid"] += 1
+            continue
+
+        event_id = _text(rec, "calendar_event_id", 200) or "import:" + hashlib.sha1(
+            f"{slug}|{phone}|{start.isoformat()}".encode()
+        ).hexdigest()
+        if event_id in rows:
+            stats["duplicates"] += 1
+            continue
+        rows[event_id] = {
+            "name": name,
+            "phone": phone,
+            "start_time": start,
+            "calendar_event_id": event_id,
+            "business_slug": slug,
+            "duration_minutes": duration,
+            "service_name": _text(rec, "service_name", 100),
+            "resource_id": _text(rec, "resource_id", 100),
+        }
+    if not rows:
+        return []
+
+    taken = {
+        e for (e,) in db.session.query(Appointment.calendar_event_id)
+        .filter(Appointment.calendar_event_id.in_(list(rows)))
+    }
+    # same customer at the same time, booked before the import (index seek per start)
+    starts = {r["start_time"] for r in rows.values()}
+    booked = set(
+        db.session.query(Appointment.business_slug, Appointment.phone, Appointment.start_time)
+        .filter(
+            Appointment.business_slug.in_({r["business_slug"] for r in rows.values()}),
+            Appointment.start_time.in_(starts),
+        )
+    )
+    out = [
+        r for e, r in rows.items()
+        if e not in taken and (r["business_slug"], r["phone"], r["start_time"]) not in booked
+    ]
+    stats["duplicates"] += len(rows) - len(out)
+    return out
+
+
+def run(kind: str, records, normalize_phone, default_slug: str = None,
+        batch_size: int = BATCH_SIZE, progress=None) -> dict:
+    """
+    Imports records of kind "customers" / "appointments".
+    progress(stats) is called after each committed batch.
+    Returns counters: read, inserted, duplicates, invalid, seconds, rows_per_sec.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"unknown kind {kind}")
+    model = User if kind == "customers" else Appointment
+    stats = {"read": 0, "inserted": 0, "duplicates": 0, "invalid": 0}
+    started = time.perf_counter()
+
+    for batch in _batches(records, batch_size):
+        stats["read"] += len(batch)
+        if kind == "customers":
+            rows = _customer_rows(batch, normalize_phone, stats)
+        else:
+            rows = _appointment_rows(batch, normalize_phone, stats, default_slug)
+        if rows:
+            now = dt.datetime.utcnow()
+            for r in rows:
+                r["created_at"] = now
+            try:
+                db.session.execute(db.insert(model), rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            stats["inserted"] += len(rows)
+        if progress:
+            progress(stats)
+
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    stats["rows_per_sec"] = int(stats["read"] / stats["seconds"]) if stats["seconds"] else stats["read"]
+    return stats
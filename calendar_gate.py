@@ -0,0 +1,279 @@
+"""
+Per-tenant limits and fair scheduling for Google Calendar calls.
+
+All calendar requests of a worker share CALENDAR_MAX_CONCURRENCY slots.
+Each business may use at most its plan's `concurrency` of them, and when
+slots are contended they are handed out by weighted fair queuing (virtual
+finish time += 1 / weight per call), so a business with a viral promotion
+queues behind its own requests instead of everyone else's.
+
+Shedding:
+- TenantThrottled (429): the business already has MAX_QUEUED_PER_TENANT
+  calls waiting - it is over its own share.
+- CalendarBusy (503): no slot was granted within QUEUE_TIMEOUT_SEC.
+
+The plan comes from the business config ("plan": free | pro | business,
+default free). Counters are kept per slug per worker (stats()).
+
+Outages: every call has CALENDAR_TIMEOUT_SEC, and a circuit breaker opens
+after CALENDAR_BREAKER_FAILURES consecutive upstream failures (timeouts,
+connection errors, 5xx / 429). While open, calls fail at once with
+CalendarUnavailable instead of tying up workers; after
+CALENDAR_BREAKER_COOLDOWN_SEC one probe call is let through and closes it
+again on success. Callers degrade (stale slots, pending bookings).
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+MAX_CONCURRENCY = int(os.environ.get("CALENDAR_MAX_CONCURRENCY", "16"))
+QUEUE_TIMEOUT_SEC = float(os.environ.get("CALENDAR_QUEUE_TIMEOUT_SEC", "5"))
+MAX_QUEUED_PER_TENANT = 20
+
+CALL_TIMEOUT_SEC = float(os.environ.get("CALENDAR_TIMEOUT_SEC", "10"))
+BREAKER_FAILURES = int(os.environ.get("CALENDAR_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_SEC = float(os.environ.get("CALENDAR_BREAKER_COOLDOWN_SEC", "30"))
+
+PLANS = {
+    "free": {"concurrency": 2, "weight": 1},
+    "pro": {"concurrency": 4, "weight": 2},
+    "business": {"concurrency": 8, "weight": 4},
+}
+DEFAULT_PLAN = "free"
+
+
+class CalendarOverloaded(Exception):
+    status = 503
+    retry_after = 5
+    message = "המערכת עמוסה כרגע - נסו שוב בעוד רגע"
+
+    def __init__(self, slug: str):
+        super().__init__(f"calendar calls for {slug} shed ({self.status})")
+        self.slug = slug
+
+
+class TenantThrottled(CalendarOverloaded):
+    status = 429
+    retry_after = 2
+    message = "יותר מדי בקשות לעסק הזה כרגע - נסו שוב בעוד כמה שניות"
+
+
+class CalendarBusy(CalendarOverloaded):
+    pass
+
+
+class CalendarUnavailable(CalendarOverloaded):
+    """Google Calendar is failing (or the breaker is open)."""
+    retry_after = 30
+    message = "יומן העסק לא זמין כרגע - נסו שוב בעוד כמה דקות"
+
+
+def is_upstream_failure(exc: Exception) -> bool:
+    """Timeouts, connection errors and 5xx / 429 count; other client errors (404, 410...) don't."""
+    status = getattr(getattr(exc, "resp", None), "status", None)
+    if status is not None:
+        return int(status) >= 500 or int(status) == 429
+    return isinstance(exc, (OSError, TimeoutError)) or type(exc).__module__.startswith("httplib2")
+
+
+class CircuitBreaker:
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN_SEC):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._failed = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "rejected": 0, "failures": 0}
+
+    def allow(self) -> bool:
+        """False while open; in half-open lets exactly one probe through."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def record(self, ok: bool):
+        with self._lock:
+            self._probing = False
+            if ok:
+                self.state = "closed"
+                self._failed = 0
+                return
+            self.stats["failures"] += 1
+            self._failed += 1
+            if self.state == "half_open" or self._failed >= self.failures:
+                if self.state != "open":
+                    self.stats["opened"] += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def cancel_probe(self):
+        with self._lock:
+            self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state != "closed"
+
+
+class _Tenant:
+    __slots__ = ("limit", "weight", "in_flight", "waiters", "vtime", "stats")
+
+    def __init__(self):
+        self.limit = PLANS[DEFAULT_PLAN]["concurrency"]
+        self.weight = PLANS[DEFAULT_PLAN]["weight"]
+        self.in_flight = 0
+        self.waiters = deque()  # [threading.Event, granted]
+        self.vtime = 0.0
+        self.stats = {
+            "calls": 0,
+            "errors": 0,
+            "throttled": 0,
+            "shed": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+            "call_ms_total": 0.0,
+        }
+
+
+class FairGate:
+    def __init__(self, capacity: int = MAX_CONCURRENCY, queue_timeout: float = QUEUE_TIMEOUT_SEC,
+                 max_queued: int = MAX_QUEUED_PER_TENANT):
+        self.capacity = capacity
+        self.queue_timeout = queue_timeout
+        self.max_queued = max_queued
+        self.in_flight = 0
+        self._vclock = 0.0
+        self._tenants = {}
+        self._lock = threading.Lock()
+
+    def _tenant(self, slug: str, plan: str) -> _Tenant:
+        t = self._tenants.get(slug)
+        if t is None:
+            t = self._tenants[slug] = _Tenant()
+        p = PLANS.get(plan) or PLANS[DEFAULT_PLAN]
+        t.limit, t.weight = p["concurrency"], p["weight"]
+        return t
+
+    def _dispatch(self):
+        """Grants free slots to waiting tenants, lowest virtual time first (lock held)."""
+        while self.in_flight < self.capacity:
+            best = None
+            for t in self._tenants.values():
+                if t.waiters and t.in_flight < t.limit:
+                    if best is None or max(t.vtime, self._vclock) < max(best.vtime, self._vclock):
+                        best = t
+            if best is None:
+                return
+            waiter = best.waiters.popleft()
+            start = max(best.vtime, self._vclock)
+            best.vtime = start + 1.0 / best.weight
+            self._vclock = start
+            best.in_flight += 1
+            self.in_flight += 1
+            waiter[1] = True
+            waiter[0].set()
+
+    def acquire(self, slug: str, plan: str = None) -> float:
+        """Blocks until slug may call the calendar. Returns the wait in ms."""
+        started = time.monotonic()
+        waiter = [threading.Event(), False]
+        with self._lock:
+            t = self._tenant(slug, plan)
+            if len(t.waiters) >= self.max_queued:
+                t.stats["throttled"] += 1
+                raise TenantThrottled(slug)
+            t.waiters.append(waiter)
+            self._dispatch()
+
+        if not waiter[0].wait(self.queue_timeout):
+            with self._lock:
+                if not waiter[1]:
+                    t.waiters.remove(waiter)
+                    t.stats["shed"] += 1
+                    raise CalendarBusy(slug)
+
+        waited = (time.monotonic() - started) * 1000
+        with self._lock:
+            t.stats["wait_ms_total"] += waited
+            t.stats["wait_ms_max"] = max(t.stats["wait_ms_max"], waited)
+        return waited
+
+    def release(self, slug: str, call_ms: float, failed: bool = False):
+        with self._lock:
+            t = self._tenants[slug]
+            t.in_flight -= 1
+            self.in_flight -= 1
+            t.stats["calls"] += 1
+            t.stats["call_ms_total"] += call_ms
+            if failed:
+                t.stats["errors"] += 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, slug: str, plan: str = None):
+        self.acquire(slug, plan)
+        started = time.monotonic()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.release(slug, (time.monotonic() - started) * 1000, failed)
+
+    def stats(self, slug: str = None) -> dict:
+        """Counters for one slug, or {slug: counters} for all, plus live in_flight / queued."""
+        with self._lock:
+            def one(t):
+                s = dict(t.stats)
+                s["in_flight"] = t.in_flight
+                s["queued"] = len(t.waiters)
+                s["limit"] = t.limit
+                s["avg_wait_ms"] = round(s["wait_ms_total"] / s["calls"], 1) if s["calls"] else 0.0
+                s["avg_call_ms"] = round(s["call_ms_total"] / s["calls"], 1) if s["calls"] else 0.0
+                return s
+
+            if slug is not None:
+                t = self._tenants.get(slug)
+                return one(t) if t else one(_Tenant())
+            return {k: one(t) for k, t in self._tenants.items()}
+
+
+gate = FairGate()
+breaker = CircuitBreaker()
+
+
+def call(slug: str, plan: str, fn):
+    """fn() inside slug's fair-share slot, guarded by the breaker; upstream failures -> CalendarUnavailable."""
+    if not breaker.allow():
+        raise CalendarUnavailable(slug)
+    ran = False
+    try:
+        with gate.slot(slug, plan):
+            ran = True
+            try:
+                result = fn()
+            except Exception as e:
+                if is_upstream_failure(e):
+                    breaker.record(False)
+                    raise CalendarUnavailable(slug) from e
+                breaker.record(True)
+                raise
+    finally:
+        if not ran:
+            breaker.cancel_probe()  # shed before reaching Google: no verdict
+    breaker.record(True)
+    return result
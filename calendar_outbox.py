@@ -0,0 +1,175 @@
+"""
+Calendar event deletions off the request path.
+
+A cancel deletes the appointment and records its calendar event as a
+CalendarDeletion row in the same transaction, then wakes the worker; the
+customer never waits on Google. The worker (one thread per process,
+started with the first request, so rows left from before a restart are
+picked up) deletes the events oldest first:
+- 404 / 410 from Google count as deleted
+- an outage (CalendarOverloaded / CalendarUnavailable) skips that
+  business's rows for the rest of the run; they stay and are retried every
+  RETRY_SEC and by `flask calendar confirm-pending`
+- other errors are retried up to MAX_ATTEMPTS, then dropped (logged)
+Every web worker and the CLI may run the outbox at once: a row is claimed
+with one conditional UPDATE before its event is deleted, so only one of them
+deletes it and runs on_deleted (a claim left by a crashed worker expires
+after CLAIM_TTL_SEC).
+Until its row is processed the event still counts as busy time (never a
+double booking); on_deleted(row) lets the caller re-open the freed time
+(waitlist offers included), so nothing is offered while the event is still
+in the calendar.
+"""
+import datetime as dt
+import os
+import secrets
+import threading
+
+from googleapiclient.errors import HttpError
+from sqlalchemy import delete, or_, update
+
+from calendar_gate import CalendarOverloaded
+from db import db
+from models import CalendarDeletion
+
+RETRY_SEC = 30
+MAX_ATTEMPTS = 10
+BATCH_SIZE = 100
+CLAIM_TTL_SEC = 300
+
+
+def enqueue(slug: str, calendar_id: str, event_id: str, start_time=None, resource_id: str = None,
+            block_minutes: int = None, interval_weeks: int = None, occurrences: int = None):
+    """
+    Adds the deletion to the current transaction (the caller commits).
+    resource_id / block_minutes describe the time freed for on_deleted;
+    interval_weeks / occurrences mark a recurring event starting at start_time.
+    """
+    db.session.add(CalendarDeletion(
+        business_slug=slug, calendar_id=calendar_id, calendar_event_id=event_id, start_time=start_time,
+        resource_id=resource_id, block_minutes=block_minutes,
+        interval_weeks=interval_weeks, occurrences=occurrences,
+    ))
+
+
+def process(delete_event, on_deleted=None, batch_size: int = BATCH_SIZE) -> dict:
+    """
+    One pass over the outbox; every row is tried at most once.
+    delete_event(row) deletes row's event from the calendar;
+    on_deleted(row) runs once it is gone.
+    """
+    stats = {"deleted": 0, "failed": 0, "dropped": 0, "waiting": 0}
+    token = secrets.token_hex(8)
+    skipped = set()  # businesses whose calendar calls are being shed this pass
+    last_id = 0
+    while True:
+        q = CalendarDeletion.query.filter(CalendarDeletion.id > last_id, _claimable(dt.datetime.utcnow()))
+        if skipped:
+            q = q.filter(CalendarDeletion.business_slug.notin_(skipped))
+        rows = q.order_by(CalendarDeletion.id).limit(batch_size).all()
+        if not rows:
+            if skipped:
+                stats["waiting"] = CalendarDeletion.query.filter(CalendarDeletion.business_slug.in_(skipped)).count()
+            return stats
+        for row_id, slug in [(r.id, r.business_slug) for r in rows]:
+            last_id = row_id
+            if slug in skipped:
+                continue
+            row = _claim(row_id, token)
+            if row is None:
+                continue  # another worker has it
+            try:
+                delete_event(row)
+            except CalendarOverloaded:
+                row.claimed_by = row.claimed_at = None
+                db.session.commit()
+                skipped.add(slug)
+                continue
+            except HttpError as e:
+                if e.resp.status not in (404, 410):
+                    _failed(row, e, stats)
+                    continue
+            except Exception as e:
+                _failed(row, e, stats)
+                continue
+            db.session.expunge(row)  # keeps its values for on_deleted
+            res = db.session.execute(
+                delete(CalendarDeletion).where(CalendarDeletion.id == row_id, CalendarDeletion.claimed_by == token)
+            )
+            db.session.commit()
+            if res.rowcount != 1:
+                continue  # our claim expired and another worker took over
+            stats["deleted"] += 1
+            if on_deleted:
+                on_deleted(row)
+
+
+def _claimable(now):
+    return or_(
+        CalendarDeletion.claimed_at.is_(None),
+        CalendarDeletion.claimed_at < now - dt.timedelta(seconds=CLAIM_TTL_SEC),
+    )
+
+
+def _claim(row_id: int, token: str):
+    """The row, claimed for this pass (one conditional UPDATE), or None if someone else holds it."""
+    now = dt.datetime.utcnow()
+    res = db.session.execute(
+        update(CalendarDeletion)
+        .where(CalendarDeletion.id == row_id, _claimable(now))
+        .values(claimed_by=token, claimed_at=now)
+    )
+    if res.rowcount != 1:
+        db.session.rollback()
+        return None
+    db.session.commit()
+    return db.session.get(CalendarDeletion, row_id)
+
+
+def _failed(row, exc, stats):
+    row.attempts += 1
+    row.claimed_by = row.claimed_at = None
+    if row.attempts >= MAX_ATTEMPTS:
+        print(f"[calendar] giving up on deleting {row.calendar_event_id} ({row.business_slug}): {exc}")
+        db.session.delete(row)
+        stats["dropped"] += 1
+    else:
+        stats["failed"] += 1
+    db.session.commit()
+
+
+def pending() -> int:
+    return CalendarDeletion.query.count()
+
+
+class Worker:
+    """Runs run() when woken, and every RETRY_SEC while it is alive."""
+
+    def __init__(self, run, interval: float = RETRY_SEC):
+        self.run = run
+        self.interval = interval
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        """Starts the thread in this process once; its first run picks up rows left from before a restart."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._wake.set()
+                    threading.Thread(target=self._loop, name="calendar-outbox", daemon=True).start()
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.run()
+            except Exception as e:
+                print(f"[calendar] outbox run failed: {e}")
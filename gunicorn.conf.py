@@ -0,0 +1,23 @@
+"""
+gunicorn settings, read from the working directory: `gunicorn app:app`.
+
+Day-slot streams (SSE) stay open while a customer picks a time; on sync
+workers each one would hold a whole worker, so the gevent worker is used.
+The standard library is patched here, before the app (and its threads,
+sockets and queues) is imported.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import multiprocessing  # noqa: E402
+import os  # noqa: E402
+
+bind = os.environ.get("BIND", f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+worker_class = "gevent"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# open connections per worker, streams included (slot_events.MAX_STREAMS caps the streams)
+worker_connections = int(os.environ.get("WORKER_CONNECTIONS", "2000"))
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
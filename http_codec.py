@@ -0,0 +1,148 @@
+"""
+JSON serialization and compression of API responses.
+
+- FastJSONProvider: Flask JSON provider on orjson when it is installed
+  (several times faster than the stdlib encoder), same output types as
+  Flask's default provider (dates as HTTP dates, UTF-8 body). Without
+  orjson the app keeps the stdlib provider.
+- compress_response: gzip / brotli (if the brotli module is installed) for
+  JSON / HTML / text bodies of at least COMPRESS_MIN_BYTES, picked from
+  Accept-Encoding. Streamed and file responses (SSE, exports, pre-compressed
+  assets) are left alone. A compressed body gets a weak ETag, so
+  revalidation compares with If-None-Match weakly.
+- benchmark: serialization cost and bytes on the wire for a payload
+  (`flask api bench`).
+"""
+import gzip
+import json
+import os
+import time
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+COMPRESSIBLE = ("application/json", "text/html", "text/plain", "text/css", "application/javascript")
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # dynamic responses: fast, still well below gzip size
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # datetimes / dates go through Flask's default (HTTP date), like the stdlib provider
+    _options = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:  # indent / sort_keys etc. requested explicitly
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self._options | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def install(app) -> str:
+    """Registers FastJSONProvider when orjson is available; returns the encoder name."""
+    if orjson is None:
+        return "stdlib"
+    app.json_provider_class = FastJSONProvider
+    app.json = FastJSONProvider(app)
+    return "orjson"
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Codings the client accepts; one with q=0 (any spelling, RFC 9110) is refused."""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        name, *params = part.split(";")
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value.strip())
+                except ValueError:
+                    q = 0.0
+        name = name.strip().lower()
+        if name and q > 0:
+            accepted.add(name)
+    return accepted
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, GZIP_LEVEL, mtime=0)
+
+
+def compress_response(resp, accept_encoding: str):
+    """Compresses resp in place when the client accepts it and it is worth it."""
+    if (
+        resp.status_code != 200
+        or resp.direct_passthrough
+        or resp.is_streamed
+        or "Content-Encoding" in resp.headers
+        or resp.mimetype not in COMPRESSIBLE
+    ):
+        return resp
+
+    resp.vary.add("Accept-Encoding")
+    accepted = accepted_encodings(accept_encoding)
+    encoding = "br" if brotli is not None and "br" in accepted else "gzip" if "gzip" in accepted else None
+    if encoding is None:
+        return resp
+    data = resp.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return resp
+
+    resp.set_data(compress(data, encoding))
+    resp.headers["Content-Encoding"] = encoding
+    etag, weak = resp.get_etag()
+    if etag and not weak:
+        resp.set_etag(etag, weak=True)
+    return resp
+
+
+def benchmark(payloads: dict, repeat: int = 200) -> list:
+    """
+    payloads: {label: obj}. For each payload and available encoder returns
+    {payload, encoder, us_per_dump, bytes, gzip, br} (br None without brotli).
+    """
+    # stdlib as Flask's default provider sends it (ASCII-escaped, sorted, compact)
+    encoders = [("stdlib", lambda o: json.dumps(o, ensure_ascii=True, sort_keys=True, separators=(",", ":")).encode())]
+    if orjson is not None:
+        encoders.append(("orjson", orjson.dumps))
+
+    rows = []
+    for label, obj in payloads.items():
+        for name, dump in encoders:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                data = dump(obj)
+            us = (time.perf_counter() - started) / repeat * 1e6
+            rows.append({
+                "payload": label,
+                "encoder": name,
+                "us_per_dump": round(us, 1),
+                "bytes": len(data),
+                "gzip": len(compress(data, "gzip")),
+                "br": len(compress(data, "br")) if brotli is not None else None,
+            })
+    return rows
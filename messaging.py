@@ -0,0 +1,223 @@
+"""
+Outbound SMS delivery off the request path.
+
+Routes call send_sms(); the message goes onto an in-process queue and a small
+worker pool delivers it in batches through the configured provider:
+- retry with exponential backoff (per message, up to MAX_ATTEMPTS)
+- per-provider concurrency cap (Twilio accounts are rate limited)
+- ConsoleProvider as the local fake (prints and keeps what it "sent")
+
+Provider comes from SMS_PROVIDER (console | twilio). Unset means console only
+in development (ENV=DEV or FLASK_DEBUG=1): the console provider prints every
+body, OTP codes included, so elsewhere check_provider() fails at startup.
+Workers start lazily on the first send, so forking servers don't inherit
+threads.
+"""
+import os
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+# default: one worker per provider send slot (max_concurrency); more would
+# only wait on the semaphore, fewer would leave slots unused
+WORKERS = int(os.environ["SMS_WORKERS"]) if os.environ.get("SMS_WORKERS") else None
+BATCH_SIZE = 20
+BATCH_WAIT_SEC = 0.05
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SEC = 1.0
+BACKOFF_MAX_SEC = 60.0
+CONSOLE_KEEP = 1000  # last messages ConsoleProvider keeps for inspection
+
+
+@dataclass
+class Message:
+    phone: str
+    body: str
+    kind: str = "generic"
+    attempts: int = 0
+    created_at: float = field(default_factory=time.time)
+
+
+# ================= Providers =================
+
+class ConsoleProvider:
+    """Local fake: prints instead of sending."""
+    name = "console"
+    max_concurrency = 8
+
+    def __init__(self):
+        self.sent = deque(maxlen=CONSOLE_KEEP)
+
+    def send_batch(self, messages):
+        """Returns the messages that failed (none here)."""
+        for m in messages:
+            print(f"Sending SMS to {m.phone}: {m.body}")
+            self.sent.append(m)
+        return []
+
+
+class TwilioProvider:
+    name = "twilio"
+
+    def __init__(self):
+        from twilio.rest import Client
+
+        self.client = Client(os.environ["TWILIO_ACCOUNT_SID"], os.environ["TWILIO_AUTH_TOKEN"])
+        self.from_number = os.environ["TWILIO_FROM"]
+        self.max_concurrency = int(os.environ.get("TWILIO_MAX_CONCURRENCY", "4"))
+
+    def send_batch(self, messages):
+        # Twilio has no batch endpoint; batching here just amortizes the queue work
+        failed = []
+        for m in messages:
+            try:
+                self.client.messages.create(to=_e164(m.phone), from_=self.from_number, body=m.body)
+            except Exception as e:
+                print(f"[sms] twilio send to {m.phone} failed: {e}")
+                failed.append(m)
+        return failed
+
+
+def _e164(phone_digits: str) -> str:
+    # local Israeli numbers (05XXXXXXXX) -> +9725XXXXXXXX
+    if phone_digits.startswith("0"):
+        return "+972" + phone_digits[1:]
+    return "+" + phone_digits
+
+
+PROVIDERS = {
+    "console": ConsoleProvider,
+    "twilio": TwilioProvider,
+}
+
+
+# ================= Queue =================
+
+class DeliveryQueue:
+    def __init__(self, provider, workers: int = WORKERS):
+        self.provider = provider
+        self._q = queue.Queue()
+        # still caps concurrent sends when SMS_WORKERS asks for more workers
+        self._slots = threading.BoundedSemaphore(provider.max_concurrency)
+        self._workers = workers or provider.max_concurrency
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._delayed = 0  # retries waiting on a timer
+        self._lock = threading.Lock()  # _delayed and stats: shared by workers and timers
+        self.stats = {"sent": 0, "retried": 0, "dropped": 0}
+
+    def start(self):
+        with self._start_lock:
+            if self._started:
+                return
+            for i in range(self._workers):
+                threading.Thread(target=self._run, name=f"sms-worker-{i}", daemon=True).start()
+            self._started = True
+
+    def put(self, msg: Message):
+        self.start()
+        self._q.put(msg)
+
+    def put_many(self, msgs):
+        self.start()
+        for m in msgs:
+            self._q.put(m)
+
+    def pending(self) -> int:
+        return self._q.qsize()
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """Waits until everything queued (and retries due) is handled. For CLI runs, not requests."""
+        deadline = time.monotonic() + timeout
+        while self._q.unfinished_tasks or self._delayed:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _next_batch(self):
+        batch = [self._q.get()]
+        deadline = time.monotonic() + BATCH_WAIT_SEC
+        while len(batch) < BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            with self._slots:
+                try:
+                    failed = self.provider.send_batch(batch)
+                except Exception as e:
+                    print(f"[sms] provider {self.provider.name} failed: {e}")
+                    failed = batch
+            with self._lock:
+                self.stats["sent"] += len(batch) - len(failed)
+            for m in failed:
+                self._retry_later(m)
+            for _ in batch:
+                self._q.task_done()
+
+    def _retry_later(self, m: Message):
+        m.attempts += 1
+        if m.attempts >= MAX_ATTEMPTS:
+            with self._lock:
+                self.stats["dropped"] += 1
+            print(f"[sms] giving up on {m.kind} to {m.phone} after {m.attempts} attempts")
+            return
+        delay = min(BACKOFF_MAX_SEC, BACKOFF_BASE_SEC * (2 ** (m.attempts - 1)))
+        with self._lock:
+            self.stats["retried"] += 1
+            self._delayed += 1
+        t = threading.Timer(delay, self._requeue, args=(m,))
+        t.daemon = True
+        t.start()
+
+    def _requeue(self, m: Message):
+        self._q.put(m)
+        with self._lock:
+            self._delayed -= 1
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def _is_dev() -> bool:
+    return os.environ.get("ENV") == "DEV" or os.environ.get("FLASK_DEBUG") == "1"
+
+
+def check_provider() -> str:
+    """The configured provider name; RuntimeError if it is missing (outside development) or unknown."""
+    name = os.environ.get("SMS_PROVIDER") or ("console" if _is_dev() else None)
+    if name is None:
+        raise RuntimeError("SMS_PROVIDER is not set (console is the default only with ENV=DEV or FLASK_DEBUG=1)")
+    if name not in PROVIDERS:
+        raise RuntimeError(f"unknown SMS_PROVIDER {name!r} (one of: {', '.join(PROVIDERS)})")
+    return name
+
+
+def get_queue() -> DeliveryQueue:
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = DeliveryQueue(PROVIDERS[check_provider()]())
+    return _queue
+
+
+def send_sms(phone: str, body: str, kind: str = "generic"):
+    """Enqueue only; returns immediately."""
+    get_queue().put(Message(phone=phone, body=body, kind=kind))
+
+
+def send_sms_batch(items, kind: str = "generic"):
+    """Enqueue many (phone, body) pairs at once."""
+    get_queue().put_many(Message(phone=p, body=b, kind=kind) for p, b in items)
@@ -4,16 +4,32 @@ from datetime import datetime
 
 class Appointment(db.Model):
     __tablename__ = "appointments"
+    __table_args__ = (
+        db.Index("ix_appointments_business_start", "business_slug", "start_time"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
     # snapshot של פרטי המשתמש בזמן קביעת התור
     name = db.Column(db.String(100), nullable=False)
-    phone = db.Column(db.String(20), nullable=False)
+    phone = db.Column(db.String(20), nullable=False, index=True)
 
     start_time = db.Column(db.DateTime, nullable=False, index=True)
     calendar_event_id = db.Column(db.String(200), nullable=False, unique=True)
 
+    # business the appointment was booked with (NULL for rows from before multi-tenant)
+    business_slug = db.Column(db.String(100), nullable=True)
+    duration_minutes = db.Column(db.Integer, nullable=True)
+    service_name = db.Column(db.String(100), nullable=True)
+
+    # staff member / chair the booking was assigned to, and its calendar
+    resource_id = db.Column(db.String(100), nullable=True)
+    calendar_id = db.Column(db.String(200), nullable=True)
+
+    # NULL = on the calendar; "pending" = taken while the calendar was down,
+    # calendar_event_id is a placeholder until confirm_pending_bookings runs
+    status = db.Column(db.String(20), nullable=True)
+
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
@@ -54,3 +70,162 @@ class TrustedDevice(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     user = db.relationship("User", backref=db.backref("trusted_devices", lazy=True))
+
+
+class DaySlotSnapshot(db.Model):
+    """Materialized availability: feasible start minutes for one (business, date, duration)."""
+    __tablename__ = "day_slot_snapshots"
+    __table_args__ = (
+        db.UniqueConstraint("business_slug", "date", "duration_minutes", name="uq_day_slot_snapshot"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    business_slug = db.Column(db.String(100), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    duration_minutes = db.Column(db.Integer, nullable=False)
+
+    # 1440 bits, bit m = a slot may start at minute m of the local day
+    slot_bitmap = db.Column(db.LargeBinary, nullable=False)
+    # businesses with several resources: one 1440-bit segment per resource
+    # (config order) so a booking clears only the assigned resource
+    resource_bitmaps = db.Column(db.LargeBinary, nullable=True)
+    config_hash = db.Column(db.String(64), nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+    # NULL = stale, recompute on next read
+    computed_at = db.Column(db.DateTime, nullable=True)
+
+
+class TenantOverride(db.Model):
+    """Admin edits for one business; `version` guards concurrent saves."""
+    __tablename__ = "tenant_overrides"
+
+    slug = db.Column(db.String(100), primary_key=True)
+    data = db.Column(db.JSON, nullable=False, default=dict)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_by = db.Column(db.String(20), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class Tenant(db.Model):
+    """Base business config (same shape as one entry of business_config.json)."""
+    __tablename__ = "tenants"
+
+    slug = db.Column(db.String(100), primary_key=True)
+    config = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class RevokedDeviceToken(db.Model):
+    """Revoked signed device tokens (by jti); rows can be purged after expires_at."""
+    __tablename__ = "revoked_device_tokens"
+
+    jti = db.Column(db.String(64), primary_key=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class AppointmentSeries(db.Model):
+    """Recurring booking (weekly / every N weeks), one row + one recurring calendar event."""
+    __tablename__ = "appointment_series"
+    __table_args__ = (
+        db.Index("ix_appointment_series_business_range", "business_slug", "first_start", "last_start"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    business_slug = db.Column(db.String(100), nullable=False)
+
+    name = db.Column(db.String(100), nullable=False)
+    phone = db.Column(db.String(20), nullable=False, index=True)
+    service_name = db.Column(db.String(100), nullable=True)
+
+    # local wall-clock times, like Appointment.start_time
+    first_start = db.Column(db.DateTime, nullable=False)
+    last_start = db.Column(db.DateTime, nullable=False)
+    duration_minutes = db.Column(db.Integer, nullable=False)
+    interval_weeks = db.Column(db.Integer, nullable=False, default=1)
+    occurrences = db.Column(db.Integer, nullable=False)
+
+    resource_id = db.Column(db.String(100), nullable=True)
+    calendar_id = db.Column(db.String(200), nullable=True)
+
+    calendar_event_id = db.Column(db.String(200), nullable=False, unique=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class WaitlistEntry(db.Model):
+    """
+    Customer waiting for time on a full day. `status`: waiting -> offered
+    (slot held until hold_expires_at) -> booked; or expired / left.
+    """
+    __tablename__ = "waitlist_entries"
+    __table_args__ = (
+        # matcher: (slug, date, status) equality, read in queue order; the
+        # window / block checks are applied to the entries walked
+        db.Index("ix_waitlist_queue", "business_slug", "date", "status", "created_at", "id"),
+        db.Index("ix_waitlist_holds", "status", "hold_expires_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    business_slug = db.Column(db.String(100), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    phone = db.Column(db.String(20), nullable=False, index=True)
+
+    # acceptable starts, minutes of the local day: window_start_min .. latest_start_min
+    window_start_min = db.Column(db.Integer, nullable=False)
+    latest_start_min = db.Column(db.Integer, nullable=False)
+    duration_minutes = db.Column(db.Integer, nullable=False)
+    block_minutes = db.Column(db.Integer, nullable=False)
+    service_id = db.Column(db.String(40), nullable=True)
+    service_name = db.Column(db.String(100), nullable=True)
+
+    status = db.Column(db.String(10), nullable=False, default="waiting")
+    offered_start_min = db.Column(db.Integer, nullable=True)
+    resource_id = db.Column(db.String(100), nullable=True)
+    hold_expires_at = db.Column(db.DateTime, nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class ReminderLog(db.Model):
+    """One row per reminder; the unique key is what makes each send happen once."""
+    __tablename__ = "reminder_log"
+    __table_args__ = (
+        db.UniqueConstraint("source", "source_id", "start_time", name="uq_reminder_once"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # "appointment" or "series" (one row per occurrence)
+    source = db.Column(db.String(12), nullable=False)
+    source_id = db.Column(db.Integer, nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    phone = db.Column(db.String(20), nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class CalendarDeletion(db.Model):
+    """Calendar event still to be deleted after a cancel (outbox; see calendar_outbox)."""
+    __tablename__ = "calendar_deletions"
+
+    id = db.Column(db.Integer, primary_key=True)
+    business_slug = db.Column(db.String(100), nullable=False)
+    calendar_id = db.Column(db.String(200), nullable=False)
+    calendar_event_id = db.Column(db.String(200), nullable=False)
+    # local start of the cancelled appointment; for a series its first start
+    # (NULL on older rows: the whole business is re-read)
+    start_time = db.Column(db.DateTime, nullable=True)
+    # what the freed time is offered as once the event is gone (waitlist)
+    resource_id = db.Column(db.String(100), nullable=True)
+    block_minutes = db.Column(db.Integer, nullable=True)
+    # series only: every interval_weeks, `occurrences` times from start_time
+    interval_weeks = db.Column(db.Integer, nullable=True)
+    occurrences = db.Column(db.Integer, nullable=True)
+    # the worker deleting it right now (calendar_outbox._claim)
+    claimed_by = db.Column(db.String(16), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
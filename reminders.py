@@ -0,0 +1,139 @@
+"""
+Appointment reminders.
+
+run() picks appointments (and recurring series occurrences) starting in the
+next `hours` with a range query on the start_time index, claims them in
+ReminderLog in batches and hands the claimed ones to the sender.
+
+Exactly-once: a reminder is sent only if this run inserted its
+(source, source_id, start_time) row - INSERT ... ON CONFLICT DO NOTHING
+RETURNING - so overlapping runs or a second scheduler never double-send.
+(A crash between claim and enqueue loses that reminder rather than
+repeating it.)
+
+Start times are local wall-clock per business, so the SQL range is padded
+by the widest UTC offset and each row is checked against its own timezone.
+"""
+import datetime as dt
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import and_, or_
+
+from db import db
+from models import Appointment, AppointmentSeries, ReminderLog
+from booking_core import series_starts
+
+DEFAULT_HOURS = 24
+BATCH_SIZE = 1000
+_MAX_UTC_OFFSET = dt.timedelta(hours=14)
+
+
+def _insert_ignore():
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(ReminderLog).on_conflict_do_nothing(
+        index_elements=["source", "source_id", "start_time"]
+    )
+
+
+def _candidates(now_utc: dt.datetime, hours: int):
+    """(source, source_id, slug, name, phone, service_name, local start) inside the padded window."""
+    lo = now_utc.replace(tzinfo=None) - _MAX_UTC_OFFSET
+    hi = now_utc.replace(tzinfo=None) + dt.timedelta(hours=hours) + _MAX_UTC_OFFSET
+
+    # keyset pages on (start_time, id): the caller commits between pages
+    last = None
+    while True:
+        q = db.session.query(
+            Appointment.id,
+            Appointment.business_slug,
+            Appointment.name,
+            Appointment.phone,
+            Appointment.service_name,
+            Appointment.start_time,
+        ).filter(Appointment.start_time >= lo, Appointment.start_time < hi)
+        if last is not None:
+            q = q.filter(or_(
+                Appointment.start_time > last[0],
+                and_(Appointment.start_time == last[0], Appointment.id > last[1]),
+            ))
+        page = q.order_by(Appointment.start_time, Appointment.id).limit(BATCH_SIZE).all()
+        if not page:
+            break
+        for r in page:
+            yield ("appointment", r.id, r.business_slug, r.name, r.phone, r.service_name, r.start_time)
+        last = (page[-1].start_time, page[-1].id)
+
+    series = AppointmentSeries.query.filter(
+        AppointmentSeries.first_start < hi,
+        AppointmentSeries.last_start >= lo,
+    ).all()
+    for sr in series:
+        for occ in series_starts(sr.first_start, sr.interval_weeks, sr.occurrences, lo, hi):
+            yield ("series", sr.id, sr.business_slug, sr.name, sr.phone, sr.service_name, occ)
+
+
+def _claim(batch) -> set:
+    """Inserts log rows for batch; returns the keys this call inserted."""
+    if not batch:
+        return set()
+    now = dt.datetime.utcnow()
+    stmt = _insert_ignore().values([
+        {"source": c[0], "source_id": c[1], "start_time": c[6], "phone": c[4], "sent_at": now}
+        for c in batch
+    ]).returning(ReminderLog.source, ReminderLog.source_id, ReminderLog.start_time)
+    claimed = {tuple(r) for r in db.session.execute(stmt)}
+    db.session.commit()
+    return claimed
+
+
+def run(cfg_for, send_batch, hours: int = DEFAULT_HOURS, now_utc: dt.datetime = None) -> dict:
+    """
+    cfg_for(slug) -> business cfg or None (unknown / disabled business)
+    send_batch([(phone, body), ...]) -> enqueue
+    Returns counters: checked, due, sent (already-sent reminders are skipped).
+    """
+    now_utc = now_utc or dt.datetime.now(dt.timezone.utc)
+    end_utc = now_utc + dt.timedelta(hours=hours)
+    stats = {"checked": 0, "due": 0, "sent": 0}
+    cfgs = {}
+
+    def flush(batch):
+        claimed = _claim(batch)
+        out = []
+        for c in batch:
+            if (c[0], c[1], c[6]) not in claimed:
+                continue
+            cfg = cfgs[c[2]]
+            shop = (cfg.get("display") or {}).get("name") or ""
+            out.append((
+                c[4],
+                f"תזכורת: {c[5] or 'תור'} ב{shop} ב-{c[6].strftime('%d/%m')} בשעה {c[6].strftime('%H:%M')}",
+            ))
+        if out:
+            send_batch(out)
+        stats["sent"] += len(out)
+
+    batch = []
+    for c in _candidates(now_utc, hours):
+        stats["checked"] += 1
+        slug = c[2] or "default"
+        if slug not in cfgs:
+            cfgs[slug] = cfg_for(slug)
+        cfg = cfgs[slug]
+        if not cfg or cfg.get("reminders") is False:
+            continue
+
+        start_utc = c[6].replace(tzinfo=ZoneInfo(cfg["timezone"])).astimezone(dt.timezone.utc)
+        if not (now_utc <= start_utc < end_utc):
+            continue
+
+        stats["due"] += 1
+        batch.append((c[0], c[1], slug) + c[3:])
+        if len(batch) >= BATCH_SIZE:
+            flush(batch)
+            batch = []
+    flush(batch)
+    return stats
@@ -0,0 +1,258 @@
+"""
+Shared state for running several workers / nodes.
+
+One small interface - key/value with TTL, windowed counters and pub/sub -
+with two backends picked by SHARED_STATE_URL:
+- unset / "memory://": LocalBackend, everything in this process (one worker)
+- "redis://...":       RedisBackend, shared by every worker and node
+                       (needs the redis package)
+
+Used for the auth rate limit, the Google token, tenant config invalidation
+and availability events (SSE), so any worker sees what another one changed.
+
+Published messages reach every subscriber of the channel, the publishing
+process included, so callers react to their own changes the same way as to
+remote ones. Redis delivery runs on one listener thread per process,
+started on first use in that process (ensure_listening; a forked worker
+starts its own).
+
+FakeRedis is the local stand-in for the redis client (the subset used
+here), so the Redis backend can be exercised without a server.
+"""
+import json
+import os
+import threading
+import time
+
+
+class LocalBackend:
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}      # key -> (value, expires_at monotonic or None)
+        self._handlers = {}  # channel -> [fn]
+
+    def _live(self, key, now):
+        hit = self._data.get(key)
+        if hit is None:
+            return None
+        if hit[1] is not None and hit[1] <= now:
+            del self._data[key]
+            return None
+        return hit
+
+    def get(self, key: str):
+        with self._lock:
+            hit = self._live(key, time.monotonic())
+            return hit[0] if hit else None
+
+    def set(self, key: str, value: bytes, ttl: float = None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr_window(self, key: str, window_sec: int) -> int:
+        """Increments the counter of the current fixed window; returns the new count."""
+        now = time.monotonic()
+        with self._lock:
+            hit = self._live(key, now)
+            count = (int(hit[0]) if hit else 0) + 1
+            self._data[key] = (count, hit[1] if hit else now + window_sec)
+            return count
+
+    def publish(self, channel: str, message: dict):
+        with self._lock:
+            handlers = list(self._handlers.get(channel, ()))
+        for fn in handlers:
+            fn(message)
+
+    def subscribe(self, channel: str, fn):
+        with self._lock:
+            self._handlers.setdefault(channel, []).append(fn)
+
+    def ensure_listening(self):
+        pass
+
+
+class RedisBackend:
+    name = "redis"
+
+    def __init__(self, url: str = None, client=None, prefix: str = "qs:"):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._listener_pid = None
+
+    def get(self, key: str):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float = None):
+        self.client.set(self.prefix + key, value, ex=int(ttl) if ttl else None)
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def incr_window(self, key: str, window_sec: int) -> int:
+        k = self.prefix + key
+        count = self.client.incr(k)
+        if count == 1:
+            self.client.expire(k, window_sec)
+        return int(count)
+
+    def publish(self, channel: str, message: dict):
+        self.ensure_listening()
+        self.client.publish(self.prefix + channel, json.dumps(message))
+
+    def subscribe(self, channel: str, fn):
+        with self._lock:
+            self._handlers.setdefault(channel, []).append(fn)
+            if self._listener_pid == os.getpid():
+                self._pubsub.subscribe(self.prefix + channel)
+
+    def ensure_listening(self):
+        """Starts this process's listener thread (again after a fork)."""
+        if self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            for channel in self._handlers:
+                self._pubsub.subscribe(self.prefix + channel)
+            self._listener_pid = os.getpid()
+            threading.Thread(target=self._listen, args=(self._pubsub,), name="shared-state-bus", daemon=True).start()
+
+    def _listen(self, pubsub):
+        while True:
+            try:
+                msg = pubsub.get_message(timeout=1.0)
+            except Exception:
+                time.sleep(1.0)  # connection blip: redis-py reconnects and resubscribes
+                continue
+            if not msg or msg.get("type") != "message":
+                continue
+            channel = msg["channel"]
+            channel = channel.decode() if isinstance(channel, bytes) else channel
+            with self._lock:
+                handlers = list(self._handlers.get(channel[len(self.prefix):], ()))
+            try:
+                message = json.loads(msg["data"])
+            except ValueError:
+                continue
+            for fn in handlers:
+                try:
+                    fn(message)
+                except Exception as e:
+                    print(f"shared-state handler failed on {channel}: {e}")
+
+
+class FakeRedis:
+    """In-process stand-in for redis.Redis: several RedisBackends can share one."""
+
+    def __init__(self):
+        self._local = LocalBackend()
+        self._subs = []
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._local.get(key)
+
+    def set(self, key, value, ex=None):
+        self._local.set(key, value, ex)
+
+    def delete(self, key):
+        self._local.delete(key)
+
+    def incr(self, key):
+        with self._local._lock:
+            hit = self._local._live(key, time.monotonic())
+            count = (int(hit[0]) if hit else 0) + 1
+            self._local._data[key] = (count, hit[1] if hit else None)
+            return count
+
+    def expire(self, key, seconds):
+        with self._local._lock:
+            hit = self._local._data.get(key)
+            if hit:
+                self._local._data[key] = (hit[0], time.monotonic() + seconds)
+
+    def publish(self, channel, data):
+        with self._lock:
+            subs = [ps for ps in self._subs if channel in ps.channels]
+        for ps in subs:
+            ps.queue.append({"type": "message", "channel": channel, "data": data})
+            ps.ready.set()
+        return len(subs)
+
+    def pubsub(self, ignore_subscribe_messages=True):
+        ps = _FakePubSub()
+        with self._lock:
+            self._subs.append(ps)
+        return ps
+
+
+class _FakePubSub:
+    def __init__(self):
+        self.channels = set()
+        self.queue = []
+        self.ready = threading.Event()
+
+    def subscribe(self, channel):
+        self.channels.add(channel)
+
+    def get_message(self, timeout=0.0):
+        if not self.queue and not self.ready.wait(timeout):
+            return None
+        self.ready.clear()
+        return self.queue.pop(0) if self.queue else None
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_subscriptions = []  # (channel, fn), replayed when the backend is swapped
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            url = os.environ.get("SHARED_STATE_URL", "memory://")
+            _backend = RedisBackend(url) if url.startswith(("redis://", "rediss://")) else LocalBackend()
+        return _backend
+
+
+def set_backend(backend):
+    """Swap the backend (tests / local multi-node setups); subscriptions move along."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+        subs = list(_subscriptions)
+    for channel, fn in subs:
+        backend.subscribe(channel, fn)
+
+
+def subscribe(channel: str, fn=None):
+    """fn(message_dict) for every message on channel, from any worker / node. Usable as a decorator."""
+    if fn is None:
+        return lambda f: subscribe(channel, f)
+    with _backend_lock:
+        _subscriptions.append((channel, fn))
+    get_backend().subscribe(channel, fn)
+    return fn
+
+
+def publish(channel: str, message: dict):
+    get_backend().publish(channel, message)
+
+
+def ensure_listening():
+    get_backend().ensure_listening()
@@ -0,0 +1,121 @@
+"""
+In-process fan-out of availability changes, streamed to customers as
+Server-Sent Events (one stream per (slug, date)).
+
+Subscribers are plain queues and the stream generator only blocks on
+queue.get(), so under an async worker (gunicorn -k gevent, as set in
+gunicorn.conf.py) thousands of idle connections cost one greenlet each and
+no DB connection. Anywhere else each open stream holds a thread (or a
+whole sync worker), so the number of streams per process is capped:
+MAX_STREAMS (SSE_MAX_STREAMS), lower when gevent isn't patched in.
+
+publish() goes through the shared_state bus, so a booking handled by one
+worker / node reaches streams held open by any other; each process then
+fans out to its own subscribers (deliver()).
+"""
+import json
+import os
+import queue
+import threading
+
+import shared_state
+
+HEARTBEAT_SEC = 20
+
+
+def _gevent_patched() -> bool:
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
+
+
+MAX_STREAMS = int(os.environ.get("SSE_MAX_STREAMS") or (1000 if _gevent_patched() else 8))
+SUBSCRIBER_QUEUE_SIZE = 32
+BUS_CHANNEL = "slots"
+
+
+class SlotEventHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs = {}  # (slug, date_iso) -> set of queues
+
+    def subscribe(self, slug: str, date_iso: str) -> queue.Queue:
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subs.setdefault((slug, date_iso), set()).add(q)
+        return q
+
+    def unsubscribe(self, slug: str, date_iso: str, q: queue.Queue):
+        key = (slug, date_iso)
+        with self._lock:
+            subs = self._subs.get(key)
+            if not subs:
+                return
+            subs.discard(q)
+            if not subs:
+                del self._subs[key]
+
+    def full(self) -> bool:
+        """True when this process already holds MAX_STREAMS open streams."""
+        return self.subscriber_count() >= MAX_STREAMS
+
+    def subscriber_count(self, slug: str = None) -> int:
+        with self._lock:
+            return sum(len(v) for k, v in self._subs.items() if slug is None or k[0] == slug)
+
+    def publish(self, slug: str, date_iso: str, event: dict):
+        """Event for one day's streams, on every worker."""
+        shared_state.publish(BUS_CHANNEL, {"slug": slug, "date": date_iso, "event": event})
+
+    def deliver(self, slug: str, date_iso: str, event: dict):
+        """Fan-out to this process's subscribers."""
+        with self._lock:
+            subs = list(self._subs.get((slug, date_iso), ()))
+        for q in subs:
+            _offer(q, event)
+
+    def publish_business(self, slug: str, event: dict):
+        """
+        Event for every open day of a business (e.g. admin changed hours).
+        Local only: it runs from tenant_store.on_change, which fires in every worker.
+        """
+        with self._lock:
+            targets = [(k[1], list(v)) for k, v in self._subs.items() if k[0] == slug]
+        for date_iso, subs in targets:
+            for q in subs:
+                _offer(q, dict(event, date=date_iso))
+
+    def stream(self, slug: str, date_iso: str):
+        """Generator of SSE frames; unsubscribes when the client goes away."""
+        q = self.subscribe(slug, date_iso)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = q.get(timeout=HEARTBEAT_SEC)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                data = json.dumps(event, ensure_ascii=False)
+                yield f"event: {event['type']}\ndata: {data}\n\n"
+        finally:
+            self.unsubscribe(slug, date_iso, q)
+
+
+def _offer(q: queue.Queue, event: dict):
+    try:
+        q.put_nowait(event)
+    except queue.Full:
+        # slow client: drop its backlog, it will refetch the whole day instead
+        while True:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                break
+        q.put_nowait({"type": "resync", "date": event.get("date")})
+
+
+hub = SlotEventHub()
+shared_state.subscribe(BUS_CHANNEL, lambda m: hub.deliver(m["slug"], m["date"], m["event"]))
@@ -15,8 +15,11 @@ let state = {
     serviceId: null,
     serviceName: null,
     durationMinutes: 15,
+    blockMinutes: 15,
     date: null,
     time: null,
+    repeatInterval: 0,
+    repeatCount: 4,
     user: null // Global user object from session
 };
 
@@ -115,6 +118,7 @@ function goBack() {
     const target = stepHistory[stepHistory.length - 1];
 
     if (leaving === "time") {
+        closeSlotStream();
         state.time = null;
         document.querySelectorAll(".calendar-day.selected").forEach(el => el.classList.remove("selected"));
     }
@@ -133,6 +137,7 @@ function goToStep(step) {
 }
 
 function resetWizard() {
+    closeSlotStream();
     state.mode = null;
     state.date = null;
     state.time = null;
@@ -143,10 +148,20 @@ function resetWizard() {
     renderStep("mode");
 }
 
+// services + working days come from one endpoint; fetch it once per page load
+let servicesMetaPromise = null;
+function fetchServicesMeta() {
+    if (!servicesMetaPromise) {
+        servicesMetaPromise = fetch(`${API_BASE}/api/services`)
+            .then(res => res.json())
+            .catch(e => { servicesMetaPromise = null; throw e; });
+    }
+    return servicesMetaPromise;
+}
+
 async function loadServices() {
     try {
-        const res = await fetch(`${API_BASE}/api/services`);
-        const data = await res.json();
+        const data = await fetchServicesMeta();
         return data.services || [];
     } catch (e) {
         console.error("Load services failed", e);
@@ -181,6 +196,7 @@ function renderServices(services) {
             state.serviceId = s.id;
             state.serviceName = s.name;
             state.durationMinutes = s.duration_minutes;
+            state.blockMinutes = s.duration_minutes + (s.buffer_minutes || 0);
 
             const nextBtn = document.getElementById("serviceNextBtn");
             if (nextBtn) nextBtn.disabled = false;
@@ -192,8 +208,7 @@ function renderServices(services) {
 
 async function loadBusinessMeta() {
     try {
-        const res = await fetch(`${API_BASE}/api/services`);
-        const data = await res.json();
+        const data = await fetchServicesMeta();
         return data.working_days || [];
     } catch (e) {
         console.error("Load business meta failed", e);
@@ -474,24 +489,34 @@ async function loadSlots() {
         goToStep("time");
         clearSlots(true);
         try {
-            const res = await fetch(apiUrl(`/api/day-slots?date=${state.date}&duration=${state.durationMinutes}`));
-            const data = await res.json();
-            const slotsDiv = document.getElementById("slots");
-            if (!slotsDiv) return;
-            slotsDiv.innerHTML = "";
+            const res = await fetch(apiUrl(daySlotsUrl(state.date)));
+            const data = decodeSlots(await res.json());
             if (!data.slots?.length) {
-                showModal({ title: "אין שעות פנויות", text: "נסה יום אחר", onConfirm: goBack });
+                clearSlots(false);
+                const next = await loadNextAvailable(state.date);
+                if (next.length) {
+                    renderAlternatives(next);
+                    showModal({
+                        title: "היום הזה מלא",
+                        text: "הצענו את המועדים הפנויים הקרובים - או הצטרף לרשימת ההמתנה",
+                        confirmText: "רשימת המתנה",
+                        closeText: "למועדים הפנויים",
+                        onConfirm: joinWaitlist
+                    });
+                    return;
+                }
+                showModal({
+                    title: "אין שעות פנויות",
+                    text: "נסה יום אחר, או הצטרף לרשימת ההמתנה ונעדכן אותך אם יתפנה תור",
+                    confirmText: "רשימת המתנה",
+                    closeText: "יום אחר",
+                    onConfirm: joinWaitlist,
+                    onCancel: goBack
+                });
                 return;
             }
-            data.slots.forEach(t => {
-                const b = document.createElement("div");
-                b.className = "slot"; b.textContent = t;
-                b.onclick = () => {
-                    state.time = t;
-                    showModal({ title: "אישור תור", text: `לקבוע ל-${state.date} ב-${t}?`, onConfirm: submitBooking });
-                };
-                slotsDiv.appendChild(b);
-            });
+            renderSlotButtons(data.slots, data.suggested);
+            openSlotStream(state.date);
         } catch (e) {
             clearSlots(false);
             showModal({ title: "שגיאה", text: "בעיה בטעינת שעות", type: "error" });
@@ -499,22 +524,154 @@ async function loadSlots() {
     });
 }
 
+// day is full: nearest open times on the next days, one request instead of clicking day by day
+async function loadNextAvailable(date) {
+    try {
+        const res = await fetch(apiUrl(`/api/next-available?date=${date}&duration=${state.durationMinutes}&service_id=${encodeURIComponent(state.serviceId || "")}`));
+        const data = await res.json();
+        return data.slots || [];
+    } catch (e) {
+        console.error("Next available failed", e);
+        return [];
+    }
+}
+
+function renderAlternatives(alternatives) {
+    const slotsDiv = document.getElementById("slots");
+    if (!slotsDiv) return;
+    slotsDiv.innerHTML = "";
+    alternatives.forEach(({ date, time }) => {
+        const [, m, d] = date.split("-");
+        const b = document.createElement("div");
+        b.className = "slot suggested";
+        b.textContent = `${d}/${m} ${time}`;
+        b.onclick = () => {
+            state.date = date;
+            state.time = time;
+            renderCalendar();
+            showModal({ title: "אישור תור", text: `לקבוע ל-${date} ב-${time}?`, onConfirm: submitBooking });
+        };
+        slotsDiv.appendChild(b);
+    });
+}
+
+function daySlotsUrl(date) {
+    return `/api/day-slots?date=${date}&duration=${state.durationMinutes}&service_id=${encodeURIComponent(state.serviceId || "")}&enc=min`;
+}
+
+// enc=min: slots come as minute of day (540) - shown as "09:00"
+function minutesToHhmm(m) {
+    return `${String(Math.floor(m / 60)).padStart(2, "0")}:${String(m % 60).padStart(2, "0")}`;
+}
+
+function decodeSlots(data) {
+    const toHhmm = v => typeof v === "number" ? minutesToHhmm(v) : v;
+    return { ...data, slots: (data.slots || []).map(toHhmm), suggested: (data.suggested || []).map(toHhmm) };
+}
+
+function renderSlotButtons(slots, suggested = []) {
+    const slotsDiv = document.getElementById("slots");
+    if (!slotsDiv) return;
+    slotsDiv.innerHTML = "";
+    const recommended = new Set(suggested || []);
+    slots.forEach(t => {
+        const b = document.createElement("div");
+        b.className = recommended.has(t) ? "slot suggested" : "slot";
+        b.textContent = t;
+        if (recommended.has(t)) b.title = "מומלץ";
+        b.onclick = () => {
+            state.time = t;
+            showModal({ title: "אישור תור", text: `לקבוע ל-${state.date} ב-${t}?`, onConfirm: submitBooking });
+        };
+        slotsDiv.appendChild(b);
+    });
+    if (!slots.length) {
+        setBoxEmpty(slotsDiv, "<div class='empty-msg' style='text-align:center; padding:2rem; color:var(--text-muted); font-weight:600;'>אין שעות פנויות ביום זה</div>");
+    }
+}
+
+/*************************
+ * LIVE SLOT UPDATES (SSE)
+ *************************/
+let slotStream = null;
+
+function hhmmToMinutes(t) {
+    const [h, m] = t.split(":").map(Number);
+    return h * 60 + m;
+}
+
+function closeSlotStream() {
+    if (slotStream) {
+        slotStream.close();
+        slotStream = null;
+    }
+}
+
+function openSlotStream(date) {
+    closeSlotStream();
+    if (!window.EventSource) return;
+    slotStream = new EventSource(apiUrl(`/api/day-slots/stream?date=${date}`));
+
+    // someone booked: drop overlapping slots locally, no refetch
+    slotStream.addEventListener("booked", (e) => {
+        const ev = JSON.parse(e.data);
+        const bs = hhmmToMinutes(ev.start), be = hhmmToMinutes(ev.end);
+        document.querySelectorAll("#slots .slot").forEach(el => {
+            const s = hhmmToMinutes(el.textContent);
+            if (s < be && bs < s + state.blockMinutes) el.remove();
+        });
+        if (!document.querySelector("#slots .slot")) renderSlotButtons([]);
+    });
+
+    // time freed / calendar or hours changed: refetch (cheap, ETag-revalidated)
+    ["freed", "changed", "resync"].forEach(type => {
+        slotStream.addEventListener(type, () => refreshSlots(date));
+    });
+}
+
+async function refreshSlots(date) {
+    if (state.date !== date) return;
+    try {
+        const res = await fetch(apiUrl(daySlotsUrl(date)));
+        const data = decodeSlots(await res.json());
+        if (state.date === date) renderSlotButtons(data.slots || [], data.suggested);
+    } catch (e) {
+        console.error("Slot refresh failed", e);
+    }
+}
+
 function clearSlots(showLoading = false) {
     const slotsDiv = document.getElementById("slots");
     if (slotsDiv) slotsDiv.innerHTML = showLoading ? "<div class='spinner'></div>" : "";
 }
 
+function readRepeat() {
+    const interval = document.getElementById("repeatInterval");
+    const count = document.getElementById("repeatCount");
+    state.repeatInterval = interval ? Number(interval.value) : 0;
+    state.repeatCount = count ? Number(count.value) : 4;
+    if (count) count.disabled = state.repeatInterval === 0;
+}
+
 async function submitBooking() {
     if (!ensureBookPrereqs()) return;
+    readRepeat();
+    const recurring = state.repeatInterval > 0;
     return guarded(`book:${state.date}:${state.time}`, async () => {
         setButtonLoading(modalConfirm, "קובע…");
         try {
-            const res = await fetch(apiUrl("/api/book"), {
+            const payload = { date: state.date, time: state.time, duration_minutes: state.durationMinutes, service_id: state.serviceId, service_name: state.serviceName };
+            if (recurring) {
+                payload.interval_weeks = state.repeatInterval;
+                payload.occurrences = state.repeatCount;
+            }
+            const res = await fetch(apiUrl(recurring ? "/api/book/recurring" : "/api/book"), {
                 method: "POST", headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ date: state.date, time: state.time, duration_minutes: state.durationMinutes, service_name: state.serviceName })
+                body: JSON.stringify(payload)
             });
             const data = await res.json();
-            showModal({ title: data.ok ? "הצלחה" : "שגיאה", text: data.ok ? "התור נקבע" : data.message, onConfirm: data.ok ? resetWizard : null, type: data.ok ? "success" : "error" });
+            const okText = recurring ? `נקבעו ${data.dates?.length || state.repeatCount} תורים` : (data.pending ? data.message : "התור נקבע");
+            showModal({ title: data.ok ? "הצלחה" : "שגיאה", text: data.ok ? okText : data.message, onConfirm: data.ok ? resetWizard : null, type: data.ok ? "success" : "error" });
         } catch (e) {
             showModal({ title: "שגיאה", text: "שגיאה בתקשורת", type: "error" });
         } finally { clearButtonLoading(modalConfirm); }
@@ -531,10 +688,13 @@ async function loadCancelAppointments() {
         box.classList.add("cancel-list");
         setBoxLoading(box);
         try {
-            const res = await fetch(apiUrl("/api/cancel/list"));
+            const [res, wres] = await Promise.all([fetch(apiUrl("/api/cancel/list")), fetch(apiUrl("/api/waitlist"))]);
             const data = await res.json();
+            const wdata = await wres.json();
             clearBox(box);
+            (wdata.entries || []).forEach(w => box.appendChild(renderWaitlistItem(w)));
             if (!data.appointments?.length) {
+                if (wdata.entries?.length) return;
                 setBoxEmpty(box, "<div class='empty-msg' style='text-align:center; padding:2rem; color:var(--text-muted); font-weight:600;'>אין תורים לביטול</div>");
                 return;
             }
@@ -548,20 +708,23 @@ async function loadCancelAppointments() {
                 item.innerHTML = `
                     <div class="cancel-info">
                         <span class="cancel-date">${dateStr || 'תאריך לא ידוע'}</span>
-                        <span class="cancel-time">${timeStr || '--:--'} - ${a.service_name || 'שירות'}</span>
+                        <span class="cancel-time">${timeStr || '--:--'} - ${a.service_name || 'שירות'}${a.series_id ? (a.interval_weeks === 2 ? ' · כל שבועיים' : ' · כל שבוע') : ''}${a.pending ? ' · ממתין לאישור' : ''}</span>
                     </div>
-                    <button class="cancel-btn">ביטול תור</button>
+                    <button class="cancel-btn">${a.series_id ? 'ביטול סדרה' : 'ביטול תור'}</button>
                 `;
                 const btn = item.querySelector(".cancel-btn");
                 btn.onclick = () => {
                     showModal({
                         title: "ביטול תור",
-                        text: `בטוח שברצונך לבטל את התור ב-${dateStr || 'לא ידוע'} בשעה ${timeStr || '---'}?`,
+                        text: a.series_id
+                            ? `בטוח שברצונך לבטל את כל התורים הקבועים בשעה ${timeStr || '---'}?`
+                            : `בטוח שברצונך לבטל את התור ב-${dateStr || 'לא ידוע'} בשעה ${timeStr || '---'}?`,
                         onConfirm: async () => {
-                            return guarded(`cancel:${a.id}`, async () => {
+                            return guarded(`cancel:${a.series_id ? 's' + a.series_id : a.id}`, async () => {
                                 setButtonLoading(modalConfirm, "מבטל…");
                                 try {
-                                    const r = await fetch(apiUrl("/api/cancel"), { method: "POST", headers: { "Content-Type": "application/json" }, body: JSON.stringify({ id: a.id }) });
+                                    const ref = a.series_id ? { series_id: a.series_id } : { id: a.id };
+                                    const r = await fetch(apiUrl("/api/cancel"), { method: "POST", headers: { "Content-Type": "application/json" }, body: JSON.stringify(ref) });
                                     const out = await r.json();
                                     showModal({ title: out.ok ? "בוטל בהצלחה" : "שגיאה", text: out.ok ? "התור הוסר מהמערכת" : out.message, onConfirm: out.ok ? resetWizard : null, type: out.ok ? "success" : "error" });
                                 } finally { clearButtonLoading(modalConfirm); }
@@ -575,6 +738,64 @@ async function loadCancelAppointments() {
     });
 }
 
+/*************************
+ * WAITLIST
+ *************************/
+async function joinWaitlist() {
+    return guarded(`waitlist:${state.date}`, async () => {
+        try {
+            const res = await fetch(apiUrl("/api/waitlist"), {
+                method: "POST", headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ date: state.date, duration_minutes: state.durationMinutes, service_id: state.serviceId, service_name: state.serviceName })
+            });
+            const data = await res.json();
+            showModal({
+                title: data.ok ? "נרשמת לרשימת ההמתנה" : "שגיאה",
+                text: data.ok ? "אם יתפנה תור ביום הזה נשלח לך הודעה, והוא יישמר עבורך לזמן קצר" : data.message,
+                onConfirm: goBack,
+                hideClose: true,
+                type: data.ok ? "success" : "error"
+            });
+        } catch (e) {
+            showModal({ title: "שגיאה", text: "שגיאה בתקשורת", type: "error" });
+        }
+    });
+}
+
+function renderWaitlistItem(w) {
+    const offered = w.status === "offered";
+    const item = document.createElement("div");
+    item.className = "cancel-item";
+    item.innerHTML = `
+        <div class="cancel-info">
+            <span class="cancel-date">${offered ? 'התפנה עבורך תור' : 'רשימת המתנה'} · ${w.date}</span>
+            <span class="cancel-time">${offered ? w.offered_time : `${w.from}–${w.to}`} - ${w.service_name || 'שירות'}</span>
+        </div>
+        <button class="cancel-btn">${offered ? 'אישור התור' : 'יציאה מהרשימה'}</button>
+    `;
+    item.querySelector(".cancel-btn").onclick = () => {
+        const url = offered ? "/api/waitlist/claim" : "/api/waitlist/leave";
+        return guarded(`waitlist:${w.id}`, async () => {
+            try {
+                const r = await fetch(apiUrl(url), { method: "POST", headers: { "Content-Type": "application/json" }, body: JSON.stringify({ id: w.id }) });
+                const out = await r.json();
+                if (!out.ok) {
+                    showModal({ title: "שגיאה", text: out.message, type: "error" });
+                    return;
+                }
+                if (offered) {
+                    showModal({ title: "הצלחה", text: `התור נקבע ל-${out.date} ב-${out.time}`, onConfirm: resetWizard, type: "success" });
+                } else {
+                    item.remove();
+                }
+            } catch (e) {
+                showModal({ title: "שגיאה", text: "שגיאה בתקשורת", type: "error" });
+            }
+        });
+    };
+    return item;
+}
+
 /*************************
  * CALENDAR
  *************************/
@@ -624,6 +845,10 @@ document.addEventListener("DOMContentLoaded", () => {
     const backBtn = document.getElementById("backBtn");
     if (backBtn) backBtn.onclick = goBack;
 
+    // Recurring booking picker
+    const repeatInterval = document.getElementById("repeatInterval");
+    if (repeatInterval) repeatInterval.onchange = readRepeat;
+
     // Profile & Logout
     const profile = document.getElementById("userProfile");
     if (profile) profile.onclick = () => { if (!state.user) startLoginFlow(); };
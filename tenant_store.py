@@ -0,0 +1,233 @@
+"""
+Per-tenant config: the tenant registry (base business config) and the
+admin override store.
+
+Registry: one Tenant row per slug, looked up by primary key and kept in a
+bounded per-worker LRU, so serving a slug costs the same with 5 or 5000
+businesses. business_config.json stays importable/exportable in bulk.
+
+Overrides: one TenantOverride row per slug, so reads and saves touch only
+that tenant. Saves are optimistic: the caller passes the version it edited
+and the UPDATE only matches if nobody saved in between (VersionConflict otherwise).
+
+Each worker keeps a small in-memory cache and re-checks the row version at
+most every OVERRIDE_RECHECK_SEC; when a save (local or from another worker)
+is noticed, the on_change listeners run so dependent caches get dropped.
+Saves and registry imports are also announced on the shared_state bus, so
+other workers and nodes drop their copies at once instead of at the next
+re-check.
+"""
+import copy
+import datetime as dt
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from db import db
+from models import Tenant, TenantOverride
+import shared_state
+
+OVERRIDE_RECHECK_SEC = 2.0
+TENANT_CACHE_TTL_SEC = 30.0
+TENANT_CACHE_MAX = 2048
+
+_tenant_cache = OrderedDict()  # slug -> (config or None, loaded_at monotonic)
+_tenant_lock = threading.Lock()
+
+_cache = {}  # slug -> (version, data, checked_at monotonic)
+_cache_lock = threading.Lock()
+_listeners = []
+
+BUS_CHANNEL = "tenants"
+
+
+class VersionConflict(Exception):
+    def __init__(self, slug: str, expected: int, current: int):
+        super().__init__(f"override for {slug} is at version {current}, expected {expected}")
+        self.slug = slug
+        self.expected = expected
+        self.current = current
+
+
+def on_change(fn):
+    """Register fn(slug, version); called once per worker for every new version seen."""
+    _listeners.append(fn)
+    return fn
+
+
+def _notify(slug: str, version: int):
+    for fn in _listeners:
+        fn(slug, version)
+
+
+def _remember(slug: str, version: int, data: dict):
+    with _cache_lock:
+        prev = _cache.get(slug)
+        _cache[slug] = (version, data, time.monotonic())
+    if prev is not None and prev[0] != version:
+        _notify(slug, version)
+
+
+def get_override(slug: str):
+    """Returns (override_dict, version); version 0 means no row yet."""
+    with _cache_lock:
+        cached = _cache.get(slug)
+    if cached and time.monotonic() - cached[2] < OVERRIDE_RECHECK_SEC:
+        return copy.deepcopy(cached[1]), cached[0]
+
+    row = db.session.get(TenantOverride, slug)
+    if row is None:
+        _remember(slug, 0, {})
+        return {}, 0
+
+    data = row.data or {}
+    _remember(slug, row.version, data)
+    return copy.deepcopy(data), row.version
+
+
+def save_override(slug: str, data: dict, expected_version: int, updated_by: str = None) -> int:
+    """Writes data if the stored version still equals expected_version. Returns the new version."""
+    now = dt.datetime.utcnow()
+
+    if expected_version == 0:
+        db.session.add(TenantOverride(slug=slug, data=data, version=1, updated_by=updated_by, updated_at=now))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            raise VersionConflict(slug, expected_version, _current_version(slug))
+        new_version = 1
+    else:
+        res = db.session.execute(
+            update(TenantOverride)
+            .where(TenantOverride.slug == slug, TenantOverride.version == expected_version)
+            .values(data=data, version=TenantOverride.version + 1, updated_by=updated_by, updated_at=now)
+        )
+        if res.rowcount != 1:
+            db.session.rollback()
+            raise VersionConflict(slug, expected_version, _current_version(slug))
+        db.session.commit()
+        new_version = expected_version + 1
+
+    _remember(slug, new_version, data)
+    shared_state.publish(BUS_CHANNEL, {"slug": slug, "version": new_version})
+    return new_version
+
+
+@shared_state.subscribe(BUS_CHANNEL)
+def _on_bus_message(msg: dict):
+    """Another worker (or this one) changed a tenant: drop what this worker has cached."""
+    slug = msg.get("slug")
+    with _tenant_lock:
+        if slug is None:
+            _tenant_cache.clear()
+        else:
+            _tenant_cache.pop(slug, None)
+
+    version = msg.get("version")
+    if slug is None or version is None:
+        return
+    with _cache_lock:
+        cached = _cache.get(slug)
+        stale = cached is not None and cached[0] < version
+        if stale:
+            del _cache[slug]
+    if stale:
+        _notify(slug, version)
+
+
+def _current_version(slug: str) -> int:
+    row = db.session.get(TenantOverride, slug)
+    return row.version if row else 0
+
+
+def import_legacy_overrides(all_overrides: dict) -> int:
+    """One-time move of the old admin_overrides.json blob; existing rows are kept."""
+    existing = {s for (s,) in db.session.query(TenantOverride.slug).all()}
+    added = 0
+    for slug, data in (all_overrides or {}).items():
+        if slug in existing or not isinstance(data, dict):
+            continue
+        db.session.add(TenantOverride(slug=slug, data=data, version=1))
+        added += 1
+    if added:
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # another worker imported at the same time
+            db.session.rollback()
+            return 0
+    return added
+
+
+# ================= Tenant registry =================
+
+def get_tenant_config(slug: str):
+    """Base config for slug from the registry, or None if the slug isn't registered."""
+    now = time.monotonic()
+    with _tenant_lock:
+        hit = _tenant_cache.get(slug)
+        if hit and now - hit[1] < TENANT_CACHE_TTL_SEC:
+            _tenant_cache.move_to_end(slug)
+            return copy.deepcopy(hit[0])
+
+    row = db.session.get(Tenant, slug)
+    cfg = row.config if row else None
+
+    with _tenant_lock:
+        _tenant_cache[slug] = (cfg, now)
+        _tenant_cache.move_to_end(slug)
+        while len(_tenant_cache) > TENANT_CACHE_MAX:
+            _tenant_cache.popitem(last=False)
+    return copy.deepcopy(cfg)
+
+
+def list_tenant_slugs(after: str = "", limit: int = 500) -> list:
+    """Slug index, paged by key (PK order) so it never loads configs."""
+    q = db.session.query(Tenant.slug).filter(Tenant.slug > after).order_by(Tenant.slug).limit(limit)
+    return [s for (s,) in q.all()]
+
+
+def import_tenants(businesses: dict, replace: bool = False, batch_size: int = 500) -> dict:
+    """
+    Bulk load {"<slug>": cfg, ...} (the "businesses" map of business_config.json).
+    Existing slugs are skipped unless replace=True.
+    """
+    stats = {"added": 0, "updated": 0, "skipped": 0}
+    items = [(slug, cfg) for slug, cfg in (businesses or {}).items() if isinstance(cfg, dict)]
+    now = dt.datetime.utcnow()
+
+    for i in range(0, len(items), batch_size):
+        chunk = items[i:i + batch_size]
+        existing = {
+            r.slug: r for r in Tenant.query.filter(Tenant.slug.in_([s for s, _ in chunk])).all()
+        }
+        for slug, cfg in chunk:
+            row = existing.get(slug)
+            if row is None:
+                db.session.add(Tenant(slug=slug, config=cfg, created_at=now, updated_at=now))
+                stats["added"] += 1
+            elif replace:
+                row.config = cfg
+                row.updated_at = now
+                stats["updated"] += 1
+            else:
+                stats["skipped"] += 1
+        db.session.commit()
+
+    with _tenant_lock:
+        _tenant_cache.clear()
+    if stats["added"] or stats["updated"]:
+        shared_state.publish(BUS_CHANNEL, {"slug": None})
+    return stats
+
+
+def export_tenants(batch_size: int = 500) -> dict:
+    """Registry back to the business_config.json shape."""
+    out = {}
+    for row in Tenant.query.order_by(Tenant.slug).yield_per(batch_size):
+        out[row.slug] = row.config
+    return {"businesses": out}
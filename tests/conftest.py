@@ -0,0 +1,121 @@
+import datetime as dt
+import itertools
+import os
+import sys
+import tempfile
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # business_config.json / data/ are read relative to the app
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="quiteslot-tests-"), "app.db")
+os.environ.setdefault("SMS_PROVIDER", "console")
+
+import app as appmod  # noqa: E402
+import shared_state  # noqa: E402
+from db import db  # noqa: E402
+from models import User  # noqa: E402
+
+
+class _Call:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def execute(self, **kwargs):
+        return self.fn()
+
+
+class FakeCalendar:
+    """The subset of the Google Calendar client the app uses, in memory."""
+
+    def __init__(self):
+        self.events_by_id = {}  # id -> (calendar_id, start, end)
+        self._ids = itertools.count(1)
+
+    def freebusy(self):
+        return self
+
+    def query(self, body):
+        def run():
+            lo = dt.datetime.fromisoformat(body["timeMin"].replace("Z", "+00:00"))
+            hi = dt.datetime.fromisoformat(body["timeMax"].replace("Z", "+00:00"))
+            out = {}
+            for item in body["items"]:
+                out[item["id"]] = {"busy": [
+                    {"start": s.astimezone(dt.timezone.utc).isoformat(), "end": e.astimezone(dt.timezone.utc).isoformat()}
+                    for cid, s, e in self.events_by_id.values()
+                    if cid == item["id"] and s < hi and e > lo
+                ]}
+            return {"calendars": out}
+        return _Call(run)
+
+    def events(self):
+        return self
+
+    def insert(self, calendarId, body):
+        def run():
+            event_id = body.get("id") or f"ev{next(self._ids)}"
+            start = dt.datetime.fromisoformat(body["start"]["dateTime"])
+            end = dt.datetime.fromisoformat(body["end"]["dateTime"])
+            self.events_by_id[event_id] = (calendarId, start, end)
+            return {"id": event_id}
+        return _Call(run)
+
+    def get(self, calendarId, eventId):
+        def run():
+            if eventId not in self.events_by_id:
+                raise HttpError(httplib2.Response({"status": 404}), b"not found")
+            return {"id": eventId, "status": "confirmed"}
+        return _Call(run)
+
+    def delete(self, calendarId, eventId):
+        return _Call(lambda: self.events_by_id.pop(eventId, None) and {})
+
+
+@pytest.fixture
+def calendar(monkeypatch):
+    cal = FakeCalendar()
+    monkeypatch.setattr(appmod, "get_calendar_service", lambda: cal)
+    return cal
+
+
+@pytest.fixture
+def app(calendar, monkeypatch):
+    flask_app = appmod.app
+    # no background deleter: tests run the outbox with flush_calendar_deletions()
+    monkeypatch.setattr(appmod.calendar_deleter, "start", lambda: None)
+    monkeypatch.setattr(appmod.calendar_deleter, "wake", lambda: None)
+    # fresh counters (rate limits) per test
+    shared_state.set_backend(shared_state.LocalBackend())
+    flask_app.config["TESTING"] = True
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+    appmod._landing_cache.clear()
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    """Logged-in customer."""
+    c = app.test_client()
+    with app.app_context():
+        user = User(phone="0501234567", name="Dan")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    with c.session_transaction() as s:
+        s["user_id"] = user_id
+    return c
+
+
+def next_weekday(key: str) -> dt.date:
+    from booking_core import day_key
+
+    d = dt.date.today() + dt.timedelta(days=1)
+    while day_key(d) != key:
+        d += dt.timedelta(days=1)
+    return d
@@ -0,0 +1,24 @@
+from conftest import next_weekday
+
+
+def test_preview_changes_nothing(app, client):
+    slug = "barber-demo"
+    day_slots = f"/b/{slug}/api/day-slots?date={next_weekday('mon').isoformat()}&duration=20"
+    before = client.get(day_slots).get_json()
+
+    admin = app.test_client()
+    with admin.session_transaction() as s:
+        s["admin_phone"] = "0500000000"
+        s["admin_slugs"] = [slug]
+    resp = admin.post(f"/admin/{slug}/preview", data={
+        "working_days": ["sun", "mon", "tue", "wed", "thu"],
+        "wh_default_start": "06:00",
+        "wh_default_end": "07:00",
+    })
+    assert resp.get_json()["ok"]
+
+    with app.app_context():
+        import app as appmod
+
+        assert "default" not in appmod.resolve_business_cfg(slug)["working_hours"]
+    assert client.get(day_slots).get_json() == before
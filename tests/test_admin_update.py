@@ -0,0 +1,36 @@
+import pytest
+
+SLUG = "barber-demo"
+JSON = {"Accept": "application/json"}
+
+
+@pytest.fixture
+def admin(app):
+    c = app.test_client()
+    with c.session_transaction() as s:
+        s["admin_phone"] = "0500000000"
+        s["admin_slugs"] = [SLUG]
+    return c
+
+
+def test_json_client_gets_400_for_a_bad_field(admin):
+    resp = admin.post(f"/admin/{SLUG}/update", headers=JSON, data={
+        "working_days": ["sun", "mon"],
+        "wh_default_start": "25:99",
+        "wh_default_end": "18:00",
+    })
+    assert resp.status_code == 400
+    assert resp.get_json()["ok"] is False
+
+    resp = admin.post(f"/admin/{SLUG}/update", headers=JSON, data={"config_version": "x"})
+    assert resp.status_code == 400
+
+
+def test_json_client_gets_401_without_a_session(app):
+    resp = app.test_client().post(f"/admin/{SLUG}/update", headers=JSON, data={})
+    assert resp.status_code == 401
+
+
+def test_form_client_is_still_redirected(admin):
+    resp = admin.post(f"/admin/{SLUG}/update", data={"wh_default_start": "25:99", "wh_default_end": "18:00"})
+    assert resp.status_code == 302
@@ -0,0 +1,88 @@
+import gzip
+import json
+import os
+
+import pytest
+
+import assets
+
+JS = """// header comment
+const url = "http://example.com/x"; /* inline */
+const re = /a\\/b/g;
+const t = `// not a comment ${1 + 2}`;
+"""
+CSS = """/* theme */
+body {
+    color : red ;
+}
+"""
+
+
+@pytest.fixture
+def built(tmp_path):
+    static = tmp_path / "static"
+    static.mkdir()
+    (static / "app.js").write_text(JS, encoding="utf-8")
+    (static / "style.css").write_text(CSS, encoding="utf-8")
+    out = static / "dist"
+    manifest = assets.build(str(static), str(out))
+    return static, out, manifest
+
+
+def test_minify_keeps_strings_regex_and_templates():
+    out = assets.minify_js(JS)
+    assert "header comment" not in out and "inline" not in out
+    assert '"http://example.com/x"' in out
+    assert "/a\\/b/g" in out
+    assert "`// not a comment ${1 + 2}`" in out
+    assert assets.minify_css(CSS) == "body{color : red}\n"
+
+
+def test_build_writes_fingerprinted_files_and_manifest(built):
+    static, out, manifest = built
+    assert set(manifest) == {"app.js", "style.css"}
+    assert json.loads((out / assets.MANIFEST).read_text()) == manifest
+    hashed = out / manifest["app.js"]
+    data = hashed.read_bytes()
+    assert manifest["app.js"] == assets._fingerprint("app.js", data)
+    assert gzip.decompress((out / (manifest["app.js"] + ".gz")).read_bytes()) == data
+
+    # a change gets a new name; the old build output is removed
+    (static / "app.js").write_text(JS + "const y = 1;\n", encoding="utf-8")
+    again = assets.build(str(static), str(out))
+    assert again["app.js"] != manifest["app.js"]
+    assert not hashed.exists() and not os.path.exists(str(hashed) + ".gz")
+    assert assets.load_manifest(str(out)) == again
+
+
+def test_pick_encoding_prefers_accepted_variant(tmp_path):
+    path = str(tmp_path / "app.js")
+    for suffix in ("", ".gz", ".br"):
+        open(path + suffix, "wb").close()
+
+    assert assets.pick_encoding("gzip, br", path) == ("br", path + ".br")
+    assert assets.pick_encoding("br;q=0, gzip", path) == ("gzip", path + ".gz")
+    assert assets.pick_encoding("identity", path) == (None, path)
+    assert assets.pick_encoding(None, path) == (None, path)
+
+    os.remove(path + ".br")
+    assert assets.pick_encoding("br, gzip", path) == ("gzip", path + ".gz")
+
+
+def test_hashed_asset_route(app, built, monkeypatch):
+    import app as appmod
+
+    _, out, manifest = built
+    monkeypatch.setattr(appmod, "ASSETS_DIR", str(out))
+    client = app.test_client()
+
+    r = client.get(f"/assets/{manifest['app.js']}", headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert r.headers["Cache-Control"] == assets.IMMUTABLE_CACHE
+    assert r.headers["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(r.data) == (out / manifest["app.js"]).read_bytes()
+    r.close()
+
+    assert client.get("/assets/manifest.json").status_code == 404
+    assert client.get("/assets/../app.py").status_code == 404
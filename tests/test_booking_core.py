@@ -0,0 +1,74 @@
+import datetime as dt
+
+import pytest
+
+from booking_core import (
+    block_minutes,
+    build_slot_bitmap,
+    grid_ceil,
+    rank_best_fit,
+    service_block,
+    slot_step,
+    slots_from_bitmap,
+)
+
+MONDAY = dt.date(2026, 1, 5)
+
+CFG = {
+    "working_days": ["mon"],
+    "working_hours": {"start": "09:00", "end": "12:00"},
+    "services": [
+        {"id": "cut", "duration_minutes": 20, "buffer_minutes": 10},
+        {"id": "beard", "duration_minutes": 15},
+        {"id": "color", "duration_minutes": 20},
+    ],
+}
+
+
+@pytest.mark.parametrize("minute, expected", [
+    (500, 540),  # before opening: the anchor
+    (540, 540),
+    (541, 555),
+    (555, 555),
+    (556, 570),
+])
+def test_grid_ceil(minute, expected):
+    assert grid_ceil(minute, 540, 15) == expected
+
+
+def test_buffer_blocks():
+    assert service_block(CFG["services"][0]) == 30
+    assert service_block(CFG["services"][1]) == 15
+    # by id first; the duration alone picks the first service that has it
+    assert block_minutes(CFG, 20, "cut") == 30
+    assert block_minutes(CFG, 20, "color") == 20
+    assert block_minutes(CFG, 20) == 30
+    assert block_minutes(CFG, 45) == 45
+
+
+def test_slot_step():
+    assert slot_step(CFG, 30) == 30
+    assert slot_step(dict(CFG, slot_granularity_minutes=10), 30) == 10
+
+
+def test_buffer_keeps_the_next_start_off_the_cleanup():
+    # busy 10:00-10:30 (a cut plus its buffer): nothing may start inside it
+    bitmap = build_slot_bitmap(CFG, MONDAY, 30, [(600, 630)])
+    assert slots_from_bitmap(bitmap, 540, 30) == [540, 570, 630, 660, 690]
+    assert slots_from_bitmap(bitmap, 540, 15)[:4] == [540, 555, 570, 630]
+
+
+def test_best_fit_packs_against_bookings():
+    bitmap = build_slot_bitmap(CFG, MONDAY, 30, [(600, 630)])
+    starts = slots_from_bitmap(bitmap, 540, 30)
+    # touching a neighbour / the day's edge first, tightest stretch first,
+    # the start that splits a stretch in the middle last
+    assert rank_best_fit(bitmap, starts, 30) == [540, 570, 630, 690, 660]
+
+
+def test_best_fit_avoids_unbookable_leftovers():
+    bitmap = build_slot_bitmap(CFG, MONDAY, 30, [(600, 630)])
+    starts = slots_from_bitmap(bitmap, 540, 30)
+    # with 45 minute services a 30 minute leftover is wasted: the 09:00-10:00
+    # stretch can't avoid one, 10:30-12:00 can
+    assert rank_best_fit(bitmap, starts, 45) == [630, 690, 540, 570, 660]
@@ -0,0 +1,62 @@
+import datetime as dt
+
+SLUG = "barber-demo"
+
+
+def _export(tmp_path, slug=SLUG):
+    import exports
+
+    path = tmp_path / "appointments.jsonl"
+    path.write_text("".join(exports.encode(exports.iter_rows(slug), "jsonl")), encoding="utf-8")
+    return str(path)
+
+
+def _comparable(rows):
+    # what an import can restore: everything but our ids / timestamps
+    return sorted((r[2], r[3], r[4], r[5], r[6], r[7], r[8]) for r in rows)
+
+
+def test_export_import_round_trip(app, tmp_path):
+    import app as appmod
+    import bulk_import
+    import exports
+    from db import db
+    from models import Appointment
+
+    start = dt.datetime(2030, 1, 7, 9, 0)
+    with app.app_context():
+        db.session.add_all([
+            Appointment(name=f"לקוח {i}", phone=f"05000000{i:02d}", start_time=start + dt.timedelta(hours=i),
+                        calendar_event_id=f"e{i}", business_slug=SLUG, duration_minutes=20 + i,
+                        service_name="cut", resource_id="chair-1")
+            for i in range(7)
+        ])
+        db.session.commit()
+        before = _comparable(exports.iter_rows(SLUG))
+        path = _export(tmp_path)
+
+        Appointment.query.delete()
+        db.session.commit()
+        stats = bulk_import.run("appointments", bulk_import.read_records(path), appmod.normalize_phone, batch_size=3)
+        assert stats["inserted"] == 7 and stats["invalid"] == 0
+        assert _comparable(exports.iter_rows(SLUG)) == before
+
+        # an interrupted import is simply run again: nothing new
+        again = bulk_import.run("appointments", bulk_import.read_records(path), appmod.normalize_phone)
+        assert again["inserted"] == 0 and again["duplicates"] == 7
+
+
+def test_invalid_and_duplicate_records(app, tmp_path):
+    import app as appmod
+    import bulk_import
+    from models import User
+
+    path = tmp_path / "customers.csv"
+    path.write_text(
+        "phone,name,email\n050-1234567,Dan,dan@example.com\n0501234567,Dan again,\nnot-a-phone,X,\n",
+        encoding="utf-8",
+    )
+    with app.app_context():
+        stats = bulk_import.run("customers", bulk_import.read_records(str(path)), appmod.normalize_phone)
+        assert (stats["inserted"], stats["duplicates"], stats["invalid"]) == (1, 1, 1)
+        assert User.query.filter_by(phone="0501234567").one().email == "dan@example.com"
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+import calendar_gate
+from calendar_gate import CalendarBusy, FairGate, TenantThrottled
+
+
+def wait_for(cond, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def queued_call(gate, slug, order, plan=None):
+    def run():
+        gate.acquire(slug, plan)
+        order.append(slug)
+        gate.release(slug, 0.0)
+    t = threading.Thread(target=run)
+    t.start()
+    return t
+
+
+def test_quiet_tenant_is_served_before_a_busy_tenants_backlog():
+    gate = FairGate(capacity=1, queue_timeout=2)
+    gate.acquire("viral")
+    order = []
+    threads = [queued_call(gate, "viral", order) for _ in range(3)]
+    wait_for(lambda: gate.stats("viral")["queued"] == 3)
+    threads.append(queued_call(gate, "quiet", order))
+    wait_for(lambda: gate.stats("quiet")["queued"] == 1)
+
+    gate.release("viral", 0.0)
+    for t in threads:
+        t.join()
+    assert order == ["quiet", "viral", "viral", "viral"]
+
+
+def test_plan_caps_a_tenants_share_of_the_slots():
+    gate = FairGate(capacity=16, queue_timeout=2)
+    limit = calendar_gate.PLANS["free"]["concurrency"]
+    for _ in range(limit):
+        gate.acquire("a")
+    order = []
+    blocked = queued_call(gate, "a", order)
+    wait_for(lambda: gate.stats("a")["queued"] == 1)
+
+    gate.acquire("b")  # other tenants still get free slots
+    assert gate.stats("a")["in_flight"] == limit
+    assert gate.in_flight == limit + 1
+
+    gate.acquire("a", "pro")  # a bigger plan raises the cap at once
+    blocked.join()
+    assert order == ["a"]
+
+
+def test_over_queued_tenant_is_throttled():
+    gate = FairGate(capacity=1, queue_timeout=2, max_queued=1)
+    gate.acquire("a")
+    order = []
+    waiting = queued_call(gate, "a", order)
+    wait_for(lambda: gate.stats("a")["queued"] == 1)
+
+    with pytest.raises(TenantThrottled) as exc:
+        gate.acquire("a")
+    assert exc.value.status == 429
+    assert gate.stats("a")["throttled"] == 1
+
+    gate.release("a", 0.0)
+    waiting.join()
+    assert order == ["a"]
+
+
+def test_no_slot_in_time_is_shed_as_busy():
+    gate = FairGate(capacity=1, queue_timeout=0.05)
+    gate.acquire("a")
+    with pytest.raises(CalendarBusy) as exc:
+        gate.acquire("b")
+    assert exc.value.status == 503
+    assert gate.stats("b")["shed"] == 1
+    assert gate.stats("b")["queued"] == 0
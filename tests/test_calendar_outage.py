@@ -0,0 +1,142 @@
+import datetime as dt
+import json
+import time
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import calendar_gate
+from calendar_gate import CalendarUnavailable, CircuitBreaker
+from conftest import next_weekday
+
+
+def test_breaker_opens_probes_once_and_closes():
+    breaker = CircuitBreaker(failures=2, cooldown=0.05)
+    breaker.record(False)
+    assert breaker.state == "closed" and breaker.allow()
+
+    breaker.record(False)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()          # the one probe
+    assert breaker.state == "half_open"
+    assert not breaker.allow()      # nobody else while it runs
+
+    breaker.record(False)           # probe failed: open again, new cooldown
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed" and not breaker.is_open
+    assert breaker.stats["opened"] == 2
+
+
+class _Upstream(Exception):
+    def __init__(self, status):
+        super().__init__(status)
+        self.resp = type("Resp", (), {"status": status})()
+
+
+def test_call_counts_only_upstream_failures(monkeypatch):
+    breaker = CircuitBreaker(failures=1, cooldown=60)
+    monkeypatch.setattr(calendar_gate, "breaker", breaker)
+    monkeypatch.setattr(calendar_gate, "gate", calendar_gate.FairGate())
+
+    def fails(status):
+        def fn():
+            raise _Upstream(status)
+        return fn
+
+    with pytest.raises(_Upstream):
+        calendar_gate.call("a", None, fails(404))
+    assert breaker.state == "closed"
+
+    with pytest.raises(CalendarUnavailable) as exc:
+        calendar_gate.call("a", None, fails(503))
+    assert isinstance(exc.value.__cause__, _Upstream)
+    assert breaker.state == "open"
+
+    # open: fails at once, without calling out
+    with pytest.raises(CalendarUnavailable) as exc:
+        calendar_gate.call("a", None, lambda: pytest.fail("called while open"))
+    assert exc.value.__cause__ is None
+
+
+@pytest.fixture
+def shop(app):
+    import tenant_store
+
+    with open("business_config.json", encoding="utf-8") as f:
+        cfg = json.load(f)["businesses"]["default"]
+    with app.app_context():
+        tenant_store.import_tenants({"w": dict(cfg, working_hours={"default": {"start": "09:00", "end": "12:00"}})})
+    return dict(cfg, slug="w")
+
+
+@pytest.fixture
+def pending(app, client, shop, monkeypatch):
+    """A 10:00 booking taken while the calendar was down."""
+    import app as appmod
+
+    real = appmod.fetch_busy_range
+
+    def down(*args, **kwargs):
+        raise CalendarUnavailable("w")
+
+    monkeypatch.setattr(appmod, "fetch_busy_range", down)
+    monday = next_weekday("mon")
+    resp = client.post("/b/w/api/book", json={"date": str(monday), "time": "10:00", "duration_minutes": 30}).json
+    monkeypatch.setattr(appmod, "fetch_busy_range", real)
+    assert resp["ok"] is True and resp["pending"] is True
+    return monday
+
+
+def _appointments(app):
+    from models import Appointment
+
+    with app.app_context():
+        return [(a.calendar_event_id, a.status) for a in Appointment.query.all()]
+
+
+def test_outage_books_as_pending_then_confirms(app, calendar, pending):
+    import app as appmod
+
+    ((event_id, status),) = _appointments(app)
+    assert status == "pending" and event_id.startswith("pending:")
+    assert calendar.events_by_id == {}
+
+    with app.app_context():
+        assert appmod.confirm_pending_bookings() == {"confirmed": 1, "rejected": 0, "waiting": 0}
+    qs_id = "qs" + event_id.split(":", 1)[1]
+    assert _appointments(app) == [(qs_id, None)]
+    assert qs_id in calendar.events_by_id
+
+    with app.app_context():  # nothing left to do
+        assert appmod.confirm_pending_bookings() == {"confirmed": 0, "rejected": 0, "waiting": 0}
+
+
+def test_pending_booking_is_dropped_when_the_time_got_taken(app, calendar, shop, pending):
+    import app as appmod
+
+    start = dt.datetime.combine(pending, dt.time(10, 0), tzinfo=ZoneInfo(shop["timezone"]))
+    calendar.events_by_id["walk-in"] = (shop["calendar_id"], start, start + dt.timedelta(minutes=30))
+
+    with app.app_context():
+        assert appmod.confirm_pending_bookings() == {"confirmed": 0, "rejected": 1, "waiting": 0}
+    assert _appointments(app) == []
+    assert list(calendar.events_by_id) == ["walk-in"]
+
+
+def test_confirm_waits_while_the_calendar_is_still_down(app, calendar, pending, monkeypatch):
+    import app as appmod
+
+    def down(*args, **kwargs):
+        raise CalendarUnavailable("w")
+
+    monkeypatch.setattr(appmod, "fetch_busy_range", down)
+    with app.app_context():
+        assert appmod.confirm_pending_bookings() == {"confirmed": 0, "rejected": 0, "waiting": 1}
+    assert _appointments(app)[0][1] == "pending"
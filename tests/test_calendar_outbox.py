@@ -0,0 +1,59 @@
+import datetime as dt
+
+import calendar_gate
+import calendar_outbox
+from db import db
+from models import CalendarDeletion
+
+
+def _enqueue(*rows):
+    for slug, event_id in rows:
+        calendar_outbox.enqueue(slug, "cal", event_id, dt.datetime(2030, 1, 7, 10, 0))
+    db.session.commit()
+
+
+def test_a_claimed_row_is_processed_once(app):
+    with app.app_context():
+        _enqueue(("a", "e1"))
+        deleted, freed = [], []
+
+        def delete_event(row):
+            deleted.append(row.calendar_event_id)
+            # another worker's pass runs meanwhile: the row is claimed
+            inner = calendar_outbox.process(lambda r: deleted.append(r.calendar_event_id), freed.append)
+            assert inner["deleted"] == 0
+
+        stats = calendar_outbox.process(delete_event, freed.append)
+        assert stats["deleted"] == 1
+        assert deleted == ["e1"]
+        assert [r.calendar_event_id for r in freed] == ["e1"]
+        assert calendar_outbox.pending() == 0
+
+
+def test_expired_claim_is_retried(app):
+    with app.app_context():
+        _enqueue(("a", "e1"))
+        db.session.query(CalendarDeletion).update({
+            "claimed_by": "dead",
+            "claimed_at": dt.datetime.utcnow() - dt.timedelta(seconds=calendar_outbox.CLAIM_TTL_SEC + 1),
+        })
+        db.session.commit()
+        assert calendar_outbox.process(lambda r: None)["deleted"] == 1
+
+
+def test_overloaded_business_does_not_stop_the_others(app):
+    with app.app_context():
+        _enqueue(("busy", "e1"), ("ok", "e2"), ("busy", "e3"), ("ok", "e4"))
+        tried = []
+
+        def delete_event(row):
+            tried.append(row.calendar_event_id)
+            if row.business_slug == "busy":
+                raise calendar_gate.TenantThrottled("busy")
+
+        stats = calendar_outbox.process(delete_event)
+        assert tried == ["e1", "e2", "e4"]
+        assert stats["deleted"] == 2
+        assert stats["waiting"] == 2
+        left = CalendarDeletion.query.order_by(CalendarDeletion.id).all()
+        assert [(r.calendar_event_id, r.claimed_by) for r in left] == [("e1", None), ("e3", None)]
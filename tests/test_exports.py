@@ -0,0 +1,66 @@
+import csv
+import datetime as dt
+import io
+import json
+
+import pytest
+
+SLUG = "barber-demo"
+JAN = dt.datetime(2030, 1, 7, 10, 0)
+
+
+@pytest.fixture
+def booked(app):
+    from db import db
+    from models import Appointment, AppointmentSeries
+
+    with app.app_context():
+        db.session.add_all([
+            Appointment(name=f"לקוח {i}", phone=f"05000000{i:02d}", start_time=JAN + dt.timedelta(days=i),
+                        calendar_event_id=f"e{i}", business_slug=SLUG, duration_minutes=30, service_name="cut")
+            for i in range(5)
+        ] + [
+            Appointment(name="other", phone="0509999999", start_time=JAN, calendar_event_id="x",
+                        business_slug="default", duration_minutes=30),
+            AppointmentSeries(business_slug=SLUG, name="series", phone="0508888888", service_name="cut",
+                              first_start=JAN, last_start=JAN + dt.timedelta(weeks=5), duration_minutes=20,
+                              interval_weeks=1, occurrences=6, calendar_event_id="s1"),
+        ])
+        db.session.commit()
+
+
+def test_rows_cover_the_range_and_series_occurrences(app, booked):
+    import exports
+
+    with app.app_context():
+        rows = list(exports.iter_rows(SLUG, JAN.date(), dt.date(2030, 1, 20)))
+    assert [r[0] for r in rows] == ["appointment"] * 5 + ["series"] * 2
+    assert {r[2] for r in rows} == {SLUG}
+
+
+def test_encoding_is_chunked(app, booked, monkeypatch):
+    import exports
+
+    monkeypatch.setattr(exports, "CHUNK_ROWS", 2)
+    with app.app_context():
+        chunks = list(exports.encode(exports.iter_rows(SLUG), "jsonl"))
+    lines = "".join(chunks).splitlines()
+    assert len(chunks) == -(-len(lines) // 2)
+    first = json.loads(lines[0])
+    assert list(first) == exports.COLUMNS
+    assert first["name"] == "לקוח 0" and first["start_time"] == "2030-01-07 10:00:00"
+
+
+def test_admin_csv_download(app, booked):
+    admin = app.test_client()
+    with admin.session_transaction() as s:
+        s["admin_phone"] = "0500000000"
+        s["admin_slugs"] = [SLUG]
+    resp = admin.get(f"/admin/{SLUG}/export.csv?from=2030-01-01&to=2030-01-31")
+    assert resp.status_code == 200
+    assert resp.headers["Content-Disposition"].endswith('.csv"')
+    text = resp.get_data(as_text=True)
+    assert text.startswith("\ufeff")
+    rows = list(csv.DictReader(io.StringIO(text.lstrip("\ufeff"))))
+    assert len(rows) == 5 + 4  # series occurrences on 7, 14, 21 and 28 Jan
+    assert admin.get(f"/admin/{SLUG}/export.xml").status_code == 404
@@ -0,0 +1,16 @@
+from http_codec import accepted_encodings
+
+
+def test_plain_list():
+    assert accepted_encodings("gzip, deflate, br") == {"gzip", "deflate", "br"}
+
+
+def test_zero_q_refuses_in_any_spelling():
+    assert accepted_encodings("gzip;q=0.0, br; q=0, deflate;Q=0.000") == set()
+    assert accepted_encodings("br;q=0.5, gzip;q=0") == {"br"}
+
+
+def test_bad_q_is_refused_and_empty_is_nothing():
+    assert accepted_encodings("gzip;q=abc, br") == {"br"}
+    assert accepted_encodings("") == set()
+    assert accepted_encodings(None) == set()
@@ -0,0 +1,78 @@
+import pytest
+
+SLUG = "barber-demo"
+
+
+@pytest.fixture
+def landing(app, monkeypatch):
+    import app as appmod
+
+    appmod._landing_cache.clear()
+    renders = []
+    real = appmod.render_template
+
+    def counting(name, **ctx):
+        renders.append(ctx.get("business_slug"))
+        return real(name, **ctx)
+
+    monkeypatch.setattr(appmod, "render_template", counting)
+    return appmod, renders
+
+
+def test_page_is_rendered_once_and_revalidated_by_etag(app, landing):
+    _, renders = landing
+    client = app.test_client()
+
+    first = client.get(f"/b/{SLUG}/")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+
+    again = client.get(f"/b/{SLUG}/")
+    assert again.data == first.data
+    assert renders == [SLUG]
+
+    not_modified = client.get(f"/b/{SLUG}/", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.data == b""
+    assert renders == [SLUG]
+
+
+def test_admin_update_drops_the_cached_page(app, landing):
+    _, renders = landing
+    client = app.test_client()
+    assert client.get(f"/b/{SLUG}/").status_code == 200
+
+    admin = app.test_client()
+    with admin.session_transaction() as s:
+        s["admin_phone"] = "0500000000"
+        s["admin_slugs"] = [SLUG]
+    resp = admin.post(f"/admin/{SLUG}/update", headers={"Accept": "application/json"}, data={
+        "display_name": "מספרת הבדיקה",
+        "working_days": ["sun", "mon"],
+        "wh_default_start": "09:00",
+        "wh_default_end": "18:00",
+        "svc_id": ["cut"], "svc_name": ["תספורת"], "svc_duration": ["30"],
+    })
+    assert resp.status_code == 200, resp.get_json()
+
+    page = client.get(f"/b/{SLUG}/")
+    assert "מספרת הבדיקה" in page.get_data(as_text=True)
+    assert renders == [SLUG, SLUG]
+
+
+def test_least_recently_used_slug_is_evicted(app, landing, monkeypatch):
+    appmod, renders = landing
+    monkeypatch.setattr(appmod, "LANDING_CACHE_MAX", 2)
+
+    with app.test_request_context():
+        appmod.landing_page("a", {})
+        appmod.landing_page("b", {})
+        appmod.landing_page("a", {})   # a is now the most recent
+        appmod.landing_page("c", {})   # evicts b
+        assert list(appmod._landing_cache) == ["a", "c"]
+
+        appmod.landing_page("a", {})
+        assert renders == ["a", "b", "c"]
+        appmod.landing_page("a", {"name": "x"})  # display changed -> new render
+        assert renders == ["a", "b", "c", "a"]
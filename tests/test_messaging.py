@@ -0,0 +1,47 @@
+import messaging
+
+
+def test_console_provider_keeps_only_recent_messages():
+    provider = messaging.ConsoleProvider()
+    provider.send_batch([messaging.Message(phone="050", body=str(i)) for i in range(messaging.CONSOLE_KEEP + 5)])
+    assert len(provider.sent) == messaging.CONSOLE_KEEP
+    assert provider.sent[-1].body == str(messaging.CONSOLE_KEEP + 4)
+
+
+def test_failed_batches_are_retried(monkeypatch):
+    monkeypatch.setattr(messaging, "BACKOFF_BASE_SEC", 0.01)
+
+    class Flaky(messaging.ConsoleProvider):
+        calls = 0
+
+        def send_batch(self, messages):
+            Flaky.calls += 1
+            return list(messages) if Flaky.calls == 1 else super().send_batch(messages)
+
+    q = messaging.DeliveryQueue(Flaky(), workers=2)
+    q.put(messaging.Message(phone="050", body="hi"))
+    assert q.drain(timeout=5)
+    assert q.stats["retried"] == 1 and q.stats["sent"] == 1
+    assert [m.body for m in q.provider.sent] == ["hi"]
+
+
+def test_console_is_the_default_only_in_development(monkeypatch):
+    import pytest
+
+    monkeypatch.delenv("SMS_PROVIDER", raising=False)
+    monkeypatch.delenv("FLASK_DEBUG", raising=False)
+    monkeypatch.setenv("ENV", "PROD")
+    with pytest.raises(RuntimeError):
+        messaging.check_provider()
+    monkeypatch.setenv("SMS_PROVIDER", "carrier-pigeon")
+    with pytest.raises(RuntimeError):
+        messaging.check_provider()
+
+    monkeypatch.delenv("SMS_PROVIDER")
+    monkeypatch.setenv("ENV", "DEV")
+    assert messaging.check_provider() == "console"
+
+
+def test_one_worker_per_send_slot():
+    q = messaging.DeliveryQueue(messaging.ConsoleProvider())
+    assert q._workers == messaging.ConsoleProvider.max_concurrency
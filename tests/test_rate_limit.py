@@ -0,0 +1,31 @@
+import shared_state
+
+
+def test_otp_verify_limit_is_shared_between_workers(app):
+    import app as appmod
+
+    # two workers: separate app-side backends over one Redis
+    redis = shared_state.FakeRedis()
+    workers = [shared_state.RedisBackend(client=redis), shared_state.RedisBackend(client=redis)]
+    client = app.test_client()
+
+    statuses = []
+    for i in range(appmod.RATE_LIMIT_MAX + 1):
+        shared_state.set_backend(workers[i % 2])
+        statuses.append(client.post("/api/auth/verify", json={"phone": "0501111111", "code": "000000"}).status_code)
+
+    assert statuses == [404] * appmod.RATE_LIMIT_MAX + [429]
+    # another phone from the same address is still served
+    assert client.post("/api/auth/verify", json={"phone": "0502222222", "code": "000000"}).status_code == 404
+
+
+def test_otp_send_limit_per_address(app, monkeypatch):
+    import app as appmod
+
+    monkeypatch.setattr(appmod, "RATE_LIMIT_IP_MAX", 2)
+    client = app.test_client()
+    statuses = [
+        client.post("/api/auth/start", json={"phone": f"050333333{i}"}).status_code
+        for i in range(3)
+    ]
+    assert statuses == [200, 200, 429]
@@ -0,0 +1,53 @@
+import datetime as dt
+from zoneinfo import ZoneInfo
+
+
+def _add(app):
+    import app as appmod
+    from db import db
+    from models import Appointment, AppointmentSeries
+
+    tz = ZoneInfo(appmod.resolve_business_cfg("default")["timezone"])
+    now = dt.datetime.now(tz).replace(tzinfo=None, second=0, microsecond=0)
+    db.session.add_all([
+        Appointment(name="A", phone="0500000001", start_time=now + dt.timedelta(hours=2),
+                    calendar_event_id="soon", business_slug="default", duration_minutes=30),
+        Appointment(name="B", phone="0500000002", start_time=now + dt.timedelta(hours=30),
+                    calendar_event_id="later", business_slug="default", duration_minutes=30),
+        Appointment(name="C", phone="0500000003", start_time=now - dt.timedelta(hours=1),
+                    calendar_event_id="past", business_slug="default", duration_minutes=30),
+        AppointmentSeries(business_slug="default", name="D", phone="0500000004", service_name="cut",
+                          first_start=now - dt.timedelta(weeks=1) + dt.timedelta(hours=5),
+                          last_start=now + dt.timedelta(weeks=2, hours=5), duration_minutes=30,
+                          interval_weeks=1, occurrences=4, calendar_event_id="series"),
+    ])
+    db.session.commit()
+
+
+def test_each_reminder_is_sent_once(app):
+    import app as appmod
+    import reminders
+
+    with app.app_context():
+        _add(app)
+        sent = []
+        first = reminders.run(appmod._business_cfg_or_none, sent.extend, hours=24)
+        assert first["sent"] == 2
+        assert sorted(phone for phone, _ in sent) == ["0500000001", "0500000004"]
+
+        # a second scheduler / the next run finds them already claimed
+        again = reminders.run(appmod._business_cfg_or_none, sent.extend, hours=24)
+        assert again["due"] == 2 and again["sent"] == 0
+        assert len(sent) == 2
+
+
+def test_business_can_turn_reminders_off(app):
+    import app as appmod
+    import reminders
+
+    with app.app_context():
+        _add(app)
+        off = lambda slug: dict(appmod._business_cfg_or_none(slug), reminders=False)  # noqa: E731
+        sent = []
+        assert reminders.run(off, sent.extend)["sent"] == 0
+        assert sent == []
@@ -0,0 +1,58 @@
+from conftest import next_weekday
+
+
+def _two_chairs():
+    return {
+        "slug": "shop",
+        "timezone": "Asia/Jerusalem",
+        "calendar_id": "primary",
+        "working_days": ["sun", "mon", "tue", "wed", "thu"],
+        "working_hours": {"start": "09:00", "end": "17:00"},
+        "services": [{"id": "cut", "name": "cut", "duration_minutes": 30}],
+        "resources": [
+            {"id": "a"},
+            {"id": "b", "working_hours": {"start": "09:00", "end": "13:00"}},
+        ],
+    }
+
+
+def test_capacity_sums_every_resource():
+    import admin_reports
+
+    monday = next_weekday("mon")
+    assert admin_reports.working_minutes(_two_chairs(), monday) == 8 * 60 + 4 * 60
+    assert admin_reports.working_minutes(_two_chairs(), next_weekday("fri")) == 0
+
+
+def test_mark_busy_with_outdated_segments_marks_day_stale(app):
+    from availability import mark_busy, refresh_day
+    from db import db
+    from models import DaySlotSnapshot
+
+    cfg = _two_chairs()
+    monday = next_weekday("mon")
+    with app.app_context():
+        # materialized while the shop had only chair "a"
+        one_chair = dict(cfg, resources=cfg["resources"][:1])
+        refresh_day(one_chair, monday, {"a": []})
+        db.session.query(DaySlotSnapshot).update({"resource_bitmaps": DaySlotSnapshot.slot_bitmap})
+        db.session.commit()
+
+        mark_busy("shop", monday, 10 * 60, 10 * 60 + 30, resource_index=1, resource_count=2)
+        assert all(r.computed_at is None for r in DaySlotSnapshot.query.filter_by(business_slug="shop"))
+
+
+def test_purge_drops_only_past_days(app):
+    import datetime as dt
+
+    from availability import refresh_day
+    from models import DaySlotSnapshot
+
+    cfg = _two_chairs()
+    today = dt.date.today()
+    with app.app_context():
+        for d in (today - dt.timedelta(days=3), today - dt.timedelta(days=1), today):
+            refresh_day(cfg, d, {"a": [], "b": []})
+        result = app.test_cli_runner().invoke(args=["snapshots", "purge"])
+        assert result.exit_code == 0, result.output
+        assert {r.date for r in DaySlotSnapshot.query.all()} == {today - dt.timedelta(days=1), today}
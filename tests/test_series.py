@@ -0,0 +1,45 @@
+import datetime as dt
+from zoneinfo import ZoneInfo
+
+
+def _local_now(app):
+    import app as appmod
+
+    with app.app_context():
+        tz = ZoneInfo(appmod.resolve_business_cfg("default")["timezone"])
+    return dt.datetime.now(tz).replace(tzinfo=None, second=0, microsecond=0)
+
+
+def test_past_occurrence_is_not_listed_or_counted(app, client):
+    import app as appmod
+    from db import db
+    from models import Appointment, AppointmentSeries
+
+    # an hour ago on the business's clock: still "future" if compared with UTC east of Greenwich
+    hour_ago = _local_now(app) - dt.timedelta(hours=1)
+    with app.app_context():
+        db.session.add(AppointmentSeries(
+            business_slug="default", name="Dan", phone="0501234567", service_name="cut",
+            first_start=hour_ago, last_start=hour_ago + dt.timedelta(weeks=1), duration_minutes=30,
+            interval_weeks=1, occurrences=2, calendar_event_id="series1",
+        ))
+        db.session.add(Appointment(
+            name="Dan", phone="0501234567", start_time=hour_ago, calendar_event_id="single1",
+            business_slug="default", duration_minutes=30,
+        ))
+        db.session.commit()
+
+    listed = client.get("/api/cancel/list").json["appointments"]
+    series = [a for a in listed if "series_id" in a]
+    assert [a["start"] for a in series] == [(hour_ago + dt.timedelta(weeks=1)).isoformat()]
+    with app.app_context():
+        assert appmod.active_booking_count("0501234567") == 1  # the series; the past single doesn't count
+
+
+def test_series_starting_in_the_past_is_rejected(app, client):
+    start = _local_now(app) - dt.timedelta(days=1)
+    resp = client.post("/api/book/recurring", json={
+        "date": start.date().isoformat(), "time": "10:00", "duration_minutes": 30,
+        "interval_weeks": 1, "occurrences": 3,
+    })
+    assert resp.status_code == 400
@@ -0,0 +1,56 @@
+import datetime as dt
+import json
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from conftest import next_weekday
+
+
+@pytest.fixture
+def shop(app):
+    """Two chairs, neither with a calendar of its own."""
+    import tenant_store
+
+    with open("business_config.json", encoding="utf-8") as f:
+        cfg = json.load(f)["businesses"]["default"]
+    with app.app_context():
+        tenant_store.import_tenants({"shop": dict(
+            cfg,
+            working_hours={"default": {"start": "09:00", "end": "17:00"}},
+            resources=[{"id": "a"}, {"id": "b"}],
+        )})
+    return dict(cfg, slug="shop")
+
+
+def _book(client, date, time):
+    return client.post("/b/shop/api/book", json={"date": str(date), "time": time, "duration_minutes": 30}).json
+
+
+def test_one_booking_blocks_one_chair_only(app, client, shop):
+    from models import Appointment
+
+    monday = next_weekday("mon")
+    assert _book(client, monday, "10:00")["ok"] is True
+    assert _book(client, monday, "10:00")["ok"] is True
+    assert _book(client, monday, "10:00")["ok"] is False
+    with app.app_context():
+        assert sorted(a.resource_id for a in Appointment.query.all()) == ["a", "b"]
+
+
+def test_foreign_event_blocks_every_sharing_chair(app, client, shop, calendar):
+    monday = next_weekday("mon")
+    tz = ZoneInfo(shop["timezone"])
+    start = dt.datetime.combine(monday, dt.time(11, 0), tzinfo=tz)
+    calendar.events_by_id["foreign"] = (shop["calendar_id"], start, start + dt.timedelta(minutes=30))
+
+    assert _book(client, monday, "11:00")["ok"] is False
+    assert _book(client, monday, "11:30")["ok"] is True
+
+
+def test_subtract_intervals():
+    from booking_core import subtract_intervals
+
+    assert subtract_intervals([(0, 100)], [(10, 20), (50, 100)]) == [(0, 10), (20, 50)]
+    assert subtract_intervals([(0, 30), (40, 50)], [(0, 30)]) == [(40, 50)]
+    assert subtract_intervals([(0, 30)], []) == [(0, 30)]
@@ -0,0 +1,32 @@
+from conftest import next_weekday
+
+
+def test_streams_past_the_cap_are_refused(app, client, monkeypatch):
+    import slot_events
+
+    url = f"/api/day-slots/stream?date={next_weekday('mon')}"
+    monkeypatch.setattr(slot_events, "MAX_STREAMS", 1)
+    slot_events.hub.subscribe("default", "2030-01-07")
+    try:
+        resp = client.get(url)
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == "30"
+    finally:
+        for q in list(slot_events.hub._subs.get(("default", "2030-01-07"), ())):
+            slot_events.hub.unsubscribe("default", "2030-01-07", q)
+
+    resp = client.get(url, buffered=False)
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/event-stream"
+    resp.close()
+
+
+def test_events_reach_the_days_subscribers():
+    import slot_events
+
+    q = slot_events.hub.subscribe("shop", "2030-01-07")
+    try:
+        slot_events.hub.publish("shop", "2030-01-07", {"type": "freed", "date": "2030-01-07"})
+        assert q.get(timeout=1)["type"] == "freed"
+    finally:
+        slot_events.hub.unsubscribe("shop", "2030-01-07", q)
@@ -0,0 +1,150 @@
+import datetime as dt
+import json
+
+import pytest
+
+from conftest import next_weekday
+
+
+@pytest.fixture
+def offer(app, client):
+    """An offered 10:00 hold on business "w" for the logged-in customer."""
+    import tenant_store
+    from db import db
+    from models import User, WaitlistEntry
+
+    with open("business_config.json", encoding="utf-8") as f:
+        cfg = json.load(f)["businesses"]["default"]
+    monday = next_weekday("mon")
+    with app.app_context():
+        tenant_store.import_tenants({"w": dict(cfg, working_hours={"default": {"start": "09:00", "end": "12:00"}})})
+        user = User.query.filter_by(phone="0501234567").one()
+        entry = WaitlistEntry(
+            business_slug="w", date=monday, user_id=user.id, name=user.name, phone=user.phone,
+            window_start_min=540, latest_start_min=660, duration_minutes=30, block_minutes=30,
+            status="offered", offered_start_min=600,
+            hold_expires_at=dt.datetime.utcnow() + dt.timedelta(minutes=10),
+        )
+        db.session.add(entry)
+        db.session.commit()
+        return entry.id
+
+
+def _status(app, entry_id):
+    from db import db
+    from models import WaitlistEntry
+
+    with app.app_context():
+        return db.session.get(WaitlistEntry, entry_id).status
+
+
+def test_calendar_outage_keeps_the_offer(app, client, offer, monkeypatch):
+    import app as appmod
+    import calendar_gate
+    from models import Appointment
+
+    def down(*args, **kwargs):
+        raise calendar_gate.CalendarUnavailable("w")
+
+    monkeypatch.setattr(appmod, "fetch_busy_range", down)
+    resp = client.post("/b/w/api/waitlist/claim", json={"id": offer})
+    assert resp.status_code == 503
+    assert _status(app, offer) == "offered"
+    with app.app_context():
+        assert Appointment.query.count() == 0
+
+
+def test_claim_books_with_the_entrys_business(app, client, offer, calendar):
+    from models import Appointment
+
+    # claimed through the default-business URL
+    assert client.post("/api/waitlist/claim", json={"id": offer}).json["ok"] is True
+    assert _status(app, offer) == "booked"
+    with app.app_context():
+        (appt,) = Appointment.query.all()
+        assert appt.business_slug == "w"
+        assert appt.start_time.strftime("%H:%M") == "10:00"
+    assert len(calendar.events_by_id) == 1
+
+    # a second claim of the same offer books nothing more
+    assert client.post("/b/w/api/waitlist/claim", json={"id": offer}).json["ok"] is False
+    assert len(calendar.events_by_id) == 1
+
+
+def _waiting(app, slug, date):
+    from db import db
+    from models import User, WaitlistEntry
+
+    with app.app_context():
+        other = User(phone="0507654321", name="Noa")
+        db.session.add(other)
+        db.session.commit()
+        entry = WaitlistEntry(
+            business_slug=slug, date=date, user_id=other.id, name=other.name, phone=other.phone,
+            window_start_min=540, latest_start_min=660, duration_minutes=30, block_minutes=30,
+            status="waiting",
+        )
+        db.session.add(entry)
+        db.session.commit()
+        return entry.id
+
+
+def test_cancel_offers_the_time_only_after_the_event_is_deleted(app, client, calendar):
+    import app as appmod
+
+    monday = next_weekday("mon")
+    booked = client.post("/api/book", json={"date": str(monday), "time": "10:00", "duration_minutes": 30})
+    assert booked.json["ok"] is True
+    waiting = _waiting(app, "default", monday)
+    (appt,) = client.get("/api/cancel/list").json["appointments"]
+
+    assert client.post("/api/cancel", json={"id": appt["id"]}).json["ok"] is True
+    assert len(calendar.events_by_id) == 1
+    assert _status(app, waiting) == "waiting"
+
+    with app.app_context():
+        assert appmod.flush_calendar_deletions()["deleted"] == 1
+    assert calendar.events_by_id == {}
+    assert _status(app, waiting) == "offered"
+
+
+def test_oldest_fitting_entry_gets_the_freed_time(app, client):
+    import waitlist
+    from db import db
+    from models import User, WaitlistEntry
+    from sqlalchemy import text
+
+    monday = next_weekday("mon")
+    with app.app_context():
+        user = User.query.filter_by(phone="0501234567").one()
+        created = dt.datetime.utcnow() - dt.timedelta(hours=3)
+        specs = [
+            ("0500000001", 540, 560, 30),  # oldest, but its window ends before 10:00
+            ("0500000002", 540, 660, 60),  # fits the window, too long for 30 freed minutes
+            ("0500000003", 540, 660, 30),  # first that fits
+            ("0500000004", 600, 600, 30),  # also fits, joined later
+        ]
+        ids = []
+        for i, (phone, window_start, latest, block) in enumerate(specs):
+            entry = WaitlistEntry(
+                business_slug="default", date=monday, user_id=user.id, name="x", phone=phone,
+                window_start_min=window_start, latest_start_min=latest, duration_minutes=block,
+                block_minutes=block, status="waiting", created_at=created + dt.timedelta(minutes=i),
+            )
+            db.session.add(entry)
+            db.session.commit()
+            ids.append(entry.id)
+
+        offered = waitlist.offer_freed("default", monday, 600, "default", 30)
+        assert offered.id == ids[2]
+        assert [db.session.get(WaitlistEntry, i).status for i in ids] == ["waiting", "waiting", "offered", "waiting"]
+        assert waitlist.offer_freed("default", monday, 600, "default", 30).id == ids[3]
+
+        plan = " ".join(str(r[-1]) for r in db.session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM waitlist_entries "
+            "WHERE business_slug = 'default' AND date = '2030-01-07' AND status = 'waiting' "
+            "AND window_start_min <= 600 AND latest_start_min >= 600 AND block_minutes <= 30 "
+            "ORDER BY created_at, id LIMIT 1"
+        )))
+        assert "ix_waitlist_queue" in plan
+        assert "TEMP B-TREE" not in plan
@@ -0,0 +1,218 @@
+"""
+Waitlist for full days.
+
+Customers queue for (business, date, time window, service). When a booking
+is cancelled, offer_freed() walks the day's waiting entries oldest first
+on the (business_slug, date, status, created_at) index - no sort, and it
+stops at the first one whose window and length fit the freed time - and
+offers it: the entry holds that time for HOLD_MINUTES (availability treats an
+active hold as busy) and the customer gets an SMS. A hold that is not
+claimed in time expires and the same time goes to the next in line.
+
+Expired holds are released lazily when the day's availability is refreshed,
+and by `flask waitlist sweep` for days nobody is looking at.
+"""
+import datetime as dt
+
+from sqlalchemy import update
+
+from db import db
+from models import WaitlistEntry
+from booking_core import minutes_to_hhmm
+from messaging import send_sms
+
+HOLD_MINUTES = 15
+MAX_ENTRIES_PER_PHONE = 3
+ACTIVE_STATUSES = ("waiting", "offered")
+
+
+def join(slug: str, user, date: dt.date, window_start_min: int, window_end_min: int,
+         duration: int, block: int, service_id: str = None, service_name: str = None):
+    """Adds user to the day's waitlist. Returns (entry, error_message)."""
+    if window_end_min - window_start_min < block:
+        return None, "טווח השעות קצר מדי לשירות הזה"
+
+    active = WaitlistEntry.query.filter(
+        WaitlistEntry.phone == user.phone,
+        WaitlistEntry.status.in_(ACTIVE_STATUSES),
+        WaitlistEntry.date >= dt.date.today(),
+    ).all()
+    if any(e.business_slug == slug and e.date == date for e in active):
+        return None, "כבר נרשמת לרשימת ההמתנה ליום הזה"
+    if len(active) >= MAX_ENTRIES_PER_PHONE:
+        return None, f"ניתן להירשם לעד {MAX_ENTRIES_PER_PHONE} רשימות המתנה"
+
+    entry = WaitlistEntry(
+        business_slug=slug,
+        date=date,
+        user_id=user.id,
+        name=user.name,
+        phone=user.phone,
+        window_start_min=window_start_min,
+        latest_start_min=window_end_min - block,
+        duration_minutes=duration,
+        block_minutes=block,
+        service_id=service_id,
+        service_name=service_name,
+        status="waiting",
+    )
+    db.session.add(entry)
+    db.session.commit()
+    return entry, None
+
+
+def user_entries(phone: str) -> list:
+    return (
+        WaitlistEntry.query.filter(
+            WaitlistEntry.phone == phone,
+            WaitlistEntry.status.in_(ACTIVE_STATUSES),
+            WaitlistEntry.date >= dt.date.today(),
+        )
+        .order_by(WaitlistEntry.date, WaitlistEntry.window_start_min)
+        .all()
+    )
+
+
+def _active_holds(slug: str, date: dt.date, now: dt.datetime = None):
+    now = now or dt.datetime.utcnow()
+    return WaitlistEntry.query.filter(
+        WaitlistEntry.business_slug == slug,
+        WaitlistEntry.date == date,
+        WaitlistEntry.status == "offered",
+        WaitlistEntry.hold_expires_at > now,
+    ).all()
+
+
+def held_intervals(slug: str, date: dt.date) -> list:
+    """[(resource_id, start_min, end_min)] of unexpired holds on date."""
+    return [
+        (e.resource_id, e.offered_start_min, e.offered_start_min + e.block_minutes)
+        for e in _active_holds(slug, date)
+    ]
+
+
+def held_resources(slug: str, date: dt.date, start_min: int, end_min: int) -> set:
+    """Resources with an unexpired hold overlapping [start_min, end_min)."""
+    return {
+        rid for rid, s, e in held_intervals(slug, date)
+        if s < end_min and start_min < e
+    }
+
+
+def offer_freed(slug: str, date: dt.date, start_min: int, resource_id: str, max_block: int,
+                now: dt.datetime = None):
+    """
+    Holds freed time [start_min, start_min + max_block) for the oldest
+    waiting entry that fits it. Returns the offered entry or None.
+    """
+    now = now or dt.datetime.utcnow()
+
+    # a concurrent worker may grab the same entry; then try the next one
+    for _ in range(3):
+        entry = (
+            WaitlistEntry.query.filter(
+                WaitlistEntry.business_slug == slug,
+                WaitlistEntry.date == date,
+                WaitlistEntry.status == "waiting",
+                WaitlistEntry.window_start_min <= start_min,
+                WaitlistEntry.latest_start_min >= start_min,
+                WaitlistEntry.block_minutes <= max_block,
+            )
+            .order_by(WaitlistEntry.created_at, WaitlistEntry.id)
+            .first()
+        )
+        if entry is None:
+            return None
+
+        res = db.session.execute(
+            update(WaitlistEntry)
+            .where(WaitlistEntry.id == entry.id, WaitlistEntry.status == "waiting")
+            .values(
+                status="offered",
+                offered_start_min=start_min,
+                resource_id=resource_id,
+                hold_expires_at=now + dt.timedelta(minutes=HOLD_MINUTES),
+            )
+        )
+        if res.rowcount != 1:
+            db.session.rollback()
+            continue
+        db.session.commit()
+        db.session.refresh(entry)
+
+        send_sms(
+            entry.phone,
+            f"התפנה תור ב-{date.isoformat()} בשעה {minutes_to_hhmm(start_min)}. "
+            f"הוא שמור עבורך {HOLD_MINUTES} דקות - אשר/י אותו באתר.",
+            kind="waitlist",
+        )
+        return entry
+    return None
+
+
+def expire_holds(slug: str = None, date: dt.date = None, now: dt.datetime = None) -> list:
+    """
+    Expires unclaimed holds (optionally only for one business day) and offers
+    the same time to the next in line. Returns [(expired_entry, next_entry_or_None)].
+    """
+    now = now or dt.datetime.utcnow()
+    q = WaitlistEntry.query.filter(
+        WaitlistEntry.status == "offered",
+        WaitlistEntry.hold_expires_at <= now,
+    )
+    if slug is not None:
+        q = q.filter(WaitlistEntry.business_slug == slug, WaitlistEntry.date == date)
+
+    out = []
+    for e in q.all():
+        res = db.session.execute(
+            update(WaitlistEntry)
+            .where(WaitlistEntry.id == e.id, WaitlistEntry.status == "offered")
+            .values(status="expired")
+        )
+        if res.rowcount != 1:
+            db.session.rollback()
+            continue
+        db.session.commit()
+        nxt = offer_freed(e.business_slug, e.date, e.offered_start_min, e.resource_id, e.block_minutes, now)
+        out.append((e, nxt))
+    return out
+
+
+def claimable_offer(entry_id: int, phone: str, now: dt.datetime = None):
+    """The caller's unexpired offer, or None. The entry stays "offered" (and keeps holding the time)."""
+    now = now or dt.datetime.utcnow()
+    return WaitlistEntry.query.filter(
+        WaitlistEntry.id == entry_id,
+        WaitlistEntry.phone == phone,
+        WaitlistEntry.status == "offered",
+        WaitlistEntry.hold_expires_at > now,
+    ).first()
+
+
+def book_offer(entry_id: int) -> bool:
+    """
+    Moves a still-offered entry to "booked" (one conditional UPDATE) in the
+    current transaction, so it commits together with the Appointment.
+    False if the hold expired or was claimed meanwhile.
+    """
+    res = db.session.execute(
+        update(WaitlistEntry)
+        .where(WaitlistEntry.id == entry_id, WaitlistEntry.status == "offered")
+        .values(status="booked")
+    )
+    return res.rowcount == 1
+
+
+def leave(entry_id: int, phone: str):
+    """
+    Takes the caller off the list. Returns the entry if it was holding time
+    (the caller should pass that time on), else None.
+    """
+    entry = db.session.get(WaitlistEntry, entry_id)
+    if entry is None or entry.phone != phone or entry.status not in ACTIVE_STATUSES:
+        return None
+    was_offered = entry.status == "offered"
+    entry.status = "left"
+    db.session.commit()
+    return entry if was_offered else None